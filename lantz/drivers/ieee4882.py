@@ -12,6 +12,43 @@
 from lantz.core import Action, Driver, Feat
 
 
+def block_payload(block):
+    """Data of a definite length arbitrary block (#<n><length><data>), without copying it.
+    """
+    block = memoryview(block)
+    if block[0:1] != b'#':
+        raise ValueError('Not a definite length block')
+    n_digits = int(bytes(block[1:2]))
+    length = int(bytes(block[2:2 + n_digits]))
+    payload = block[2 + n_digits:2 + n_digits + length]
+    if len(payload) != length:
+        raise ValueError('Truncated block: {} bytes instead of {}'.format(len(payload), length))
+    return payload
+
+
+def read_definite_length_block(resource, terminated=True):
+    """Reads a definite length arbitrary block from a message based resource.
+
+    Unlike read_raw, the read does not stop on termination characters contained
+    in the data. The termination following the block is consumed.
+
+    :param terminated: False if other response units follow the block in the
+                       same message: nothing is read after the block.
+    :return: the data of the block (bytes).
+    """
+    header = resource.read_bytes(2)
+    if header[0:1] != b'#':
+        raise ValueError('Not a definite length block: {!r}'.format(header))
+    n_digits = int(header[1:2])
+    if n_digits == 0:
+        raise ValueError('Indefinite length blocks are not supported')
+    length = int(resource.read_bytes(n_digits))
+    data = resource.read_bytes(length)
+    if terminated and resource.read_termination:
+        resource.read_bytes(len(resource.read_termination))
+    return data
+
+
 class IEEE4882Driver(Driver):
     """Implements mandatory functions for a IEE488.2 device.
 
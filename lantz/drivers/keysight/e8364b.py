@@ -11,6 +11,16 @@ import numpy as _np
 from lantz.core import Action, Feat, MessageBasedDriver
 from lantz.core.feat import MISSING
 
+from lantz.drivers.ieee4882 import read_definite_length_block
+
+
+def data_dtype(data_format, byte_order, complex=False):
+    """dtype of a point in the REAL32 or REAL64 data format (byte order MISSING means the default, big)"""
+    size = 8 if data_format == "REAL64" else 4
+    if complex:
+        return _np.dtype('{}c{}'.format('<' if byte_order == "little" else '>', 2 * size))
+    return _np.dtype('{}f{}'.format('<' if byte_order == "little" else '>', size))
+
 
 class E8364B(MessageBasedDriver):
     """E8364B Network Analyzer
@@ -156,16 +166,32 @@ class E8364B(MessageBasedDriver):
     def data_format(self, value):
         self.write('FORM:DATA {}'.format(value))
 
-    def query_data(self, command, use_cached=True):
+    @Feat(values={"big": "NORM", "little": "SWAP"})
+    def byte_order(self):
+        """Byte order of the binary data formats (little is native on PCs, which makes reads zero-copy)
+        """
+        return self.query("FORM:BORD?")
+
+    @byte_order.setter
+    def byte_order(self, value):
+        self.write('FORM:BORD {}'.format(value))
+
+    def query_data(self, command, use_cached=True, complex=False):
+        """Data returned by command, as a float array, or as a complex array if complex is True
+        (the data are then real and imaginary parts interleaved).
+
+        Binary data are returned as a read only view on the received bytes.
+        """
         # For quick data acquisition, let's assume data format as not changed since last query
         form = self.recall('data_format') if use_cached else self.data_format
         if form is MISSING: return _np.array([])
-        if form == "REAL64":
-            return _np.array(self.resource.query_binary_values(command, datatype='d', is_big_endian=True))
-        elif form == "REAL32":
-            return _np.array(self.resource.query_binary_values(command, datatype='f', is_big_endian=True))
+        if form in ("REAL64", "REAL32"):
+            order = self.recall('byte_order') if use_cached else self.byte_order
+            self.write(command)
+            return _np.frombuffer(read_definite_length_block(self.resource), dtype=data_dtype(form, order, complex))
         elif form == "ASCII":
-            return _np.array(list(map(float, self.query(command).split(','))))
+            data = _np.array(self.query(command).split(','), dtype=float)
+            return data.view(_np.complex128) if complex else data
         else:
             raise Exception(str(form) + "Invalid data format")
 
@@ -175,9 +201,54 @@ class E8364B(MessageBasedDriver):
 
     @Action()
     def y_data(self):
-        data = self.query_data("CALC:DATA? SDATA")
-        data = data[::2] + data[1::2] * 1j
-        return data
+        return self.query_data("CALC:DATA? SDATA", complex=True)
+
+    # ----------------------------------------------------
+    #       Overlapped sweeps
+    # ----------------------------------------------------
+
+    def sweeps(self, n_sweeps=None, command="CALC:DATA? SDATA"):
+        """Generator of the complex traces of n_sweeps single sweeps (forever if None).
+
+        The sweeps are overlapped with the transfers: the data query of sweep N and
+        the trigger of sweep N+1 are sent in one message, so the instrument sweeps
+        while trace N is read and processed. The *OPC? of sweep N+1 is read after
+        trace N has been consumed. Continuous sweeping is restored at the end.
+        """
+        continuous = self.query('INIT:CONT?').strip()
+        self.write('INIT:CONT OFF')
+        pending = False
+        try:
+            self.query('INIT:IMM;*OPC?')
+            n = 0
+            while n_sweeps is None or n < n_sweeps:
+                if n_sweeps is not None and n == n_sweeps - 1:
+                    self.write(command)
+                else:
+                    self.write('{};:INIT:IMM;*OPC?'.format(command))
+                    pending = True
+                block = read_definite_length_block(self.resource, terminated=not pending)
+                if pending:
+                    # the answer to *OPC? follows in the same message, after a ';'
+                    separator = self.resource.read_bytes(1)
+                    if separator != b';':
+                        raise ValueError('Expected ; after the trace, got {!r}'.format(separator))
+                data = _np.frombuffer(block, dtype=self._complex_dtype())
+                yield data
+                if pending:
+                    self.read()
+                    pending = False
+                n += 1
+        finally:
+            if pending:
+                self.read()
+            self.write('INIT:CONT {}'.format(continuous))
+
+    def _complex_dtype(self):
+        form = self.recall('data_format')
+        if form not in ("REAL64", "REAL32"):
+            raise Exception("sweeps needs a binary data_format, not {}".format(form))
+        return data_dtype(form, self.recall('byte_order'), complex=True)
 
     # ----------------------------------------------------
     #       Traces and Channel functions (Complicates the remote use of the device
@@ -217,3 +288,4 @@ class E8364B(MessageBasedDriver):
 
         self.select_measurement('CH1_S11_1')
         self.data_format = 'REAL64'
+        self.byte_order = 'little'
@@ -6,17 +6,39 @@
 
     WARNING: This is still experimental.  It uses pickle to serialize the object which is not secure in an untrusted environment.
 
-    TODO: Implement DictFeat, Add Input check before executing, Fix autoquery when using autocomplete in ipython (maybe some caching is sufficient...)
+    Two wire protocols are understood by the server:
+
+    - legacy: one query per TCP connection, pickled behind a 10 digit ASCII length header.
+    - persistent: a single long lived connection carrying binary frames (see FRAME_HEADER) tagged
+      with a request id, so several queries can be in flight at once.  NumPy arrays are sent as
+      out-of-band pickle buffers and received straight into their final memory (no copies).
+
+    Device_Client can cache Feat and DictFeat values for a given time (cache_ttl).  On persistent
+    connections the server notifies every client when a Feat is set through it, so cached values
+    are invalidated instead of waiting for the time to expire.
+
+    Persistent connections can also subscribe to a Feat or an Action: the server samples it at the
+    requested rate and pushes the results continuously.  A bounded queue per subscription drops the
+    oldest results (or keeps only the latest one) when the client does not keep up.
+
+    TODO: Add Input check before executing
 
     Author: Alexandre Bourassa
     Date: 05/24/2018
 """
 
+import collections
+import itertools
+import os
 import pickle
+import select
 import socket
 import socketserver
+import struct
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 
 from lantz.core import Action, DictFeat, Feat, Q_
@@ -43,17 +65,19 @@ def decode_data(data):
         raise Exception("Incomplete/Invalid data")
     length = data[:10]
     d = data[10:]
-    obj = pickle.loads(d)
+    return _restore_quantity(pickle.loads(d))
 
+
+def _restore_quantity(obj):
     # Special case to handle Quantity
     if repr(type(obj)) == "<class 'pint.quantity.build_quantity_class.<locals>.Quantity'>":
         obj = Q_(str(obj))
     return obj
 
 
-def receive_all(recv_fun, timeout):
+def receive_all(recv_fun, timeout, data=None):
     start = time.time()
-    data = bytearray()
+    data = bytearray() if data is None else bytearray(data)
     while (time.time() - start) < timeout:
         buf = recv_fun(1024)
         data.extend(buf)
@@ -62,26 +86,286 @@ def receive_all(recv_fun, timeout):
     raise TimeoutError
 
 
+# Binary frame used by persistent connections:
+#   magic (2s), version (B), kind (B), request id (I), number of out-of-band buffers (I), pickle length (Q)
+# followed by the pickle payload and, for each buffer, its length (Q) and its raw bytes.
+FRAME_MAGIC = b'LZ'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!2sBBIIQ')
+BUFFER_HEADER = struct.Struct('!Q')
+
+KIND_REQUEST = 0
+KIND_REPLY = 1
+KIND_NOTIFY = 2
+KIND_STREAM = 3
+
+STREAM_POLICIES = ('drop', 'coalesce')
+
+# Out-of-band buffers (zero-copy NumPy arrays) need pickle protocol 5
+PICKLE_PROTOCOL = max(pickle.HIGHEST_PROTOCOL, 4)
+
+
+def encode_frame(data, request_id=0, kind=KIND_REQUEST):
+    """Serialize data into a binary frame.
+
+    Returns a list of bytes-like chunks to be sent in order. Large buffers
+    (e.g. NumPy arrays) are returned as memoryviews over the original object.
+    """
+    buffers = []
+    if PICKLE_PROTOCOL >= 5:
+        payload = pickle.dumps(data, protocol=PICKLE_PROTOCOL, buffer_callback=buffers.append)
+    else:
+        payload = pickle.dumps(data, protocol=PICKLE_PROTOCOL)
+    views = [buf.raw() for buf in buffers]
+
+    head = bytearray(FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, kind, request_id, len(views), len(payload)))
+    head.extend(payload)
+    chunks = [head]
+    for view in views:
+        chunks.append(BUFFER_HEADER.pack(view.nbytes))
+        chunks.append(view)
+    return chunks
+
+
+def send_frame(sock, data, request_id=0, kind=KIND_REQUEST):
+    for chunk in encode_frame(data, request_id=request_id, kind=kind):
+        sock.sendall(chunk)
+
+
+def recv_exact(sock, n):
+    """Read exactly n bytes from sock into a new bytearray."""
+    data = bytearray(n)
+    view = memoryview(data)
+    pos = 0
+    while pos < n:
+        received = sock.recv_into(view[pos:], n - pos)
+        if not received:
+            raise ConnectionError('Connection closed by peer')
+        pos += received
+    return data
+
+
+def recv_frame(sock, header=None):
+    """Read one binary frame from sock.
+
+    :param header: first bytes of the frame if they were already consumed from the socket.
+    :return: (request_id, kind, data)
+    """
+    header = header or b''
+    header = bytes(header) + bytes(recv_exact(sock, FRAME_HEADER.size - len(header)))
+    magic, version, kind, request_id, n_buffers, length = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise Exception("Incomplete/Invalid data")
+    payload = recv_exact(sock, length)
+    buffers = []
+    for _ in range(n_buffers):
+        size, = BUFFER_HEADER.unpack(recv_exact(sock, BUFFER_HEADER.size))
+        buffers.append(recv_exact(sock, size))
+    if buffers:
+        data = pickle.loads(payload, buffers=buffers)
+    else:
+        data = pickle.loads(payload)
+    return request_id, kind, _restore_quantity(data)
+
+
+class Connection():
+    """Persistent connection to a Lantz_Server.
+
+    Each request is tagged with an id, so several threads can share the
+    connection: whichever thread is waiting reads the next frame and hands
+    replies addressed to other threads over to them.
+
+    Notifications pushed by the server are passed to the callables in
+    listeners. They are read while waiting for a reply or when calling poll.
+
+    :param timeout: time allowed to connect and to receive the rest of a frame
+                    once it has started, in seconds. It does not limit how long
+                    a query may run: see the timeout of receive and query.
+    """
+
+    def __init__(self, host, port, timeout=1):
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # detect a dead server while waiting for a long query
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._replies = {}
+        # ids of the requests whose replies are no longer awaited
+        self._abandoned = set()
+        self._streams = {}
+        self._receiving = False
+        self.listeners = []
+
+    def send(self, data, request_id=None):
+        with self._send_lock:
+            if request_id is None:
+                request_id = self.new_id()
+            send_frame(self.sock, data, request_id=request_id, kind=KIND_REQUEST)
+        return request_id
+
+    def new_id(self):
+        return next(self._ids) & 0xFFFFFFFF
+
+    def receive(self, request_id, timeout=None):
+        """Wait for the reply to a request. A timeout of None waits forever.
+
+        If the timeout elapses, TimeoutError is raised and the reply is discarded when it arrives.
+        """
+        try:
+            self._wait_for(lambda: request_id in self._replies, timeout)
+        except TimeoutError:
+            with self._cond:
+                self._abandoned.add(request_id)
+            raise
+        with self._cond:
+            return self._replies.pop(request_id)
+
+    def poll(self):
+        """Process the frames already waiting in the socket, without blocking."""
+        with self._cond:
+            while not self._receiving and self._read_frame(0):
+                pass
+
+    def _wait_for(self, ready, timeout=None):
+        """Read frames until ready() is true. A timeout of None waits forever."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not ready():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError
+                if self._receiving:
+                    self._cond.wait(remaining)
+                    continue
+                self._read_frame(self.timeout if remaining is None else min(remaining, self.timeout))
+
+    def _read_frame(self, timeout):
+        # Must be called with self._cond acquired
+        self._receiving = True
+        self._cond.release()
+        try:
+            # Only start reading a frame when it has arrived, a timeout must not leave half a frame behind
+            if not select.select([self.sock], [], [], timeout)[0]:
+                return False
+            rid, kind, data = recv_frame(self.sock)
+        finally:
+            self._cond.acquire()
+            self._receiving = False
+            self._cond.notify_all()
+        self._dispatch(rid, kind, data)
+        return True
+
+    def _dispatch(self, request_id, kind, data):
+        if kind == KIND_REPLY:
+            if request_id in self._abandoned:
+                self._abandoned.discard(request_id)
+            else:
+                self._replies[request_id] = data
+        elif kind == KIND_NOTIFY:
+            for listener in self.listeners:
+                listener(data)
+        elif kind == KIND_STREAM:
+            stream = self._streams.get(request_id)
+            if stream is not None:
+                stream.records.append(data)
+
+    def query(self, data, timeout=None):
+        return self.receive(self.send(data), timeout)
+
+    def subscribe(self, query, rate=None, maxlen=16, policy='drop'):
+        """Ask the server to sample query continuously and return a Stream."""
+        if policy not in STREAM_POLICIES:
+            raise ValueError('policy must be one of {}'.format(STREAM_POLICIES))
+        request_id = self.new_id()
+        stream = Stream(self, request_id, maxlen)
+        with self._cond:
+            self._streams[request_id] = stream
+        try:
+            unpack_reply(self.receive(self.send({'subscribe': query, 'rate': rate, 'maxlen': maxlen, 'policy': policy},
+                                                request_id=request_id)))
+        except:
+            with self._cond:
+                self._streams.pop(request_id, None)
+            raise
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._cond:
+            self._streams.pop(stream.subscription_id, None)
+        unpack_reply(self.query({'unsubscribe': stream.subscription_id}))
+
+    def close(self):
+        self.sock.close()
+
+
+class Stream():
+    """Results pushed by the server for a subscription.
+
+    Iterating yields the sampled values. Each record also carries a sequence
+    number, the server time stamp and the number of results the server
+    dropped so far (available as the dropped attribute).
+    """
+
+    def __init__(self, connection, subscription_id, maxlen=16):
+        self.connection = connection
+        self.subscription_id = subscription_id
+        self.records = collections.deque(maxlen=maxlen)
+        self.dropped = 0
+
+    def get_record(self, timeout=None):
+        self.connection._wait_for(lambda: self.records, timeout)
+        record = self.records.popleft()
+        self.dropped = record['dropped']
+        return record
+
+    def get(self, timeout=None):
+        return unpack_reply(self.get_record(timeout))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.get()
+
+    def close(self):
+        self.connection.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 VALID_TYPES = {'Feat': Feat, 'Action': Action, 'DictFeat': DictFeat}
 VALID_QUERY = ['SET', 'GET']
 
 
-def build_query(property_type, property_name, query_type='GET', val=None, args=[], kwargs={}, key=None):
+def build_query(property_type, property_name, query_type='GET', val=None, args=[], kwargs={}, key=None, device=None):
     if not property_type in VALID_TYPES:
         raise Exception('Invalid property type')
     if not query_type in VALID_QUERY:
         raise Exception('Invalid query type')
     if property_type == 'Feat':
-        return {'property_type': property_type, 'property_name': property_name, 'query_type': query_type, 'val': val}
+        query = {'property_type': property_type, 'property_name': property_name, 'query_type': query_type, 'val': val}
     if property_type == 'DictFeat':
-        return {'property_type': property_type, 'property_name': property_name, 'query_type': query_type, 'val': val,
-                'args': args, 'kwargs': kwargs, 'key': key}
+        query = {'property_type': property_type, 'property_name': property_name, 'query_type': query_type, 'val': val,
+                 'args': args, 'kwargs': kwargs, 'key': key}
     if property_type == 'Action':
-        return {'property_type': property_type, 'property_name': property_name, 'args': args, 'kwargs': kwargs}
+        query = {'property_type': property_type, 'property_name': property_name, 'args': args, 'kwargs': kwargs}
+    if device is not None:
+        query['device'] = device
+    return query
 
 
 def exec_query(dev, query):
     # TODO Add some input checks
+    if isinstance(query, list):
+        # Batch: run in order and reply to all of them at once
+        return [exec_query(dev, q) for q in query]
     if query['property_type'] == 'Feat':
         if query['query_type'] == 'SET':
             try:
@@ -99,6 +383,23 @@ def exec_query(dev, query):
                 e = sys.exc_info()[0]
                 print('error: \n{}'.format(e))
                 return build_reply(error=e)
+    if query['property_type'] == 'DictFeat':
+        if query['query_type'] == 'SET':
+            try:
+                getattr(dev, query['property_name'])[query['key']] = query['val']
+                return build_reply()
+            except:
+                e = sys.exc_info()[0]
+                print('error: \n{}'.format(e))
+                return build_reply(error=e)
+        elif query['query_type'] == 'GET':
+            try:
+                val = getattr(dev, query['property_name'])[query['key']]
+                return build_reply(msg=val)
+            except:
+                e = sys.exc_info()[0]
+                print('error: \n{}'.format(e))
+                return build_reply(error=e)
     if query['property_type'] == 'Action':
         try:
             msg = getattr(dev, query['property_name'])(*query['args'], **query['kwargs'])
@@ -116,19 +417,248 @@ def build_reply(error=None, msg=None):
     return {'error': error, 'msg': msg}
 
 
-class Lantz_Server(socketserver.TCPServer):
-
-    def __init__(self, host, port, device):
-        class Lantz_Handler(socketserver.StreamRequestHandler):
-            def handle(self):
-                data = receive_all(self.request.recv, 1)
-                print('received: {}'.format(data))
-                reply = exec_query(device, data)
-                print('reply: {}'.format(reply))
-                self.request.sendall(encode_data(reply))
-
+def unpack_reply(reply):
+    if not reply['error'] is None:
+        raise reply['error']
+    return reply['msg']
+
+
+class Subscription():
+    """Sample a query at a given rate and push the results to a client.
+
+    Sampling and sending run in separate threads joined by a bounded queue,
+    so a slow client never slows down the acquisition. When the queue is
+    full the oldest result is dropped ('drop' policy); with the 'coalesce'
+    policy only the latest result is kept.
+    """
+
+    def __init__(self, handler, subscription_id, query, rate=None, maxlen=16, policy='drop'):
+        self.handler = handler
+        self.subscription_id = subscription_id
+        self.query = query
+        self.period = 1. / rate if rate else 0.
+        self.queue = collections.deque(maxlen=1 if policy == 'coalesce' else maxlen)
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sender = threading.Thread(target=self._send, daemon=True)
+        self.sampler.start()
+        self.sender.start()
+
+    def _sample(self):
+        next_time = time.monotonic()
+        for seq in itertools.count():
+            if not self.running:
+                return
+            try:
+                reply = self.handler.server.serve_query(self.query)
+            except Exception as e:
+                reply = build_reply(error=e)
+            with self.cond:
+                if len(self.queue) == self.queue.maxlen:
+                    self.dropped += 1
+                self.queue.append(dict(reply, seq=seq, time=time.time()))
+                self.cond.notify()
+            if self.period:
+                next_time += self.period
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Running late, do not try to catch up with a burst
+                    next_time = time.monotonic()
+
+    def _send(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                record = self.queue.popleft()
+                record['dropped'] = self.dropped
+            self.handler.send(record, request_id=self.subscription_id, kind=KIND_STREAM)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+
+class Lantz_Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        start = recv_exact(self.request, len(FRAME_MAGIC))
+        if bytes(start) == FRAME_MAGIC:
+            self.handle_persistent(start)
+        else:
+            self.handle_legacy(start)
+
+    def handle_legacy(self, start):
+        data = receive_all(self.request.recv, 1, data=start)
+        if self.server.verbose:
+            print('received: {}'.format(data))
+        reply = self.server.serve_query(data)
+        if self.server.verbose:
+            print('reply: {}'.format(reply))
+        self.request.sendall(encode_data(reply))
+
+    def handle_persistent(self, start):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+        self.subscriptions = {}
+        self.server.connections.add(self)
+        try:
+            while True:
+                try:
+                    request_id, kind, data = recv_frame(self.request, header=start)
+                except (ConnectionError, OSError):
+                    return
+                start = None
+                # Replies are sent as soon as they are ready, a slow query does not hold back the others
+                self.server.executor.submit(self.process, request_id, data)
+        finally:
+            self.server.connections.discard(self)
+            for subscription in list(self.subscriptions.values()):
+                subscription.stop()
+
+    def process(self, request_id, data):
+        # The client waits for this reply, possibly forever: always send one
+        try:
+            if isinstance(data, dict) and 'subscribe' in data:
+                reply = self.subscribe(request_id, data)
+            elif isinstance(data, dict) and 'unsubscribe' in data:
+                subscription = self.subscriptions.pop(data['unsubscribe'], None)
+                if subscription is not None:
+                    subscription.stop()
+                reply = build_reply()
+            else:
+                reply = self.server.serve_query(data)
+        except Exception as e:
+            reply = build_reply(error=e)
+        self.send(reply, request_id=request_id, kind=KIND_REPLY)
+
+    def subscribe(self, request_id, data):
+        if data['policy'] not in STREAM_POLICIES:
+            return build_reply(error=ValueError('Invalid policy: {}'.format(data['policy'])))
+        self.subscriptions[request_id] = Subscription(self, request_id, data['subscribe'], rate=data['rate'],
+                                                      maxlen=data['maxlen'], policy=data['policy'])
+        return build_reply(msg=request_id)
+
+    def send(self, data, request_id=0, kind=KIND_REPLY):
+        with self.send_lock:
+            try:
+                try:
+                    frame = encode_frame(data, request_id=request_id, kind=kind)
+                except Exception as e:
+                    # e.g. a result that cannot be pickled: send the error in its place
+                    error = build_reply(error=RuntimeError('Cannot send the reply: {!r}'.format(e)))
+                    if isinstance(data, list):
+                        data = [error] * len(data)
+                    elif isinstance(data, dict):
+                        data = dict(data, **error)
+                    else:
+                        data = error
+                    frame = encode_frame(data, request_id=request_id, kind=kind)
+                for chunk in frame:
+                    self.request.sendall(chunk)
+            except OSError:
+                pass
+
+
+class Lantz_Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serve one or several drivers to many clients at once.
+
+    Each connection is handled in its own thread, and queries received on
+    persistent connections are executed by a thread pool. Access to each
+    device is serialized with a lock (the driver locks its Feats and Actions
+    anyway), so the queries to a device still wait for each other: a long
+    Action holds back everything else sent to that device.
+
+    Queries to different devices run concurrently. While a device is busy,
+    a GET of one of the cached_feats is answered from the last value read
+    through the server, if there is one, instead of waiting. Such replies
+    carry the age of the value in seconds under the 'cached' key. The
+    values of a device are forgotten after any Action on it, and the value
+    of a Feat when it is set. The other GETs wait like any query.
+
+    :param device: a driver, or a dict mapping names to drivers. Queries
+                   select the device with their 'device' key.
+    :param max_workers: size of the thread pool executing queries.
+    :param cached_feats: names of the Feats and DictFeats that may be served
+                         from their last value, or (device name, Feat name) pairs.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host, port, device, verbose=True, max_workers=None, cached_feats=()):
+        if not isinstance(device, dict):
+            device = {None: device}
+        self.devices = device
+        self.locks = {name: threading.Lock() for name in device}
+        self.cached_feats = set(cached_feats)
+        # for each device, last value and time of each (Feat, key) of cached_feats read through the server
+        self.values = {name: {} for name in device}
+        self.verbose = verbose
+        self.connections = set()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or 4 * (os.cpu_count() or 1))
         super().__init__((host, port), Lantz_Handler)
 
+    def serve_query(self, query):
+        if isinstance(query, list):
+            return [self.serve_query(q) for q in query]
+        name = query.get('device')
+        try:
+            device = self.devices[name]
+        except KeyError:
+            return build_reply(error=LookupError('Unknown device: {}'.format(name)))
+
+        lock = self.locks[name]
+        values = self.values[name]
+        feat_name = query.get('property_name')
+        value_key = (feat_name, query.get('key'))
+        if query.get('query_type') == 'GET' and (feat_name in self.cached_feats or
+                                                 (name, feat_name) in self.cached_feats):
+            if not lock.acquire(blocking=False):
+                # the device is busy: serve the last known value rather than waiting
+                try:
+                    value, stamp = values[value_key]
+                except KeyError:
+                    lock.acquire()
+                else:
+                    reply = build_reply(msg=value)
+                    reply['cached'] = time.time() - stamp
+                    return reply
+            try:
+                reply = exec_query(device, query)
+                if reply['error'] is None:
+                    values[value_key] = (reply['msg'], time.time())
+            finally:
+                lock.release()
+            return reply
+
+        with lock:
+            reply = exec_query(device, query)
+            if query.get('property_type') == 'Action':
+                # an Action may change any Feat
+                values.clear()
+            elif query.get('query_type') == 'SET':
+                # the driver may have coerced the value, it is read again when needed
+                values.pop(value_key, None)
+        if query.get('query_type') == 'SET' and reply['error'] is None:
+            self.notify({'device': name, 'property_name': feat_name, 'key': query.get('key')})
+        return reply
+
+    def notify(self, data):
+        """Push data to every client connected with a persistent connection."""
+        for connection in list(self.connections):
+            connection.send(data, kind=KIND_NOTIFY)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
 
 # class Lantz_Base_Client(Driver):
 #     def __init__(self, host, port, timeout=1):
@@ -150,8 +680,90 @@ class Lantz_Server(socketserver.TCPServer):
 #         return ans
 
 
+class Batch():
+    """Group queries to a Device_Client in a single round-trip.
+
+    The server executes them in order and replies to all of them together::
+
+        with client.batch() as batch:
+            batch.get('frequency')
+            batch.get('voltage', key='ch1')
+            batch.set('amplitude', 1.0)
+            batch.call('measure')
+        frequency, voltage, _, data = batch.results
+
+    If a query fails, the first error is raised once all of them have run.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.queries = []
+        self.results = None
+
+    def _build(self, name, **kwargs):
+        try:
+            property_type = self.client._property_types[name]
+        except KeyError:
+            raise AttributeError('{} is not a Feat, DictFeat or Action of {}'.format(name, self.client.__class__.__name__))
+        self.queries.append(build_query(property_type, name, **kwargs))
+
+    def get(self, name, key=None):
+        self._build(name, query_type='GET', key=key)
+
+    def set(self, name, val, key=None):
+        self.client._cache.pop((name, key), None)
+        self._build(name, query_type='SET', val=val, key=key)
+
+    def call(self, name, *args, **kwargs):
+        self._build(name, args=args, kwargs=kwargs)
+
+    def execute(self):
+        replies = self.client.query(self.queries) if self.queries else []
+        self.queries = []
+        self.results = [reply['msg'] for reply in replies]
+        for reply in replies:
+            unpack_reply(reply)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+
+class Remote_DictFeat():
+    """Proxy to a DictFeat of a Device_Client."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getitem__(self, key):
+        return self.client._get('DictFeat', self.name, key=key)
+
+    def __setitem__(self, key, value):
+        self.client._set('DictFeat', self.name, value, key=key)
+
+
 class Device_Client():
-    def __new__(cls, device_driver_class, host, port, timeout=1, allow_initialize_finalize=False):
+    """Proxy to a driver served by a Lantz_Server.
+
+    :param timeout: time in seconds allowed to connect and, on persistent
+                    connections, to receive a reply once it has started.
+    :param cache_ttl: time in seconds during which Feat and DictFeat values
+                      are served from a local cache. Either a number for all
+                      of them or a dict mapping names to times. None disables
+                      the cache.
+    :param query_timeout: on persistent connections, maximum time in seconds
+                          to wait for the reply to a query. Either a number
+                          for all of them or a dict mapping names to times.
+                          None waits as long as the query runs.
+    """
+
+    def __new__(cls, device_driver_class, host, port, timeout=1, allow_initialize_finalize=False, persistent=False,
+                device_name=None, cache_ttl=None, query_timeout=None):
         if type(device_driver_class) is str:
             class_name = device_driver_class.split('.')[-1]
             mod = import_module(device_driver_class.replace('.' + class_name, ''))
@@ -170,12 +782,90 @@ class Device_Client():
                 if self._allow_initialize_finalize:
                     self._finalize()
 
-            def __init__(self, host, port, timeout=1):
+            def __init__(self, host, port, timeout=1, persistent=False, device_name=None, cache_ttl=None,
+                         query_timeout=None):
                 self.host = host
                 self.port = port
                 self.timeout = timeout
+                self.device_name = device_name
+                self.cache_ttl = cache_ttl
+                self.query_timeout = query_timeout
+                self._cache = {}
+                self._connection = Connection(host, port, timeout) if persistent else None
+                if self._connection is not None:
+                    self._connection.listeners.append(self._on_notify)
+
+            def _on_notify(self, data):
+                if data.get('device') == self.device_name:
+                    self._cache.pop((data['property_name'], data['key']), None)
+
+            def _ttl(self, name):
+                if isinstance(self.cache_ttl, dict):
+                    return self.cache_ttl.get(name)
+                return self.cache_ttl
+
+            def _query_timeout(self, data):
+                if isinstance(self.query_timeout, dict):
+                    names = [d['property_name'] for d in data] if isinstance(data, list) else [data['property_name']]
+                    timeouts = [self.query_timeout.get(name) for name in names]
+                    return None if None in timeouts else sum(timeouts)
+                return self.query_timeout
+
+            def _get(self, property_type, name, key=None):
+                ttl = self._ttl(name)
+                if ttl:
+                    if self._connection is not None:
+                        self._connection.poll()
+                    try:
+                        value, stamp = self._cache[(name, key)]
+                        if time.monotonic() - stamp < ttl:
+                            return value
+                    except KeyError:
+                        pass
+                value = unpack_reply(self.query(build_query(property_type, name, query_type='GET', key=key)))
+                if ttl:
+                    self._cache[(name, key)] = (value, time.monotonic())
+                return value
+
+            def _set(self, property_type, name, val, key=None):
+                self._cache.pop((name, key), None)
+                return unpack_reply(self.query(build_query(property_type, name, query_type='SET', val=val, key=key)))
+
+            def clear_cache(self):
+                self._cache.clear()
+
+            def subscribe(self, name, rate=None, key=None, args=(), kwargs={}, maxlen=16, policy='drop'):
+                """Stream the value of a Feat/DictFeat, or the result of an Action, sampled by the server.
+
+                :param rate: samples per second, None to sample as fast as possible.
+                :param maxlen: length of the queues buffering the results.
+                :param policy: 'drop' discards the oldest results when the client is slow, 'coalesce' keeps
+                               only the latest one.
+                :return: a Stream, iterate over it to get the values and close it when done.
+                """
+                if self._connection is None:
+                    raise ValueError('Subscriptions require a persistent connection')
+                property_type = self._property_types[name]
+                if property_type == 'Action':
+                    query = build_query('Action', name, args=args, kwargs=kwargs, device=self.device_name)
+                else:
+                    query = build_query(property_type, name, key=key, device=self.device_name)
+                return self._connection.subscribe(query, rate=rate, maxlen=maxlen, policy=policy)
+
+            def close_connection(self):
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
 
             def query(self, data):
+                if self.device_name is not None:
+                    if isinstance(data, list):
+                        data = [dict(d, device=self.device_name) for d in data]
+                    else:
+                        data = dict(data, device=self.device_name)
+                if self._connection is not None:
+                    return self._connection.query(data, self._query_timeout(data))
+
                 # Initialize and send query
                 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 sock.connect((self.host, self.port))
@@ -187,33 +877,60 @@ class Device_Client():
                 sock.close()
                 return ans
 
+            def batch(self):
+                return Batch(self)
+
+            def get_many(self, names):
+                """Read several Feats (or (DictFeat, key) pairs) in one round-trip."""
+                with self.batch() as batch:
+                    for name in names:
+                        if isinstance(name, tuple):
+                            batch.get(*name)
+                        else:
+                            batch.get(name)
+                return batch.results
+
+            def set_many(self, values):
+                """Set several Feats (keys may be (DictFeat, key) pairs) in one round-trip."""
+                with self.batch() as batch:
+                    for name, val in values.items():
+                        if isinstance(name, tuple):
+                            batch.set(name[0], val, key=name[1])
+                        else:
+                            batch.set(name, val)
+
+        Device_Client_Instance._property_types = property_types = {}
         for feat_name, feat in device_driver_class._lantz_features.items():
-            if isinstance(feat, Feat):
+            if isinstance(feat, DictFeat):
+                property_types[feat_name] = 'DictFeat'
+
+                def dict_fun(_feat_name):
+                    def f_(_self):
+                        return Remote_DictFeat(_self, _feat_name)
+
+                    return f_
+
+                setattr(Device_Client_Instance, feat_name, property(dict_fun(feat_name)))
+            elif isinstance(feat, Feat):
+                property_types[feat_name] = 'Feat'
+
                 def get_fun(_feat_name):
                     def f_(_self):
-                        reply = _self.query(build_query('Feat', _feat_name, query_type='GET'))
-                        if not reply['error'] is None:
-                            raise reply['error']
-                        else:
-                            return reply['msg']
+                        return _self._get('Feat', _feat_name)
 
                     return f_
 
                 def set_fun(_feat_name):
                     def f_(_self, val):
-                        reply = _self.query(build_query('Feat', _feat_name, query_type='SET', val=val))
-                        if not reply['error'] is None:
-                            raise reply['error']
-                        else:
-                            return reply['msg']
+                        return _self._set('Feat', _feat_name, val)
 
                     return f_
 
                 setattr(Device_Client_Instance, feat_name, property(get_fun(feat_name), set_fun(feat_name)))
-            # TODO implement DictFeat
             else:
                 continue
         for action_name, action in device_driver_class._lantz_actions.items():
+            property_types[action_name] = 'Action'
             def execute(_action_name):
                 def f_(_self, *args, **kwargs):
                     reply = _self.query(build_query('Action', _action_name, args=args, kwargs=kwargs))
@@ -230,11 +947,54 @@ class Device_Client():
                 setattr(Device_Client_Instance, action_name, execute(action_name))
 
         obj = Device_Client_Instance.__new__(Device_Client_Instance)
-        obj.__init__(host, port, timeout=timeout)
+        obj.__init__(host, port, timeout=timeout, persistent=persistent, device_name=device_name, cache_ttl=cache_ttl,
+                     query_timeout=query_timeout)
         return obj
 
 
+def benchmark(n_queries=1000, host='localhost', port=0):
+    """Compare round-trips per second of the legacy and persistent protocols.
+
+    A DummyFunGen (Feat get) and a DummyOsci (Action returning a NumPy array)
+    are served locally.
+    """
+    from lantz.drivers.examples.dummydrivers import DummyFunGen, DummyOsci
+
+    results = {}
+    for driver_class, query in ((DummyFunGen, build_query('Feat', 'frequency')),
+                                (DummyOsci, build_query('Action', 'measure'))):
+        device = driver_class()
+        device.initialize()
+        server = Lantz_Server(host, port, device, verbose=False)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        address = server.server_address
+        try:
+            client = Device_Client(driver_class, *address)
+            start = time.perf_counter()
+            for _ in range(n_queries):
+                client.query(query)
+            legacy = n_queries / (time.perf_counter() - start)
+
+            client = Device_Client(driver_class, *address, persistent=True)
+            start = time.perf_counter()
+            for _ in range(n_queries):
+                client.query(query)
+            persistent = n_queries / (time.perf_counter() - start)
+            client.close_connection()
+        finally:
+            server.shutdown()
+            server.server_close()
+        results[driver_class.__name__] = (legacy, persistent)
+        print('{}: legacy {:.0f} rt/s, persistent {:.0f} rt/s'.format(driver_class.__name__, legacy, persistent))
+    return results
+
+
 if __name__ == "__main__":
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+        sys.exit()
+
     HOST, PORT = "localhost", 9999
 
     from lantz.drivers.stanford_rs.sg396 import SG396
@@ -9,7 +9,7 @@
     Date: 9/27/2016
 """
 
-import time
+import functools
 
 import numpy as np
 from lantz.core import Action, Driver, Feat, Q_
@@ -31,6 +31,169 @@ def enforce_point_units(point, units='um'):
     return point
 
 
+class AOCalibration(object):
+    """Calibration (V/um) and smooth move settings of a mirror as plain floats,
+    recomputed only when the corresponding attributes of the driver are replaced.
+    """
+
+    def __init__(self):
+        self._key = None
+
+    def update(self, cal, smooth_rate, smooth_steps):
+        key = (cal, smooth_rate, smooth_steps)
+        if self._key is None or any(a is not b for a, b in zip(key, self._key)):
+            self.volts_per_um = np.array([1. / c.to('um/V').magnitude for c in cal])
+            self.smooth_rate = float(smooth_rate.to('Hz').magnitude)
+            self.smooth_steps = float(smooth_steps.to('1/V').magnitude)
+            self._key = key
+        return self
+
+    def to_volts(self, point):
+        """Voltages (array of 2 floats) of a point in um (Quantities)."""
+        return np.array([point[0].to('um').magnitude, point[1].to('um').magnitude]) * self.volts_per_um
+
+
+@functools.lru_cache(maxsize=64)
+def versine_profile(steps):
+    """Versine ramp from 0 to 1 in steps samples (read-only, shared between calls)."""
+    profile = (1.0 - np.cos(np.linspace(0.0, np.pi, steps))) / 2.0
+    profile.flags.writeable = False
+    return profile
+
+
+def smooth_trajectory(v0, v1, steps_per_volt):
+    """AO samples (steps, 2) of a versine move from the voltages v0 to v1, with
+    steps_per_volt samples per volt along the longest axis.
+    """
+    diff = v1 - v0
+    steps = int(np.ceil(np.abs(diff).max() * steps_per_volt))
+    return v0 + np.outer(versine_profile(steps), diff)
+
+
+def run_trajectory(task, voltages, rate, configured=None):
+    """Output voltages on an AO task at rate and wait until they are generated.
+
+    The sample clock is only configured again when the number of samples or the rate
+    change, so moves of the same length just write the new samples.
+
+    :param configured: (rate, samples) the task is known to be configured for, None if unknown.
+    :return: (rate, samples) the task is now configured for.
+    """
+    timing = (rate, len(voltages))
+    if timing != configured:
+        clock_config = {
+            'source': 'OnboardClock',
+            'rate': rate,
+            'sample_mode': 'finite',
+            'samples_per_channel': len(voltages),
+        }
+        task.configure_timing_sample_clock(**clock_config)
+        task.configure_trigger_disable_start()
+    task_config = {
+        'data': voltages,
+        'auto_start': False,
+        'timeout': Q_(0, 's'),
+        'group_by': 'scan',
+    }
+    task.write(**task_config)
+    task.start()
+    task.wait_until_done(Q_(2. * len(voltages) / rate + 1., 's'))
+    task.stop()
+    return timing
+
+
+def raster_voltages(x_voltages, y_voltages, serpentine=True):
+    """AO samples (one row after the other) of a raster scan.
+
+    :param x_voltages: voltages of the columns.
+    :param y_voltages: voltages of the rows.
+    :param serpentine: scan every other row backwards, which avoids the flyback.
+    :return: array of shape (rows * columns, 2).
+    """
+    rows, columns = len(y_voltages), len(x_voltages)
+    xs = np.tile(np.asarray(x_voltages, dtype=float), (rows, 1))
+    if serpentine:
+        xs[1::2] = xs[1::2, ::-1]
+    return np.column_stack((xs.ravel(), np.repeat(np.asarray(y_voltages, dtype=float), columns)))
+
+
+def raster_scan(ao_task, acq_task, voltages, shape, acq_rate, pts_per_pos=100, serpentine=True):
+    """Raster scan as a single hardware timed acquisition, yielding the rows as they are acquired.
+
+    The whole AO waveform (see raster_voltages) is written at once and the acquisition
+    task is clocked (CI) or triggered (AI) with it, exactly as for the line scans,
+    so there is no setup between the rows.
+
+    :param ao_task: AnalogOutputTask with the x and y channels.
+    :param acq_task: CounterInputTask or AnalogInputTask.
+    :param voltages: AO samples from raster_voltages.
+    :param shape: (rows, columns).
+    :param acq_rate: sample rate, in Hz.
+    :param pts_per_pos: samples averaged at each position.
+    :return: generator of (row index, image), where image is the (rows, columns) array filled
+             up to that row (NaN after it), in count rates (CI) or volts (AI, first channel).
+             The tasks are stopped once it is exhausted or closed.
+    """
+    rows, columns = shape
+    line_samples = columns * pts_per_pos
+    samples = np.repeat(voltages, pts_per_pos, axis=0)
+    timeout = 1.5 * line_samples / acq_rate + 1.
+    image = np.full(shape, np.nan)
+
+    if acq_task.IO_TYPE == 'CI':
+        chs = list(acq_task.channels.keys())
+        if not chs:
+            raise ValueError('acquisition task must have at least one channel')
+        dev = chs[0].split('/')[0]
+        # one more sample, the counts at a position are the difference between two clock edges
+        samples = np.vstack((samples, samples[-1:]))
+        ao_task.configure_timing_sample_clock(rate=acq_rate, sample_mode='finite', samples_per_channel=len(samples))
+        acq_task.configure_timing_sample_clock(source='/{}/ao/SampleClock'.format(dev), rate=acq_rate,
+                                               sample_mode='finite', samples_per_channel=len(samples))
+        ao_task.write(data=samples, auto_start=False, timeout=Q_('0 s'), group_by='scan')
+        acq_task.arm_start_trigger_source = 'ao/StartTrigger'
+        acq_task.arm_start_trigger_type = 'digital_edge'
+        acq_task.start()
+        ao_task.start()
+        line = np.empty((line_samples, ), dtype=np.uint32)
+    elif acq_task.IO_TYPE == 'AI':
+        clock_config = {
+            'source': 'OnboardClock',
+            'rate': acq_rate,
+            'sample_mode': 'finite',
+            'samples_per_channel': len(samples),
+        }
+        ao_task.configure_timing_sample_clock(**clock_config)
+        acq_task.configure_timing_sample_clock(**clock_config)
+        ao_task.write(data=samples, auto_start=False, timeout=Q_('0 s'), group_by='scan')
+        ao_task.configure_trigger_digital_edge_start('ai/StartTrigger')
+        ao_task.start()
+        acq_task.start()
+        line = np.empty((line_samples, acq_task.number_of_channels()))
+    else:
+        raise ValueError('acquisition task must be a counter or analog input task')
+
+    try:
+        if acq_task.IO_TYPE == 'CI':
+            last = np.empty((1, ), dtype=np.uint32)
+            acq_task.read_into(last, timeout)
+        for row in range(rows):
+            if acq_task.IO_TYPE == 'CI':
+                acq_task.read_into(line, timeout)
+                # uint32 differences are right across the counter rollover
+                counts = np.diff(line, prepend=last)
+                last[0] = line[-1]
+                values = counts.reshape(columns, pts_per_pos).mean(axis=1) * acq_rate
+            else:
+                acq_task.read_into(line, timeout, 'scan')
+                values = line[:, 0].reshape(columns, pts_per_pos).mean(axis=1)
+            image[row] = values[::-1] if serpentine and row % 2 else values
+            yield row, image
+    finally:
+        acq_task.stop()
+        ao_task.stop()
+
+
 class FSM300(Driver):
 
     def __init__(self, x_ao_ch, y_ao_ch,
@@ -45,6 +208,9 @@ class FSM300(Driver):
         self.cal = cal
 
         self._position = (Q_('0 um'), Q_('0 um'))
+        self._calibration = AOCalibration()
+        # timing the AO task is configured for by the last smooth move (see run_trajectory)
+        self._ao_timing = None
 
         super().__init__()
 
@@ -64,23 +230,9 @@ class FSM300(Driver):
         super().finalize()
 
     def ao_smooth_func(self, init_point, final_point):
-        init_x, init_y = init_point
-        final_x, final_y = final_point
-
-        init_x_voltage, final_x_voltage = init_x / self.cal[0], final_x / self.cal[0]
-        init_y_voltage, final_y_voltage = init_y / self.cal[1], final_y / self.cal[1]
-        diff_x_voltage = final_x_voltage - init_x_voltage
-        diff_y_voltage = final_y_voltage - init_y_voltage
-
-        diff_voltage = max(abs(diff_x_voltage), abs(diff_y_voltage))
-        steps = int(np.ceil(diff_voltage * self.ao_smooth_steps))
-        init = np.array([val.to('V').magnitude for val in [init_x_voltage, init_y_voltage]])
-        diff = np.array([val.to('V').magnitude for val in [diff_x_voltage, diff_y_voltage]])
-
-        versine_steps = (1.0 - np.cos(np.linspace(0.0, np.pi, steps))) / 2.0
-
-        step_voltages = np.outer(np.ones(steps), init) + np.outer(versine_steps, diff)
-        return step_voltages
+        calibration = self._calibration.update(self.cal, self.ao_smooth_rate, self.ao_smooth_steps)
+        return smooth_trajectory(calibration.to_volts(init_point), calibration.to_volts(final_point),
+                                 calibration.smooth_steps)
 
     def ao_linear_func(self, init_point, final_point, steps):
         init_x, init_y = init_point
@@ -106,29 +258,16 @@ class FSM300(Driver):
 
     @abs_position.setter
     def abs_position(self, point):
-        point = enforce_point_units(point)
-        step_voltages = self.ao_smooth_func(self._position, point)
+        self._set_position(*point)
+
+    def _set_position(self, x, y):
+        # moves even if the cache of abs_position already holds the target
+        target = enforce_point_units([x, y])
+        step_voltages = self.ao_smooth_func(self._position, target)
         if step_voltages.size:
-            steps = step_voltages.shape[0]
-            clock_config = {
-                'source': 'OnboardClock',
-                'rate': self.ao_smooth_rate.to('Hz').magnitude,
-                'sample_mode': 'finite',
-                'samples_per_channel': steps,
-            }
-            self.task.configure_timing_sample_clock(**clock_config)
-            self.task.configure_trigger_disable_start()
-            task_config = {
-                'data': step_voltages,
-                'auto_start': False,
-                'timeout': Q_(0, 's'),
-                'group_by': 'scan',
-            }
-            self.task.write(**task_config)
-            self.task.start()
-            time.sleep((steps / self.ao_smooth_rate).to('s').magnitude)
-            self.task.stop()
-        self._position = point
+            self._ao_timing = run_trajectory(self.task, step_voltages, self._calibration.smooth_rate,
+                                             self._ao_timing)
+        self._position = target
 
     @Action()
     def line_scan(self, init_point, final_point, steps, acq_task, acq_rate=Q_('20 kHz'), pts_per_pos=100):
@@ -136,7 +275,8 @@ class FSM300(Driver):
         final_point = enforce_point_units(final_point)
         timeout = enforce_units(1.5 * (pts_per_pos * steps / acq_rate), units='s')
         # AO smooth move to initial point
-        self.abs_position = init_point
+        self._set_position(*init_point)
+        self._ao_timing = None
         step_voltages = self.ao_linear_func(init_point, final_point, steps)
         if acq_task.IO_TYPE == 'CI':
             chs = list(acq_task.channels.keys())
@@ -173,6 +313,9 @@ class FSM300(Driver):
             scanned = acq_task.read(samples_per_channel=len(step_voltages), timeout=timeout)
             acq_task.stop()
             self.task.stop()
+            # the scan ends at final_point: keep the cache of abs_position in sync
+            self._position = final_point
+            self.refresh('abs_position')
             scanned = scanned.reshape((steps, pts_per_pos + 1))
             averaged = np.diff(scanned).mean(axis=1)
             return averaged * acq_rate.to('Hz').magnitude
@@ -200,12 +343,43 @@ class FSM300(Driver):
             scanned = acq_task.read(samples_per_channel=len(step_voltages), timeout=timeout)
             acq_task.stop()
             self.task.stop()
+            # the scan ends at final_point: keep the cache of abs_position in sync
+            self._position = final_point
+            self.refresh('abs_position')
             scanned = scanned.reshape((steps, pts_per_pos))
             averaged = scanned.mean(axis=1)
             return averaged
         else:
             pass
 
+    def raster_scan(self, init_point, final_point, shape, acq_task, acq_rate=Q_('20 kHz'), pts_per_pos=100,
+                    serpentine=True):
+        """Scan the rectangle between the corners init_point and final_point in a single
+        hardware timed acquisition (see raster_scan), the rows being along x.
+
+        :param shape: (rows, columns), i.e. the number of steps along y and x.
+        :return: generator of (row index, partially filled image).
+        """
+        init_point = enforce_point_units(init_point)
+        final_point = enforce_point_units(final_point)
+        rows, columns = shape
+        x_voltages = self.ao_linear_func(init_point, (final_point[0], init_point[1]), columns)[:, 0]
+        y_voltages = self.ao_linear_func(init_point, (init_point[0], final_point[1]), rows)[:, 1]
+        # AO smooth move to initial point
+        self._set_position(*init_point)
+        self._ao_timing = None
+        scan = raster_scan(self.task, acq_task, raster_voltages(x_voltages, y_voltages, serpentine), shape,
+                           acq_rate.to('Hz').magnitude, pts_per_pos, serpentine)
+        try:
+            for row, image in scan:
+                end_x = final_point[0] if not serpentine or row % 2 == 0 else init_point[0]
+                self._position = (end_x, init_point[1] + (final_point[1] - init_point[1]) * row / max(rows - 1, 1))
+                self.refresh('abs_position')
+                yield row, image
+        finally:
+            # stops the tasks if the consumer leaves early
+            scan.close()
+
 
 class Read_FSM(Driver):
     def __init__(self, x_ao_ch, y_ao_ch,
@@ -220,6 +394,8 @@ class Read_FSM(Driver):
         self.x_ao_ch, self.y_ao_ch = x_ao_ch, y_ao_ch
 
         self._position = (Q_(0.0, 'um'), Q_(0.0, 'um'))
+        self._calibration = AOCalibration()
+        self._ao_timing = None
         self._daq = Read_DAQ('Dev1')
         self.acq_task = None
 
@@ -248,6 +424,7 @@ class Read_FSM(Driver):
         timeout = enforce_units(1.5 * (pts_per_pos * steps / acq_rate), units='s')
         # AO smooth move to initial point
         self._set_position(*init_point)
+        self._ao_timing = None
         step_voltages = self.ao_linear_func(init_point, final_point, steps)
         if self.acq_task.IO_TYPE == 'CI':
             chs = list(self.acq_task.channels.keys())
@@ -317,6 +494,34 @@ class Read_FSM(Driver):
         else:
             pass
 
+    def raster_scan(self, init_point, final_point, shape, acq_rate=Q_('20 kHz'), pts_per_pos=100, serpentine=True):
+        """Scan the rectangle between the corners init_point and final_point with the input
+        task (see FSM300.raster_scan).
+
+        :return: generator of (row index, partially filled image).
+        """
+        if self.acq_task is None:
+            raise Exception('Must first define the input task using the "new_input_task" action')
+
+        init_point = enforce_point_units(init_point)
+        final_point = enforce_point_units(final_point)
+        rows, columns = shape
+        x_voltages = self.ao_linear_func(init_point, (final_point[0], init_point[1]), columns)[:, 0]
+        y_voltages = self.ao_linear_func(init_point, (init_point[0], final_point[1]), rows)[:, 1]
+        # AO smooth move to initial point
+        self._set_position(*init_point)
+        self._ao_timing = None
+        scan = raster_scan(self.task, self.acq_task, raster_voltages(x_voltages, y_voltages, serpentine), shape,
+                           float(acq_rate.to('Hz').m), pts_per_pos, serpentine)
+        try:
+            for row, image in scan:
+                end_x = final_point[0] if not serpentine or row % 2 == 0 else init_point[0]
+                self._position = (end_x, init_point[1] + (final_point[1] - init_point[1]) * row / max(rows - 1, 1))
+                yield row, image
+        finally:
+            # stops the tasks if the consumer leaves early
+            scan.close()
+
     @Feat(units='um')
     def x(self):
         return self._position[0]
@@ -342,35 +547,16 @@ class Read_FSM(Driver):
         target = enforce_point_units([x, y])
         step_voltages = self.ao_smooth_func(self._position, target)
         if step_voltages.size:
-            clock_config = {
-                'source': 'OnboardClock',
-                'rate': self.ao_smooth_rate.to('Hz').m,
-                'sample_mode': 'finite',
-                'samples_per_channel': step_voltages.shape[0],
-            }
-            self.task.configure_timing_sample_clock(**clock_config)
-            self.task.configure_trigger_disable_start()
-            task_config = {
-                'data': step_voltages,
-                'auto_start': False,
-                'timeout': Q_(0, 's'),
-                'group_by': 'scan',
-            }
-            self.task.write(**task_config)
-            self.task.start()
-            time.sleep((step_voltages.shape[0] / self.ao_smooth_rate).to('s').m)
-            self.task.stop()
+            self._ao_timing = run_trajectory(self.task, step_voltages, self._calibration.smooth_rate,
+                                             self._ao_timing)
         self._position = target
 
     def positions_to_volt(self, pt):
-        return np.array([(pt[0] / self.cal[0]).to('V').m, (pt[1] / self.cal[1]).to('V').m])
+        return self._calibration.update(self.cal, self.ao_smooth_rate, self.ao_smooth_steps).to_volts(pt)
 
     def ao_smooth_func(self, pt0, pt1):
-        pt0, pt1 = self.positions_to_volt(pt0), self.positions_to_volt(pt1)
-        steps = int(np.ceil(max(abs(pt1 - pt0)) * self.ao_smooth_steps.to('1/V').m))
-
-        versine_steps = (1.0 - np.cos(np.linspace(0.0, np.pi, steps))) / 2.0
-        return np.outer(np.ones(steps), pt0) + np.outer(versine_steps, pt1 - pt0)
+        calibration = self._calibration.update(self.cal, self.ao_smooth_rate, self.ao_smooth_steps)
+        return smooth_trajectory(calibration.to_volts(pt0), calibration.to_volts(pt1), calibration.smooth_steps)
 
     def ao_linear_func(self, pt0, pt1, steps):
         pt0, pt1 = self.positions_to_volt(pt0), self.positions_to_volt(pt1)
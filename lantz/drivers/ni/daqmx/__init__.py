@@ -22,9 +22,12 @@
     :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
     :license: BSD, see LICENSE for more details.
 """
+from . import acquisition, base, channels, constants, simulated, tasks
+from .acquisition import ContinuousAcquisition, TaskStream
 from .base import Channel, Device, System, Task
 from .channels import *
 from .constants import Constants, Types
 from .tasks import *
 
-__all__ = ['base', 'channels', 'tasks', 'constants']
+__all__ = ['base', 'channels', 'tasks', 'constants', 'acquisition', 'simulated',
+           'Channel', 'Device', 'System', 'Task', 'Constants', 'Types', 'ContinuousAcquisition', 'TaskStream']
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.ni.daqmx.acquisition
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Continuous acquisitions of analog and counter input tasks, into a ring buffer
+    or as a stream of chunks.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+import asyncio
+import collections
+import threading
+
+import numpy as np
+
+from lantz.drivers.ring_buffer import RingBuffer
+
+
+def scan_layout(task):
+    """dtype and shape of a scan (one sample of every channel) of an input task."""
+    if task.IO_TYPE == 'AI':
+        return np.float64, (task.number_of_channels(), )
+    elif task.IO_TYPE == 'CI':
+        return np.uint32, ()
+    raise ValueError('Continuous acquisitions need an analog or counter input task, not {}'.format(task.IO_TYPE))
+
+
+def read_scans(task, out, timeout):
+    """Read len(out) scans of task into out, return the number of scans read."""
+    if task.IO_TYPE == 'AI':
+        return task.read_into(out, timeout, 'scan')
+    return task.read_into(out, timeout)
+
+
+class ContinuousAcquisition(object):
+    """Reads a running input task chunk by chunk, directly into the slots of a
+    RingBuffer: nothing is allocated once started, so the reader keeps up with
+    the device at MS/s rates.
+
+    The records of the ring buffer are scans: float64 arrays of one value per
+    channel for an AnalogInputTask, uint32 counts for a CounterInputTask.
+
+    The task must be configured beforehand for continuous sampling, with a
+    DAQmx buffer of several chunks. Example::
+
+        task.configure_timing_sample_clock(rate=1e6, sample_mode='continuous', samples_per_channel=10**6)
+        with ContinuousAcquisition(task, chunk=10000) as acq:
+            while ...:
+                overwritten = acq.buffer.overwritten
+                data = acq.buffer.read_view()   # (n, channels) view, no copy
+                ...
+                acq.buffer.release_view()
+                if acq.buffer.overwritten != overwritten:
+                    ...                         # the reader lapped the consumer: data is unreliable
+
+    :param task: AnalogInputTask or CounterInputTask.
+    :param chunk: number of samples per channel read at once.
+    :param size: number of scans kept by the ring buffer, rounded up to a multiple of chunk
+                 (default: 100 chunks).
+    :param buffer: RingBuffer to fill instead of a new one (its size must be a multiple of chunk).
+    :param timeout: timeout of each read, in seconds.
+    :param use_event: read from the every N samples event of DAQmx instead of a reader thread.
+    """
+
+    def __init__(self, task, chunk=1000, size=None, buffer=None, timeout=10.0, use_event=False):
+        self.task = task
+        self.chunk = chunk
+        self.timeout = timeout
+        self.use_event = use_event
+
+        dtype, shape = scan_layout(task)
+
+        if buffer is None:
+            if size is None:
+                size = 100 * chunk
+            buffer = RingBuffer(-(-size // chunk) * chunk, dtype=dtype, shape=shape)
+        elif buffer.size % chunk:
+            raise ValueError('The size of the buffer ({}) must be a multiple of chunk ({})'.format(buffer.size, chunk))
+        elif buffer.data.dtype != dtype or buffer.data.shape[1:] != shape:
+            raise ValueError('The buffer must hold {} records of shape {}'.format(np.dtype(dtype), shape))
+
+        #: RingBuffer receiving the scans.
+        self.buffer = buffer
+        #: exception that stopped the acquisition, if any.
+        self.error = None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def read_chunk(self):
+        """Read the next chunk into the buffer (blocking until it is acquired)."""
+        buffer = self.buffer
+        count = read_scans(self.task, buffer.reserve(self.chunk), self.timeout)
+        buffer.commit(count)
+        return count
+
+    def start(self):
+        self.buffer.clear()
+        self.error = None
+        self._stop_event.clear()
+        if self.use_event:
+            self.task.register_every_n_samples_event(self._on_samples, samples=self.chunk)
+            self.task.start()
+        else:
+            self.task.start()
+            self._thread = threading.Thread(target=self._run, name='DAQmx acquisition', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.task.stop()
+        if self.use_event:
+            self.task.register_every_n_samples_event(None, samples=self.chunk)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                self.read_chunk()
+        except Exception as e:
+            self.error = e
+
+    def _on_samples(self, task_handle, event_type, samples, cb_data):
+        if self._stop_event.is_set():
+            return 0
+        try:
+            self.read_chunk()
+        except Exception as e:
+            self.error = e
+            self._stop_event.set()
+        return 0
+
+
+#: What TaskStream does with a new chunk when its queue is full.
+STREAM_POLICIES = ('block', 'drop', 'overwrite')
+
+
+class TaskStream(object):
+    """Chunks of a running input task, as a sync or async iterator, fed by the
+    every N samples event of DAQmx (see Task.stream).
+
+    The chunks wait in a queue of at most maxsize chunks. When it is full:
+
+    - 'block': the event callback waits for the consumer, so the samples pile
+      up in the DAQmx buffer (which overflows, with an error, if the consumer
+      does not catch up).
+    - 'drop': the new chunk is discarded and counted in `dropped`.
+    - 'overwrite': the oldest queued chunk is discarded and counted in `overwritten`.
+
+    The task starts with the iteration (or on entering the with block) and stops
+    after n_chunks chunks, or when stop is called. Example::
+
+        with task.stream(chunk=1000, policy='overwrite') as stream:
+            for data in stream:
+                ...
+
+        async with task.stream(chunk=1000) as stream:
+            async for data in stream:
+                ...
+    """
+
+    def __init__(self, task, chunk=1000, maxsize=16, policy='block', n_chunks=None, timeout=10.0):
+        if policy not in STREAM_POLICIES:
+            raise ValueError('policy must be one of {}, not {}'.format(STREAM_POLICIES, policy))
+        self.task = task
+        self.chunk = chunk
+        self.maxsize = maxsize
+        self.policy = policy
+        self.n_chunks = n_chunks
+        self.timeout = timeout
+        self.dtype, shape = scan_layout(task)
+        self.shape = (chunk, ) + shape
+
+        #: number of chunks read from the task.
+        self.chunks = 0
+        #: number of new chunks discarded because the queue was full ('drop').
+        self.dropped = 0
+        #: number of queued chunks discarded for newer ones ('overwrite').
+        self.overwritten = 0
+        #: largest number of chunks waiting in the queue.
+        self.max_queued = 0
+        #: exception raised while reading the task, re-raised to the consumer.
+        self.error = None
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._started = False
+        self._stopped = False
+        self._closed = False
+
+    @property
+    def stats(self):
+        with self._condition:
+            return {'chunks': self.chunks, 'dropped': self.dropped, 'overwritten': self.overwritten,
+                    'queued': len(self._queue), 'max_queued': self.max_queued}
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self.task.register_every_n_samples_event(self._on_samples, samples=self.chunk)
+        self.task.start()
+
+    def stop(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._started and not self._stopped:
+            self._stopped = True
+            self.task.stop()
+            self.task.register_every_n_samples_event(None, samples=self.chunk)
+
+    def _on_samples(self, task_handle, event_type, samples, cb_data):
+        if self._closed:
+            return 0
+        data = np.empty(self.shape, dtype=self.dtype)
+        try:
+            count = read_scans(self.task, data, self.timeout)
+        except Exception as e:
+            with self._condition:
+                self.error = e
+                self._closed = True
+                self._condition.notify_all()
+            return 0
+
+        with self._condition:
+            self.chunks += 1
+            if len(self._queue) >= self.maxsize:
+                if self.policy == 'block':
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+                elif self.policy == 'drop':
+                    self.dropped += 1
+                    data = None
+                else:
+                    self._queue.popleft()
+                    self.overwritten += 1
+            if data is not None and not self._closed:
+                self._queue.append(data[:count])
+                self.max_queued = max(self.max_queued, len(self._queue))
+            if self.n_chunks is not None and self.chunks >= self.n_chunks:
+                # the task is stopped by the consumer, not from its own callback
+                self._closed = True
+            self._condition.notify_all()
+        return 0
+
+    def get(self, timeout=None):
+        """Next chunk, None when the stream has ended.
+
+        :param timeout: maximum waiting time in seconds (None to wait indefinitely),
+                        TimeoutError is raised if it elapses.
+        """
+        self.start()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._queue or self._closed, timeout):
+                raise TimeoutError('No chunk received in {} s'.format(timeout))
+            if self._queue:
+                data = self._queue.popleft()
+                self._condition.notify_all()
+                return data
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            data = self.get()
+        except Exception:
+            self.stop()
+            raise
+        if data is None:
+            self.stop()
+            raise StopIteration
+        return data
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(None, self.get)
+        except Exception:
+            self.stop()
+            raise
+        if data is None:
+            self.stop()
+            raise StopAsyncIteration
+        return data
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
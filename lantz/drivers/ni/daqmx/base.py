@@ -9,13 +9,21 @@
     :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
     :license: BSD, see LICENSE for more details.
 """
-from lantz.core import Action, Feat, errors
-from lantz.core.foreign import LibraryDriver, RetStr, RetValue
+import ctypes
 
+from lantz.core import Action, Driver, Feat, errors
+from lantz.core.foreign import Library, LibraryDriver, RetStr, RetValue
+
+from .acquisition import TaskStream
 from .constants import Constants, Types
 
 default_buf_size = 2048
 
+# Prototypes of the event callbacks, called with the task handle first.
+EveryNSamplesEventCallback = ctypes.CFUNCTYPE(Types.int32, Types.TaskHandle, Types.int32, Types.uInt32, Types.void_p)
+DoneEventCallback = ctypes.CFUNCTYPE(Types.int32, Types.TaskHandle, Types.int32, Types.void_p)
+SignalEventCallback = ctypes.CFUNCTYPE(Types.int32, Types.TaskHandle, Types.int32, Types.void_p)
+
 _SAMPLE_MODES = {'finite': Constants.Val_FiniteSamps,
                  'continuous': Constants.Val_ContSamps,
                  'hwtimed': Constants.Val_HWTimedSinglePoint}
@@ -60,10 +68,21 @@ class _Base(LibraryDriver):
     LIBRARY_NAME = 'nicaiu', 'nidaqmx'
     LIBRARY_PREFIX = 'DAQmx'
 
+    #: object used instead of the NI library, e.g. a simulated.SimulatedDAQmx (see simulated.simulate).
+    simulated_library = None
+
     _DEVICES = {}
     _TASKS = {}
     _CHANNELS = {}
 
+    def __init__(self, *args, **kwargs):
+        if self.simulated_library is None:
+            super().__init__(*args, **kwargs)
+        else:
+            kwargs.pop('library_name', None)
+            Driver.__init__(self, *args, **kwargs)
+            self.lib = Library(self.simulated_library, self.LIBRARY_PREFIX, self._wrapper)
+
     def _get_error_string(self, error_code):
         size = self.lib.GetErrorString(error_code, None, 0)
         if size <= 0:
@@ -615,7 +634,7 @@ class Task(_Base):
         See also: register_signal_event, register_done_event
         """
 
-        if self.operation_direction == 'input':
+        if self.operation_direction() == 'input':
             event_type = Constants.Val_Acquired_Into_Buffer
         else:
             event_type = Constants.Val_Transferred_From_Buffer
@@ -631,11 +650,28 @@ class Task(_Base):
                 self.register_every_n_samples_event(None, samples=samples, options=options, cb_data=cb_data)
                 # TODO: check the validity of func signature
             # TODO: use wrapper function that converts cb_data argument to given Python object
-            c_func = EveryNSamplesEventCallback_map[self.CHANNEL_TYPE](func)
+            c_func = EveryNSamplesEventCallback(func)
 
         self._register_every_n_samples_event_cache = c_func
 
-        self.lib.RegisterEveryNSamplesEvent(event_type, uInt32(samples), uInt32(options), c_func, cb_data)
+        self.lib.RegisterEveryNSamplesEvent(event_type, Types.uInt32(samples), Types.uInt32(options), c_func, cb_data)
+
+    def stream(self, chunk=1000, maxsize=16, policy='block', n_chunks=None, timeout=10.0):
+        """Iterate over the samples of the task, chunk by chunk, as they are acquired.
+
+        The every N samples event is registered (replacing any other callback) and
+        the task started when the iteration begins. Configure the timing for
+        continuous sampling beforehand.
+
+        :param chunk: number of samples per channel of each chunk.
+        :param maxsize: maximum number of chunks waiting for the consumer.
+        :param policy: 'block', 'drop' or 'overwrite', what to do when maxsize chunks are waiting.
+        :param n_chunks: number of chunks after which the stream ends (None for no limit).
+        :param timeout: timeout of each read, in seconds.
+        :return: TaskStream, a sync and async iterator of NumPy arrays of shape (chunk, channels)
+                 for analog inputs and (chunk, ) for counters.
+        """
+        return TaskStream(self, chunk, maxsize, policy, n_chunks, timeout)
 
     _register_done_event_cache = None
 
@@ -704,13 +740,13 @@ class Task(_Base):
             if self._register_done_event_cache is not None:
                 self.register_done_event(None, options=options, cb_data=cb_data)
                 # TODO: check the validity of func signature
-            c_func = DoneEventCallback_map[self.CHANNEL_TYPE](func)
+            c_func = DoneEventCallback(func)
         self._register_done_event_cache = c_func
 
-        self.lib.RegisterDoneEvent(uInt32(options), c_func, cb_data)
+        self.lib.RegisterDoneEvent(Types.uInt32(options), c_func, cb_data)
 
     def operation_direction(self):
-        return 'input' if self.CHANNEL_TYPE else 'output'
+        return 'input' if self.IO_TYPE in ('AI', 'DI', 'CI') else 'output'
 
     _register_signal_event_cache = None
 
@@ -765,9 +801,9 @@ class Task(_Base):
             if self._register_signal_event_cache is not None:
                 self._register_signal_event(None, signal=signal, options=options, cb_data=cb_data)
                 # TODO: check the validity of func signature
-            c_func = SignalEventCallback_map[self.CHANNEL_TYPE](func)
+            c_func = SignalEventCallback(func)
         self._register_signal_event_cache = c_func
-        self.lib.RegisterSignalEvent(signal, uInt32(options), c_func, cb_data)
+        self.lib.RegisterSignalEvent(signal, Types.uInt32(options), c_func, cb_data)
 
     @Action(values=(str, str, _SAMPLE_MODES, None))
     def configure_timing_change_detection(self, rising_edge_channel='', falling_edge_channel='',
@@ -1586,7 +1622,7 @@ class Channel(_Base):
         return value
 
     def operation_direction(self):
-        return 'input' if self.CHANNEL_TYPE else 'output'
+        return 'input' if self.IO_TYPE in ('AI', 'DI', 'CI') else 'output'
 
     @Feat(read_once=True)
     def is_global(self):
@@ -1861,32 +1897,6 @@ class Channel(_Base):
         self.lib.SetCICountEdgesTerm(terminal)
 
 
-"""
-
-DoneEventCallback_map = dict(AI=ctypes.CFUNCTYPE (int32, AnalogInputTask, int32, void_p),
-                             AO=ctypes.CFUNCTYPE (int32, AnalogOutputTask, int32, void_p),
-                             DI=ctypes.CFUNCTYPE (int32, DigitalInputTask, int32, void_p),
-                             DO=ctypes.CFUNCTYPE (int32, DigitalOutputTask, int32, void_p),
-                             CI=ctypes.CFUNCTYPE (int32, CounterInputTask, int32, void_p),
-                             CO=ctypes.CFUNCTYPE (int32, CounterOutputTask, int32, void_p),
-                             )
-EveryNSamplesEventCallback_map = dict(AI=ctypes.CFUNCTYPE (int32, AnalogInputTask, int32, uInt32, void_p),
-                                      AO=ctypes.CFUNCTYPE (int32, AnalogOutputTask, int32, uInt32, void_p),
-                                      DI=ctypes.CFUNCTYPE (int32, DigitalInputTask, int32, uInt32, void_p),
-                                      DO=ctypes.CFUNCTYPE (int32, DigitalOutputTask, int32, uInt32, void_p),
-                                      CI=ctypes.CFUNCTYPE (int32, CounterInputTask, int32, uInt32, void_p),
-                                      CO=ctypes.CFUNCTYPE (int32, CounterOutputTask, int32, uInt32, void_p),
-                                      )
-SignalEventCallback_map = dict(AI=ctypes.CFUNCTYPE (int32, AnalogInputTask, int32, void_p),
-                               AO=ctypes.CFUNCTYPE (int32, AnalogOutputTask, int32, void_p),
-                               DI=ctypes.CFUNCTYPE (int32, DigitalInputTask, int32, void_p),
-                               DO=ctypes.CFUNCTYPE (int32, DigitalOutputTask, int32, void_p),
-                               CI=ctypes.CFUNCTYPE (int32, CounterInputTask, int32, void_p),
-                               CO=ctypes.CFUNCTYPE (int32, CounterOutputTask, int32, void_p),
-                               )
-
-"""
-
 if __name__ == '__main__':
     import lantz.log
 
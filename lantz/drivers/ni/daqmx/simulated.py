@@ -0,0 +1,665 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.ni.daqmx.simulated
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Simulated NI-DAQmx library, to run (and benchmark) the drivers built on
+    lantz.drivers.ni.daqmx without NI hardware or software.
+
+    It implements, in Python, the functions of the shared library called by
+    the Task, Channel, Device and System classes: tasks, voltage and edge
+    counting channels, sample clock timing, start triggers, analog and counter
+    reads, analog writes and the every N samples and done events. Samples are
+    acquired at the configured rate (in simulated time, see time_scale) from
+    configurable signals. Any other DAQmxGet/Set/Reset property is stored and
+    returned as is.
+
+    Usage::
+
+        from lantz.drivers.ni.daqmx import simulated
+        daq = simulated.simulate()          # all the daqmx classes now use it
+        daq.signals['Dev1/ai0'] = lambda t: np.sin(2 * np.pi * 50 * t)
+        ...
+        simulated.simulate(None)            # back to the NI library
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+import ctypes
+import threading
+import time
+
+import numpy as np
+
+from .constants import Constants
+
+ERROR_MESSAGES = {
+    -200088: 'Task specified is invalid or does not exist.',
+    -200089: 'Task name specified conflicts with an existing task name.',
+    -200170: 'Physical channel specified does not exist on this device.',
+    -200279: 'Attempted to read samples that are no longer available. '
+             'The requested sample was previously available, but has since been overwritten.',
+    -200284: 'Some or all of the samples requested have not yet been acquired.',
+    -200474: 'Specified operation did not complete, because the specified timeout expired.',
+    -200983: 'Task is not running.',
+}
+
+#: Physical channels of the simulated devices by default (a PCIe-6323 like device).
+DEFAULT_DEVICE = {'product_type': 'PCIe-6323 (simulated)',
+                  'ai': 32, 'ao': 4, 'ctr': 4, 'lines': 32}
+
+
+def _value(arg):
+    """Python value of an argument converted by the library wrapper."""
+    value = getattr(arg, 'value', arg)
+    return value.decode('ascii') if isinstance(value, bytes) else value
+
+
+def _set_string(buffer, size, value):
+    if buffer is not None and size:
+        buffer.value = value.encode('ascii')[:size - 1]
+
+
+def _array(address, ctype, size):
+    return np.ctypeslib.as_array(ctypes.cast(address, ctypes.POINTER(ctype)), shape=(size, ))
+
+
+class SimulatedTask(object):
+    """State of a simulated task."""
+
+    def __init__(self, name):
+        self.name = name
+        self.channels = []          # (name, physical channel, io type)
+        self.counts = {}            # current count of the counter channels
+        self.properties = {}
+        self.rate = 1000.
+        self.clock_source = ''
+        self.sample_mode = Constants.Val_FiniteSamps
+        self.samples_per_channel = 1000
+        self.start_trigger = None   # source terminal of the (arm) start trigger
+        self.running = False
+        self.t0 = None              # simulated start time, None while waiting for the trigger
+        self.read_position = 0
+        self.output = None          # samples written to an output task
+        self.every_n = None         # (function, samples, cb_data)
+        self.done = None            # (function, cb_data)
+        self.thread = None
+
+    @property
+    def io_type(self):
+        return self.channels[0][2] if self.channels else None
+
+    @property
+    def buffer_size(self):
+        if self.sample_mode == Constants.Val_FiniteSamps:
+            return self.samples_per_channel
+        return max(self.samples_per_channel, int(self.rate))
+
+
+class SimulatedDAQmx(object):
+    """Stand-in for the NI-DAQmx shared library (see the module docstring).
+
+    :param devices: names of the simulated devices, or dict of name to device description
+                    (see DEFAULT_DEVICE).
+    :param time_scale: speed of the simulated time relative to the wall clock.
+    :param seed: seed of the noise and of the counts.
+    """
+
+    def __init__(self, devices=('Dev1', ), time_scale=1., seed=None):
+        if not isinstance(devices, dict):
+            devices = {name: DEFAULT_DEVICE for name in devices}
+        self.devices = devices
+        self.time_scale = time_scale
+        #: physical channel to function of the time (s, array) giving the voltage of an analog
+        #: input or the count rate (Hz) of a counter input.
+        self.signals = {}
+        #: standard deviation of the noise added to the analog inputs, in V.
+        self.noise = 1e-3
+        #: count rate of the counters without signal, in Hz.
+        self.count_rate = 1e5
+        #: last value written to each analog output.
+        self.outputs = {}
+        self.tasks = {}
+        self._next_handle = 1
+        self._lock = threading.RLock()
+        self._epoch = time.perf_counter()
+        self._random = np.random.RandomState(seed)
+
+    def now(self):
+        """Simulated time, in s."""
+        return (time.perf_counter() - self._epoch) * self.time_scale
+
+    def _sleep(self, duration):
+        time.sleep(max(duration, 0) / self.time_scale)
+
+    def __getattr__(self, name):
+        # DAQmx properties without simulated behaviour are stored and returned as is
+        for prefix, method in (('DAQmxGet', self._get_property), ('DAQmxSet', self._set_property),
+                               ('DAQmxReset', self._reset_property)):
+            if name.startswith(prefix):
+                key = name[len(prefix):]
+                return lambda *args: method(key, *args)
+        raise AttributeError(name)
+
+    # Properties
+
+    def _property_store(self, args):
+        task = self.tasks.get(args[0]) if args and isinstance(args[0], int) else None
+        if task is not None:
+            return task.properties, tuple(_value(arg) for arg in args[1:])
+        return self.__dict__.setdefault('_properties', {}), tuple(_value(arg) for arg in args)
+
+    def _get_property(self, key, *args):
+        if len(args) >= 2 and isinstance(args[-2], ctypes.Array) and args[-2]._type_ is ctypes.c_char:
+            store, where = self._property_store(args[:-2])
+            _set_string(args[-2], args[-1], str(store.get((key, ) + where, '')))
+        else:
+            store, where = self._property_store(args[:-1])
+            args[-1][0] = store.get((key, ) + where, 0)
+        return 0
+
+    def _set_property(self, key, *args):
+        store, where = self._property_store(args[:-1])
+        store[(key, ) + where] = _value(args[-1])
+        return 0
+
+    def _reset_property(self, key, *args):
+        store, where = self._property_store(args)
+        store.pop((key, ) + where, None)
+        return 0
+
+    # Errors
+
+    def DAQmxGetErrorString(self, error_code, buffer, size):
+        message = ERROR_MESSAGES.get(error_code, 'Error {} (simulated NI-DAQmx).'.format(error_code))
+        if buffer is None:
+            return len(message) + 1
+        _set_string(buffer, size, message)
+        return 0
+
+    def DAQmxGetExtendedErrorInfo(self, buffer, size):
+        if buffer is None:
+            return 1
+        _set_string(buffer, size, '')
+        return 0
+
+    # System and devices
+
+    def DAQmxGetSysNIDAQMajorVersion(self, value):
+        value[0] = 15
+        return 0
+
+    def DAQmxGetSysNIDAQMinorVersion(self, value):
+        value[0] = 5
+        return 0
+
+    def DAQmxGetSysDevNames(self, buffer, size):
+        _set_string(buffer, size, ', '.join(self.devices))
+        return 0
+
+    def DAQmxGetSysTasks(self, buffer, size):
+        _set_string(buffer, size, '')
+        return 0
+
+    def DAQmxGetSysGlobalChans(self, buffer, size):
+        _set_string(buffer, size, '')
+        return 0
+
+    def _physical_channels(self, device, kind):
+        device = _value(device)
+        description = self.devices[device]
+        if kind == 'ports':
+            return ['{}/port0'.format(device)]
+        if kind == 'lines':
+            return ['{}/port0/line{}'.format(device, i) for i in range(description['lines'])]
+        return ['{}/{}{}'.format(device, kind, i) for i in range(description[kind])]
+
+    def _dev_channels(kind):
+        def func(self, device, buffer, size):
+            _set_string(buffer, size, ', '.join(self._physical_channels(device, kind)))
+            return 0
+        return func
+
+    DAQmxGetDevAIPhysicalChans = _dev_channels('ai')
+    DAQmxGetDevAOPhysicalChans = _dev_channels('ao')
+    DAQmxGetDevCIPhysicalChans = _dev_channels('ctr')
+    DAQmxGetDevCOPhysicalChans = _dev_channels('ctr')
+    DAQmxGetDevDILines = _dev_channels('lines')
+    DAQmxGetDevDOLines = _dev_channels('lines')
+    DAQmxGetDevDIPorts = _dev_channels('ports')
+    DAQmxGetDevDOPorts = _dev_channels('ports')
+    del _dev_channels
+
+    def DAQmxGetDevIsSimulated(self, device, value):
+        value[0] = 1
+        return 0
+
+    def DAQmxGetDevProductType(self, device, buffer, size):
+        _set_string(buffer, size, self.devices[_value(device)]['product_type'])
+        return 0
+
+    def DAQmxGetDevBusType(self, device, value):
+        value[0] = Constants.Val_PCIe
+        return 0
+
+    def DAQmxResetDevice(self, device):
+        device = _value(device)
+        for handle, task in list(self.tasks.items()):
+            if any(physical.startswith(device + '/') for name, physical, io_type in task.channels):
+                self.DAQmxClearTask(handle)
+        return 0
+
+    # Tasks
+
+    def _task(self, handle):
+        return self.tasks[_value(handle)]
+
+    def DAQmxLoadTask(self, name, handle):
+        # there are no tasks saved in MAX
+        return -200088
+
+    def DAQmxCreateTask(self, name, handle):
+        with self._lock:
+            name = _value(name) or '_unnamedTask<{}>'.format(self._next_handle)
+            if any(task.name == name for task in self.tasks.values()):
+                return -200089
+            handle[0] = self._next_handle
+            self.tasks[self._next_handle] = SimulatedTask(name)
+            self._next_handle += 1
+        return 0
+
+    def DAQmxGetTaskName(self, handle, buffer, size):
+        _set_string(buffer, size, self._task(handle).name)
+        return 0
+
+    def DAQmxGetTaskChannels(self, handle, buffer, size):
+        _set_string(buffer, size, ', '.join(name for name, physical, io_type in self._task(handle).channels))
+        return 0
+
+    def DAQmxGetTaskDevices(self, handle, buffer, size):
+        devices = []
+        for name, physical, io_type in self._task(handle).channels:
+            device = physical.strip('/').split('/')[0]
+            if device not in devices:
+                devices.append(device)
+        _set_string(buffer, size, ', '.join(devices))
+        return 0
+
+    def DAQmxClearTask(self, handle):
+        if _value(handle) in self.tasks:
+            self.DAQmxStopTask(handle)
+            del self.tasks[_value(handle)]
+        return 0
+
+    def _add_channel(self, handle, physical, name, io_type):
+        physical = _value(physical).strip('/')
+        device, channel = physical.split('/', 1)
+        if device not in self.devices:
+            return -200170
+        task = self._task(handle)
+        task.channels.append((_value(name) or physical, physical, io_type))
+        return 0
+
+    def DAQmxCreateAIVoltageChan(self, handle, physical, name, terminal, min_val, max_val, units, scale):
+        return self._add_channel(handle, physical, name, 'AI')
+
+    def DAQmxCreateAOVoltageChan(self, handle, physical, name, min_val, max_val, units, scale):
+        return self._add_channel(handle, physical, name, 'AO')
+
+    def DAQmxCreateCICountEdgesChan(self, handle, counter, name, edge, initial_count, direction):
+        err = self._add_channel(handle, counter, name, 'CI')
+        self._task(handle).counts[_value(counter).strip('/')] = _value(initial_count)
+        return err
+
+    def DAQmxCreateDIChan(self, handle, lines, name, grouping):
+        return self._add_channel(handle, lines, name, 'DI')
+
+    def DAQmxCreateDOChan(self, handle, lines, name, grouping):
+        return self._add_channel(handle, lines, name, 'DO')
+
+    # Timing and triggering
+
+    def DAQmxCfgSampClkTiming(self, handle, source, rate, active_edge, sample_mode, samples_per_channel):
+        task = self._task(handle)
+        task.clock_source = _value(source) or ''
+        task.rate = float(_value(rate))
+        task.sample_mode = _value(sample_mode)
+        task.samples_per_channel = int(_value(samples_per_channel))
+        return 0
+
+    def DAQmxCfgImplicitTiming(self, handle, sample_mode, samples_per_channel):
+        task = self._task(handle)
+        task.sample_mode = _value(sample_mode)
+        task.samples_per_channel = int(_value(samples_per_channel))
+        return 0
+
+    def DAQmxGetSampClkRate(self, handle, value):
+        value[0] = self._task(handle).rate
+        return 0
+
+    def DAQmxSetSampClkRate(self, handle, value):
+        self._task(handle).rate = float(_value(value))
+        return 0
+
+    def DAQmxGetSampClkMaxRate(self, handle, value):
+        value[0] = 1e6
+        return 0
+
+    def DAQmxGetAIConvMaxRate(self, handle, value):
+        value[0] = 1e6
+        return 0
+
+    def DAQmxCfgDigEdgeStartTrig(self, handle, source, edge):
+        self._task(handle).start_trigger = _value(source)
+        return 0
+
+    def DAQmxSetDigEdgeArmStartTrigSrc(self, handle, source):
+        self._task(handle).start_trigger = _value(source)
+        return 0
+
+    def DAQmxDisableStartTrig(self, handle):
+        self._task(handle).start_trigger = None
+        return 0
+
+    @staticmethod
+    def _internal_source(terminal):
+        """io type ('ai', 'ao', ...) of an internal trigger or clock terminal, None for external ones."""
+        parts = (terminal or '').strip('/').split('/')
+        if len(parts) >= 2 and parts[-1] in ('StartTrigger', 'SampleClock'):
+            return parts[-2].upper()
+        return None
+
+    # States
+
+    def DAQmxStartTask(self, handle):
+        with self._lock:
+            task = self._task(handle)
+            if task.running:
+                return 0
+            task.running = True
+            task.read_position = 0
+            source = self._internal_source(task.start_trigger) or self._internal_source(task.clock_source)
+            if source is None:
+                # no trigger, or an external one which is assumed to come right away
+                task.t0 = self.now()
+                self._triggered(task)
+            else:
+                task.t0 = None
+        self._start_events(handle, task)
+        return 0
+
+    def _triggered(self, source_task):
+        """Start the tasks waiting for the start trigger (or the sample clock) of source_task."""
+        for task in self.tasks.values():
+            if task.running and task.t0 is None and source_task.io_type in (
+                    self._internal_source(task.start_trigger), self._internal_source(task.clock_source)):
+                task.t0 = source_task.t0
+
+    def DAQmxStopTask(self, handle):
+        task = self._task(handle)
+        with self._lock:
+            if task.running and task.io_type == 'AO' and task.output is not None and len(task.output):
+                for (name, physical, io_type), value in zip(task.channels, task.output[self._generated(task) - 1]):
+                    self.outputs[physical] = value
+            task.running = False
+        thread, task.thread = task.thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return 0
+
+    def DAQmxTaskControl(self, handle, action):
+        if _value(action) == Constants.Val_Task_Start:
+            return self.DAQmxStartTask(handle)
+        elif _value(action) in (Constants.Val_Task_Stop, Constants.Val_Task_Abort):
+            return self.DAQmxStopTask(handle)
+        return 0
+
+    def _acquired(self, task, now=None):
+        """Number of samples per channel acquired (or generated) so far."""
+        if not task.running or task.t0 is None:
+            return 0
+        now = self.now() if now is None else now
+        n = int(max(now - task.t0, 0) * task.rate)
+        if task.sample_mode == Constants.Val_FiniteSamps:
+            n = min(n, task.samples_per_channel)
+        return n
+
+    def _generated(self, task):
+        n = self._acquired(task) if task.running else len(task.output)
+        return max(min(n, len(task.output)), 1)
+
+    def _is_done(self, task):
+        return (not task.running or (task.sample_mode == Constants.Val_FiniteSamps and
+                                     self._acquired(task) >= task.samples_per_channel))
+
+    def DAQmxIsTaskDone(self, handle, value):
+        value[0] = int(self._is_done(self._task(handle)))
+        return 0
+
+    def DAQmxWaitUntilTaskDone(self, handle, timeout):
+        task = self._task(handle)
+        timeout = _value(timeout)
+        deadline = None if timeout < 0 else self.now() + timeout
+        while not self._is_done(task):
+            if task.t0 is not None:
+                remaining = task.t0 + task.samples_per_channel / task.rate - self.now()
+            else:
+                remaining = 1e-3
+            if deadline is not None:
+                if self.now() >= deadline:
+                    return -200474
+                remaining = min(remaining, deadline - self.now())
+            self._sleep(min(max(remaining, 1e-4), 0.1))
+        return 0
+
+    def DAQmxGetReadAvailSampPerChan(self, handle, value):
+        task = self._task(handle)
+        value[0] = self._acquired(task) - task.read_position
+        return 0
+
+    def DAQmxGetReadTotalSampPerChanAcquired(self, handle, value):
+        value[0] = self._acquired(self._task(handle))
+        return 0
+
+    def DAQmxGetReadCurrReadPos(self, handle, value):
+        value[0] = self._task(handle).read_position
+        return 0
+
+    # Reading
+
+    def _wait_samples(self, task, samples_per_channel, timeout):
+        """Number of samples to read, waiting for them (and an error code)."""
+        if not task.running:
+            return 0, -200983
+        if samples_per_channel < 0:
+            if task.sample_mode == Constants.Val_FiniteSamps:
+                samples_per_channel = task.samples_per_channel - task.read_position
+            else:
+                return self._acquired(task) - task.read_position, 0
+        if task.sample_mode == Constants.Val_FiniteSamps:
+            samples_per_channel = min(samples_per_channel, task.samples_per_channel - task.read_position)
+        target = task.read_position + samples_per_channel
+        deadline = None if timeout < 0 else self.now() + timeout
+        while self._acquired(task) < target:
+            if not task.running:
+                return 0, -200983
+            now = self.now()
+            if deadline is not None and now >= deadline:
+                return self._acquired(task) - task.read_position, -200284
+            if task.t0 is None:
+                wait = 1e-3
+            else:
+                wait = task.t0 + target / task.rate - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            self._sleep(min(max(wait, 1e-5), 0.1))
+        if self._acquired(task) - task.read_position > task.buffer_size:
+            return 0, -200279
+        return samples_per_channel, 0
+
+    def _times(self, task, n):
+        return (task.t0 or 0.) + (task.read_position + np.arange(n)) / task.rate
+
+    def _analog_samples(self, task, n):
+        t = self._times(task, n)
+        data = np.empty((n, len(task.channels)))
+        for i, (name, physical, io_type) in enumerate(task.channels):
+            signal = self.signals.get(physical)
+            data[:, i] = signal(t) if signal is not None else 0.
+        if self.noise:
+            data += self._random.normal(0., self.noise, data.shape)
+        return data
+
+    def _counter_samples(self, task, n):
+        name, physical, io_type = task.channels[0]
+        signal = self.signals.get(physical)
+        rate = signal(self._times(task, n)) if signal is not None else self.count_rate
+        counts = np.cumsum(self._random.poisson(np.broadcast_to(rate, (n, )) / task.rate), dtype=np.uint64)
+        counts += task.counts[physical]
+        task.counts[physical] = int(counts[-1] % 2 ** 32) if n else task.counts[physical]
+        return counts.astype(np.uint32)
+
+    def DAQmxReadAnalogF64(self, handle, samples_per_channel, timeout, fill_mode, data, size, read, reserved):
+        task = self._task(handle)
+        n_channels = len(task.channels)
+        n, err = self._wait_samples(task, _value(samples_per_channel), _value(timeout))
+        n = min(n, _value(size) // n_channels)
+        samples = self._analog_samples(task, n)
+        out = _array(data, ctypes.c_double, _value(size))
+        if _value(fill_mode) == Constants.Val_GroupByScanNumber:
+            out[:n * n_channels] = samples.ravel()
+        else:
+            out.reshape(n_channels, -1)[:, :n] = samples.T
+        task.read_position += n
+        read[0] = n
+        return err
+
+    def DAQmxReadAnalogScalarF64(self, handle, timeout, value, reserved):
+        task = self._task(handle)
+        value[0] = self._analog_samples(task, 1)[0, 0]
+        return 0
+
+    def DAQmxReadCounterU32(self, handle, samples_per_channel, timeout, data, size, read, reserved):
+        task = self._task(handle)
+        n, err = self._wait_samples(task, _value(samples_per_channel), _value(timeout))
+        n = min(n, _value(size))
+        _array(data, ctypes.c_uint32, n)[:] = self._counter_samples(task, n)
+        task.read_position += n
+        read[0] = n
+        return err
+
+    def DAQmxReadCounterScalarF64(self, handle, timeout, value, reserved):
+        task = self._task(handle)
+        value[0] = float(self._counter_samples(task, 1)[0])
+        return 0
+
+    # Writing
+
+    def DAQmxWriteAnalogF64(self, handle, samples_per_channel, auto_start, timeout, data_layout, data, written,
+                            reserved):
+        task = self._task(handle)
+        n, n_channels = _value(samples_per_channel), len(task.channels)
+        samples = _array(data, ctypes.c_double, n * n_channels)
+        if _value(data_layout) == Constants.Val_GroupByScanNumber:
+            task.output = samples.reshape(n, n_channels).copy()
+        else:
+            task.output = samples.reshape(n_channels, n).T.copy()
+        if written is not None:
+            written[0] = n
+        if _value(auto_start):
+            self.DAQmxStartTask(handle)
+        return 0
+
+    def DAQmxWriteAnalogScalarF64(self, handle, auto_start, timeout, value, reserved):
+        task = self._task(handle)
+        task.output = np.full((1, len(task.channels)), _value(value))
+        for name, physical, io_type in task.channels:
+            self.outputs[physical] = _value(value)
+        return 0
+
+    # Events
+
+    def DAQmxRegisterEveryNSamplesEvent(self, handle, event_type, samples, options, func, cb_data):
+        self._task(handle).every_n = None if func is None else (func, _value(samples), cb_data)
+        return 0
+
+    def DAQmxRegisterDoneEvent(self, handle, options, func, cb_data):
+        self._task(handle).done = None if func is None else (func, cb_data)
+        return 0
+
+    def _start_events(self, handle, task):
+        if task.every_n is None and task.done is None:
+            return
+        task.thread = threading.Thread(target=self._run_events, args=(handle, task),
+                                       name='Simulated DAQmx events', daemon=True)
+        task.thread.start()
+
+    def _run_events(self, handle, task):
+        event_type = (Constants.Val_Transferred_From_Buffer if task.io_type in ('AO', 'DO', 'CO')
+                      else Constants.Val_Acquired_Into_Buffer)
+        n_events = 0
+        while task.running:
+            if task.every_n is not None:
+                func, samples, cb_data = task.every_n
+                if self._acquired(task) >= (n_events + 1) * samples:
+                    n_events += 1
+                    func(handle, event_type, samples, cb_data)
+                    continue
+            if self._is_done(task):
+                if task.done is not None:
+                    func, cb_data = task.done
+                    func(handle, 0, cb_data)
+                return
+            if task.t0 is None or task.every_n is None:
+                wait = 1e-3
+            else:
+                wait = task.t0 + (n_events + 1) * task.every_n[1] / task.rate - self.now()
+            self._sleep(min(max(wait, 1e-5), 0.1))
+
+
+def simulate(library=True):
+    """Use a simulated library in all the daqmx classes created from now on.
+
+    :param library: SimulatedDAQmx to use, True for a new one, None to go back to the NI library.
+    :return: the simulated library.
+    """
+    from .base import _Base
+    if library is True:
+        library = SimulatedDAQmx()
+    _Base.simulated_library = library
+    return library
+
+
+def benchmark(rate=1e6, n_channels=2, chunk=10000, duration=1.):
+    """Acquire continuously from a simulated analog input task with ContinuousAcquisition
+    and print the sustained read rate, the number of scans overwritten and the error
+    that stopped the acquisition, if any.
+    """
+    from .acquisition import ContinuousAcquisition
+    from .base import _Base
+    from .channels import VoltageInputChannel
+    from .tasks import AnalogInputTask
+
+    previous = _Base.simulated_library
+    daq = simulate()
+    daq.noise = 0.
+    try:
+        task = AnalogInputTask()
+        for i in range(n_channels):
+            VoltageInputChannel('Dev1/ai{}'.format(i), task=task)
+        task.configure_timing_sample_clock(rate=rate, sample_mode='continuous', samples_per_channel=int(rate))
+        acquisition = ContinuousAcquisition(task, chunk=chunk)
+        start = time.perf_counter()
+        with acquisition:
+            time.sleep(duration)
+        elapsed = time.perf_counter() - start
+        buffer = acquisition.buffer
+        print('{} channels at {:.0f} S/s: {:.0f} S/s read, {} scans overwritten, error: {}'.format(
+              n_channels, rate, buffer.total / elapsed, buffer.overwritten, acquisition.error))
+        task.clear()
+    finally:
+        _Base.simulated_library = previous
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -66,8 +66,8 @@ class AnalogInputTask(Task):
         err, value = self.lib.ReadAnalogScalarF64(timeout, RetValue('f64'), None)
         return value
 
-    @Action(units=(None, 'seconds', None), values=(None, None, _GROUP_BY))
-    def read(self, samples_per_channel=None, timeout=Q_(10.0, 's'), group_by='channel'):
+    @Action(units=(None, 'seconds', None, None), values=(None, None, _GROUP_BY, None))
+    def read(self, samples_per_channel=None, timeout=Q_(10.0, 's'), group_by='channel', out=None):
         """Reads multiple floating-point samples from a task that
         contains one or more analog input channels.
 
@@ -117,32 +117,54 @@ class AnalogInputTask(Task):
 
                 ch0:s1, ch1:s1, ch2:s1, ch0:s2, ch1:s2, ch2:s2,...
 
-        :rtype: numpy.ndarray
+        :param out: float64 array to read into, of shape (samples, channels) when
+          grouping by scan and (channels, samples) when grouping by channel.
+          samples_per_channel defaults to the number of samples it holds.
+
+        :rtype: numpy.ndarray (a view of out, if given)
         """
 
-        if samples_per_channel is None:
-            samples_per_channel = self.samples_per_channel_available()
+        if out is None:
+            if samples_per_channel is None:
+                samples_per_channel = self.samples_per_channel_available()
+            number_of_channels = self.number_of_channels()
+            if group_by == Constants.Val_GroupByScanNumber:
+                out = np.empty((samples_per_channel, number_of_channels), dtype=np.float64)
+            else:
+                out = np.empty((number_of_channels, samples_per_channel), dtype=np.float64)
+        elif samples_per_channel is not None:
+            if group_by == Constants.Val_GroupByScanNumber:
+                out = out[:samples_per_channel]
+            else:
+                # keep the channel blocks contiguous, as DAQmx writes them
+                out = out.reshape(-1)[:len(out) * samples_per_channel].reshape(len(out), samples_per_channel)
 
-        number_of_channels = self.number_of_channels()
-        if group_by == Constants.Val_GroupByScanNumber:
-            data = np.zeros((samples_per_channel, number_of_channels),
-                            dtype=np.float64)
-        else:
-            data = np.zeros((number_of_channels, samples_per_channel),
-                            dtype=np.float64)
+        count = self.read_into(out, timeout, group_by)
 
+        if group_by == Constants.Val_GroupByScanNumber:
+            return out[:count]
+        return out[:, :count]
+
+    def read_into(self, out, timeout=10.0, group_by='scan'):
+        """Read into a preallocated float64 array without any other call to the
+        library, which makes it suitable for continuous acquisitions (see
+        lantz.drivers.ni.daqmx.acquisition).
+
+        :param out: C-contiguous array of shape (samples, channels) when grouping by scan
+                    and (channels, samples) when grouping by channel.
+        :param timeout: in seconds, -1 to wait indefinitely.
+        :param group_by: 'scan' or 'channel' (or the corresponding DAQmx constant).
+        :return: the number of samples per channel read.
+        """
+        group_by = _GROUP_BY.get(group_by, group_by)
+        if out.dtype != np.float64 or not out.flags.c_contiguous:
+            raise ValueError('out must be a C-contiguous float64 array')
+        samples_per_channel = out.shape[0] if group_by == Constants.Val_GroupByScanNumber else out.shape[-1]
         err, count = self.lib.ReadAnalogF64(samples_per_channel, timeout,
-                                            group_by, data.ctypes.data,
-                                            data.size, RetValue('i32'),
+                                            group_by, out.ctypes.data,
+                                            out.size, RetValue('i32'),
                                             None)
-
-        if samples_per_channel < count:
-            if group_by == 'scan':
-                return data[:count]
-            else:
-                return data[:, :count]
-
-        return data
+        return count
 
 
 class AnalogOutputTask(Task):
@@ -360,13 +382,13 @@ class DigitalOutputTask(DigitalTask):
         contain the number of bytes returned by the
         DAQmx_Read_DigitalLines_BytesPerChan property.
 
-	Note: If you configured timing for your task, your write is
-	considered a buffered write. Buffered writes require a minimum
-	buffer size of 2 samples. If you do not configure the buffer
-	size using DAQmxCfgOutputBuffer, NI-DAQmx automatically
-	configures the buffer when you configure sample timing. If you
-	attempt to write one sample for a buffered write without
-	configuring the buffer, you will receive an error.
+        Note: If you configured timing for your task, your write is
+        considered a buffered write. Buffered writes require a minimum
+        buffer size of 2 samples. If you do not configure the buffer
+        size using DAQmxCfgOutputBuffer, NI-DAQmx automatically
+        configures the buffer when you configure sample timing. If you
+        attempt to write one sample for a buffered write without
+        configuring the buffer, you will receive an error.
 
         Parameters
         ----------
@@ -470,7 +492,7 @@ class CounterInputTask(Task):
         err, value = self.lib.ReadCounterScalarF64(timeout.to('s').magnitude, RetValue('f64'), None)
         return value
 
-    def read(self, samples_per_channel=None, timeout=Q_(10.0, 's')):
+    def read(self, samples_per_channel=None, timeout=Q_(10.0, 's'), out=None):
         """Read multiple 32-bit integer samples from a counter task.
         Use this function when counter samples are returned unscaled,
         such as for edge counting.
@@ -509,19 +531,34 @@ class CounterInputTask(Task):
           is successful. Otherwise, the function returns a timeout
           error and returns the samples that were actually read.
 
+        :param out: uint32 array to read into, samples_per_channel defaults to its length.
 
-        :return: The array of samples read.
+        :return: The array of samples read (a view of out, if given).
         """
 
-        if samples_per_channel is None:
-            samples_per_channel = self.samples_per_channel_available()
+        if out is None:
+            if samples_per_channel is None:
+                samples_per_channel = self.samples_per_channel_available()
+            out = np.empty((samples_per_channel,), dtype=np.uint32)
+        elif samples_per_channel is not None:
+            out = out[:samples_per_channel]
 
-        data = np.zeros((samples_per_channel,), dtype=np.int32)
+        count = self.read_into(out, float(Q_(timeout, 's').magnitude))
+        return out[:count]
 
-        err, count = self.lib.ReadCounterU32(samples_per_channel, float(timeout.to('s').magnitude),
-                                             data.ctypes.data, data.size, RetValue('i32'), None)
+    def read_into(self, out, timeout=10.0):
+        """Read into a preallocated uint32 array without any other call to the
+        library (see AnalogInputTask.read_into).
 
-        return data[:count]
+        :param out: C-contiguous uint32 array, its length is the number of samples to read.
+        :param timeout: in seconds, -1 to wait indefinitely.
+        :return: the number of samples read.
+        """
+        if out.dtype != np.uint32 or not out.flags.c_contiguous:
+            raise ValueError('out must be a C-contiguous uint32 array')
+        err, count = self.lib.ReadCounterU32(len(out), timeout, out.ctypes.data, out.size,
+                                             RetValue('i32'), None)
+        return count
 
 
 class CounterOutputTask(Task):
@@ -0,0 +1,89 @@
+"""
+    Tests of the streamed acquisitions (acquisition) and of the smooth moves of the
+    FSM300 through the daqmx classes, against the simulated library (simulated).
+"""
+
+import asyncio
+import time
+import unittest
+
+import numpy as np
+from lantz.core import Q_
+
+from lantz.drivers.newport.fsm300 import FSM300
+from lantz.drivers.ni.daqmx import simulated
+from lantz.drivers.ni.daqmx.acquisition import ContinuousAcquisition
+from lantz.drivers.ni.daqmx.channels import VoltageInputChannel
+from lantz.drivers.ni.daqmx.tasks import AnalogInputTask
+
+
+class SimulatedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.daq = simulated.simulate(simulated.SimulatedDAQmx(time_scale=10., seed=0))
+        self.daq.noise = 0.
+        self.daq.signals['Dev1/ai0'] = lambda t: np.full(np.shape(t), 1.5)
+        self.daq.signals['Dev1/ai1'] = lambda t: np.full(np.shape(t), -2.)
+
+    def tearDown(self):
+        simulated.simulate(None)
+
+    def input_task(self, rate=1e4):
+        task = AnalogInputTask()
+        VoltageInputChannel('Dev1/ai0', task=task)
+        VoltageInputChannel('Dev1/ai1', task=task)
+        task.configure_timing_sample_clock(rate=rate, sample_mode='continuous', samples_per_channel=int(rate))
+        self.addCleanup(task.clear)
+        return task
+
+
+class TestContinuousAcquisition(SimulatedTestCase):
+
+    def test_acquisition(self):
+        acquisition = ContinuousAcquisition(self.input_task(), chunk=1000)
+        with acquisition:
+            time.sleep(0.2)
+        self.assertIsNone(acquisition.error)
+        buffer = acquisition.buffer
+        self.assertGreaterEqual(buffer.total, 10000)
+        self.assertEqual(buffer.total % 1000, 0)
+        self.assertEqual(buffer.overwritten, 0)
+        np.testing.assert_array_equal(buffer.read(), np.tile([1.5, -2.], (buffer.total, 1)))
+
+
+class TestTaskStream(SimulatedTestCase):
+
+    def test_sync(self):
+        with self.input_task().stream(chunk=1000, n_chunks=5) as stream:
+            chunks = list(stream)
+        self.assertEqual(len(chunks), 5)
+        for chunk in chunks:
+            np.testing.assert_array_equal(chunk, np.tile([1.5, -2.], (1000, 1)))
+        self.assertEqual(stream.stats['chunks'], 5)
+
+    def test_async(self):
+        async def consume(stream):
+            async with stream:
+                return [chunk.shape async for chunk in stream]
+
+        shapes = asyncio.run(consume(self.input_task().stream(chunk=500, n_chunks=4)))
+        self.assertEqual(shapes, [(500, 2)] * 4)
+
+
+class TestFSM300(SimulatedTestCase):
+
+    def test_smooth_move(self):
+        fsm = FSM300('Dev1/ao0', 'Dev1/ao1')
+        fsm.initialize()
+        self.addCleanup(fsm.finalize)
+        # 10 um/V along x and 7.6 um/V along y by default
+        fsm.abs_position = (Q_(10, 'um'), Q_(-7.6, 'um'))
+        self.assertAlmostEqual(self.daq.outputs['Dev1/ao0'], 1.)
+        self.assertAlmostEqual(self.daq.outputs['Dev1/ao1'], -1.)
+        fsm.abs_position = (Q_(0, 'um'), Q_(0, 'um'))
+        self.assertAlmostEqual(self.daq.outputs['Dev1/ao0'], 0.)
+        self.assertAlmostEqual(self.daq.outputs['Dev1/ao1'], 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,7 @@
 from .ph300 import PH300
+from .tttr import TTTRDecoder, TTTRReader, TTTRWriter
+from .acquisition import TTTRAcquisition
+from .histogram import CountRateHistogram, G2Histogram, HistogramEngine, LifetimeHistogram
 
-__all__ = ['PH300']
+__all__ = ['PH300', 'TTTRDecoder', 'TTTRReader', 'TTTRWriter', 'TTTRAcquisition',
+           'G2Histogram', 'LifetimeHistogram', 'CountRateHistogram', 'HistogramEngine']
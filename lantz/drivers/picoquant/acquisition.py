@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.picoquant.acquisition
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Background streaming of the time tagged records of a PicoHarp 300.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from lantz.drivers.ring_buffer import RingBuffer
+
+from .ph300 import ACQTMAX, TTREADMAX
+from .tttr import TTTRDecoder
+
+
+class TTTRAcquisition(object):
+    """Reads the FIFO of a PH300 in a thread, directly into the slots of a
+    RingBuffer of raw records: nothing is allocated once started, so the reader
+    keeps up with the FIFO at the maximum count rates. The records are decoded
+    by the consumer, in chunks, with read_events. Example::
+
+        with TTTRAcquisition(ph) as acq:
+            while acq.running or acq.buffer.unread:
+                events = acq.read_events()
+                ...
+
+    The measurement ends after measurement_time, when stop is called, or when the
+    FIFO of the device overflows (the error is then kept in `error`).
+
+    To record the measurement, pass a TTTRWriter: the records are appended to
+    its file by the reader thread as they are read from the FIFO.
+
+    :param device: PH300 (initialized in T2 or T3 mode).
+    :param chunk: maximum number of records read from the FIFO at once (at most TTREADMAX).
+    :param size: number of records kept by the ring buffer, rounded up to a multiple of chunk
+                 (default: 64 chunks).
+    :param measurement_time: duration of the measurement, in ms.
+    :param poll_interval: waiting time when the FIFO is empty, in s.
+    :param writer: TTTRWriter receiving all the records, or None.
+    """
+
+    def __init__(self, device, chunk=TTREADMAX, size=None, measurement_time=ACQTMAX, poll_interval=1e-3,
+                 writer=None):
+        self.device = device
+        self.chunk = chunk
+        self.measurement_time = measurement_time
+        self.poll_interval = poll_interval
+        self.writer = writer
+
+        if size is None:
+            size = 64 * chunk
+        #: RingBuffer receiving the raw records.
+        self.buffer = RingBuffer(-(-size // chunk) * chunk, dtype=np.uint32)
+        #: decoder of the records of the current measurement.
+        self.decoder = TTTRDecoder(device.mode)
+        #: exception that stopped the acquisition, if any.
+        self.error = None
+
+        self._overwritten = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True until the measurement has ended and all its records are in the buffer."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def read_chunk(self):
+        """Read the records available in the FIFO (at most chunk) into the buffer."""
+        buffer = self.buffer
+        slots = buffer.reserve(self.chunk)
+        count = self.device.read_fifo_into(slots)
+        if count and self.writer is not None:
+            self.writer.write(slots[:count])
+        buffer.commit(count)
+        return count
+
+    def read_records(self, max_records=None):
+        """Copy of the raw records not read yet."""
+        return self.buffer.read(max_records)
+
+    def read_events(self, max_records=None):
+        """Decoded events (see TTTRDecoder) of the records not read yet.
+
+        The absolute times rely on every overflow record being decoded: if the
+        consumer is too slow and records are overwritten, before or while they
+        are decoded, RuntimeError is raised.
+        """
+        buffer = self.buffer
+        records = buffer.read_view(max_records)
+        events = [self.decoder.decode(records)]
+        if max_records is not None:
+            # the overflow records are not in the events
+            max_records -= len(records)
+        if buffer.unread and max_records != 0:
+            # the records after the wrap of the storage
+            events.append(self.decoder.decode(buffer.read_view(max_records)))
+        # the events are decoded in new arrays: the slots can be reused
+        buffer.release_view()
+        if buffer.overwritten != self._overwritten:
+            self._overwritten = buffer.overwritten
+            raise RuntimeError('{} records were overwritten before being decoded, '
+                               'the time base is lost'.format(buffer.overwritten))
+        return events[0] if len(events) == 1 else np.concatenate(events)
+
+    def start(self):
+        self.buffer.clear()
+        self.decoder.reset()
+        self.error = None
+        self._overwritten = 0
+        self._stop_event.clear()
+        self.device.start_measurement(self.measurement_time)
+        self._thread = threading.Thread(target=self._run, name='PH300 acquisition', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.device.stop_measurement()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                if not self.read_chunk():
+                    if not self.device.measurement_done:
+                        time.sleep(self.poll_interval)
+                    elif not self.read_chunk():
+                        # the measurement is over and its last records were read
+                        break
+        except Exception as e:
+            self.error = e
+        if self.writer is not None:
+            self.writer.flush()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.picoquant.histogram
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Online correlation (g2), lifetime and count rate histograms of the events
+    of a PicoHarp 300, updated chunk by chunk in fixed memory.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from lantz.drivers.ring_buffer import RingBuffer
+
+from .tttr import SPECIAL_CHANNEL, event_times
+
+
+def _channel_index(channels):
+    """Lookup table from channel number to the index of the channel in channels (-1 if absent)."""
+    lookup = np.full(SPECIAL_CHANNEL + 1, -1, dtype=np.int64)
+    lookup[list(channels)] = np.arange(len(channels))
+    return lookup
+
+
+class Accumulator(object):
+    """Base of the histograms: update, reset and snapshot can be called from
+    different threads, e.g. snapshots while an acquisition updates the histogram.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def update(self, events):
+        """Add the events (decoded by TTTRDecoder, in order) to the histogram."""
+        with self._lock:
+            self._update(events)
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def snapshot(self):
+        """Copy of the current state of the histogram, as a dict of arrays."""
+        with self._lock:
+            return self._snapshot()
+
+    def _update(self, events):
+        raise NotImplementedError
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _snapshot(self):
+        raise NotImplementedError
+
+
+class G2Histogram(Accumulator):
+    """Histogram of the delays t_b - t_a between the photons of channel_a and
+    channel_b, for delays in [-n_bins * bin_width / 2, n_bins * bin_width / 2).
+
+    The pairs are found by a sorted merge (searchsorted) of the times of both
+    channels. Only the photons closer than the half range to the end of the
+    previous chunk are kept between updates.
+
+    :param bin_width: width of a bin, in resolution units.
+    :param sync_period: sync period in resolution units, for T3 events.
+    """
+
+    def __init__(self, channel_a=0, channel_b=1, bin_width=1, n_bins=1000, sync_period=None):
+        self.channel_a = channel_a
+        self.channel_b = channel_b
+        self.bin_width = bin_width
+        self.n_bins = n_bins
+        self.sync_period = sync_period
+        self.half_range = n_bins * bin_width // 2
+        #: delay of the start of each bin, in resolution units.
+        self.delays = np.arange(n_bins) * bin_width - self.half_range
+        super().__init__()
+
+    def _reset(self):
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        self.n_a = self.n_b = 0
+        self.first_time = self.last_time = None
+        self._a_tail = self._b_tail = np.empty(0, dtype=np.int64)
+
+    def _add_pairs(self, b, a):
+        # for each b, the a in (b - half_range, b + half_range] (a is sorted)
+        half = self.half_range
+        lo = np.searchsorted(a, b - half, 'right')
+        n = np.searchsorted(a, b + half, 'right') - lo
+        total = int(n.sum())
+        if not total:
+            return
+        # all the pairs at once: b repeated n times, with the a of lo to lo + n - 1
+        first = np.cumsum(n) - n
+        delays = np.repeat(b, n) - a[np.arange(total) + np.repeat(lo - first, n)]
+        delays += half
+        delays //= self.bin_width
+        self.counts += np.bincount(delays, minlength=self.n_bins)
+
+    def _update(self, events):
+        if not len(events):
+            return
+        times = event_times(events, self.sync_period)
+        channel = events['channel']
+        a = times[channel == self.channel_a]
+        b = times[channel == self.channel_b]
+
+        # new b with all the a kept, then the b kept with the new a
+        a_tail = np.concatenate((self._a_tail, a))
+        self._add_pairs(b, a_tail)
+        self._add_pairs(self._b_tail, a)
+
+        if self.first_time is None:
+            self.first_time = int(times[0])
+        self.last_time = int(times[-1])
+        self.n_a += len(a)
+        self.n_b += len(b)
+
+        limit = self.last_time - self.half_range
+        b_tail = np.concatenate((self._b_tail, b))
+        self._a_tail = a_tail[a_tail >= limit]
+        self._b_tail = b_tail[b_tail >= limit]
+
+    def _snapshot(self):
+        """delays, counts, and g2: the counts normalized by the ones expected for
+        uncorrelated photons at the average count rates (nan before any pair).
+        """
+        counts = self.counts.copy()
+        duration = 0 if self.first_time is None else self.last_time - self.first_time
+        expected = self.n_a * self.n_b * self.bin_width / duration if duration else 0
+        g2 = counts / expected if expected else np.full(self.n_bins, np.nan)
+        return {'delays': self.delays.copy(), 'counts': counts, 'g2': g2,
+                'n_a': self.n_a, 'n_b': self.n_b, 'duration': duration}
+
+
+class LifetimeHistogram(Accumulator):
+    """Histogram of the times of the photons of each channel since the last sync:
+    dtime of the T3 events, or the time since the last event of sync_channel
+    for T2 events. Times beyond n_bins * bin_width are not counted.
+
+    :param bin_width: width of a bin, in resolution units.
+    :param sync_channel: channel of the sync pulses, for T2 events.
+    """
+
+    def __init__(self, channels=(0, 1), bin_width=1, n_bins=4096, sync_channel=None):
+        self.channels = tuple(channels)
+        self.bin_width = bin_width
+        self.n_bins = n_bins
+        self.sync_channel = sync_channel
+        #: time of the start of each bin, in resolution units.
+        self.times = np.arange(n_bins) * bin_width
+        self._index = _channel_index(self.channels)
+        super().__init__()
+
+    def _reset(self):
+        self.counts = np.zeros((len(self.channels), self.n_bins), dtype=np.int64)
+        self._last_sync = None
+
+    def _update(self, events):
+        channel = events['channel']
+        index = self._index[channel]
+        if 'dtime' in events.dtype.names:
+            sel = index >= 0
+            index = index[sel]
+            delays = events['dtime'][sel].astype(np.int64)
+        else:
+            if self.sync_channel is None:
+                raise ValueError('The sync channel is needed for the lifetime of T2 events')
+            times = events['time']
+            is_sync = channel == self.sync_channel
+            syncs = times[is_sync]
+            # the events are in time order: the last sync before an event is
+            # given by the number of syncs up to it (the one of the previous chunk first)
+            previous = np.cumsum(is_sync)
+            if self._last_sync is not None:
+                syncs = np.concatenate(([self._last_sync], syncs))
+            else:
+                previous -= 1
+            if not len(syncs):
+                return
+            self._last_sync = int(syncs[-1])
+            # photons before the first sync have no delay
+            sel = (index >= 0) & (previous >= 0)
+            index = index[sel]
+            delays = times[sel] - syncs[previous[sel]]
+
+        bins = delays // self.bin_width
+        sel = bins < self.n_bins
+        flat = index[sel] * self.n_bins + bins[sel]
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def _snapshot(self):
+        """times and counts (one row per channel)."""
+        return {'times': self.times.copy(), 'counts': self.counts.copy()}
+
+
+class CountRateHistogram(Accumulator):
+    """Number of photons of each channel in consecutive bins of bin_width,
+    keeping the last n_bins completed bins in a RingBuffer.
+
+    :param bin_width: width of a bin, in resolution units.
+    :param sync_period: sync period in resolution units, for T3 events.
+    """
+
+    def __init__(self, channels=(0, 1), bin_width=10 ** 9, n_bins=1000, sync_period=None):
+        self.channels = tuple(channels)
+        self.bin_width = bin_width
+        self.n_bins = n_bins
+        self.sync_period = sync_period
+        self._index = _channel_index(self.channels)
+        #: completed bins: time of their start (in resolution units) and counts of each channel.
+        self.buffer = RingBuffer(n_bins, dtype=[('time', '<i8'), ('counts', '<i8', (len(self.channels), ))])
+        super().__init__()
+
+    def _reset(self):
+        self.buffer.clear()
+        self._bin = None
+        self._current = np.zeros(len(self.channels), dtype=np.int64)
+
+    def _update(self, events):
+        if not len(events):
+            return
+        bins = event_times(events, self.sync_period) // self.bin_width
+        index = self._index[events['channel']]
+        if self._bin is None:
+            self._bin = int(bins[0])
+
+        # the bins older than the last n_bins completed ones would be overwritten
+        first, last = self._bin, int(bins[-1])
+        start = max(first, last - self.n_bins)
+        sel = (index >= 0) & (bins >= start)
+        rows, n_channels = last - start + 1, len(self.channels)
+        counts = np.bincount((bins[sel] - start) * n_channels + index[sel],
+                             minlength=rows * n_channels).reshape(rows, n_channels)
+        if start == first:
+            counts[0] += self._current
+
+        if rows > 1:
+            completed = np.empty(rows - 1, dtype=self.buffer.data.dtype)
+            completed['time'] = (start + np.arange(rows - 1)) * self.bin_width
+            completed['counts'] = counts[:-1]
+            self.buffer.extend(completed)
+        self._current = counts[-1]
+        self._bin = last
+
+    def _snapshot(self):
+        """times and counts (one row per bin) of the completed bins, oldest first."""
+        records = self.buffer.get()
+        return {'times': records['time'], 'counts': records['counts']}
+
+
+class HistogramEngine(object):
+    """Named histograms updated together with the events of a measurement. Example::
+
+        engine = HistogramEngine(g2=G2Histogram(0, 1, bin_width=64, n_bins=2000),
+                                 rate=CountRateHistogram(bin_width=10 ** 11))
+        thread = threading.Thread(target=engine.consume, args=(acquisition, ))
+        thread.start()
+        ...
+        g2 = engine.snapshot()['g2']['g2']
+    """
+
+    def __init__(self, **histograms):
+        self.histograms = histograms
+
+    def __getitem__(self, name):
+        return self.histograms[name]
+
+    def update(self, events):
+        for histogram in self.histograms.values():
+            histogram.update(events)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def snapshot(self):
+        return {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+
+    def consume(self, acquisition, stop_event=None, interval=0.01):
+        """Update the histograms with the events of a running TTTRAcquisition until
+        its measurement ends or stop_event is set. Run it in a thread.
+
+        :param interval: waiting time when no events are available, in s.
+        :return: number of events processed.
+        """
+        n = 0
+        while acquisition.running or acquisition.buffer.unread:
+            if stop_event is not None and stop_event.is_set():
+                break
+            events = acquisition.read_events()
+            if len(events):
+                self.update(events)
+                n += len(events)
+            else:
+                time.sleep(interval)
+        return n
@@ -5,19 +5,25 @@ import numpy as np
 from lantz.core import Action, DictFeat, Feat
 from lantz.core.foreign import LibraryDriver
 
+from .tttr import MODE_T2, T2_WRAPAROUND, TTTRDecoder
+
 TTREADMAX = 131072
 FIFOFULL = 0x0003
 
-t2_wraparound = 210698240
+#: Longest measurement accepted by StartMeas, in ms.
+ACQTMAX = 360000000
+
+t2_wraparound = T2_WRAPAROUND
 
 
 class PH300(LibraryDriver):
     LIBRARY_NAME = 'phlib64.dll'
     LIBRARY_PREFIX = 'PH_'
 
-    def __init__(self, device_idx):
+    def __init__(self, device_idx, mode=MODE_T2):
         super().__init__()
         self.device_idx = device_idx
+        self.mode = mode
         return
 
     def call(self, func_name, *args):
@@ -32,7 +38,7 @@ class PH300(LibraryDriver):
     def initialize(self):
         serial = ctypes.create_string_buffer(8)
         self.call('OpenDevice', self.device_idx, serial)
-        self.call('Initialize', self.device_idx, 2)
+        self.call('Initialize', self.device_idx, self.mode)
         features = ctypes.c_int()
         self.call('GetFeatures', self.device_idx, ctypes.byref(features))
         return
@@ -91,6 +97,26 @@ class PH300(LibraryDriver):
         self.call('GetFlags', self.device_idx, ctypes.byref(flags))
         return flags.value
 
+    @Feat()
+    def measurement_done(self):
+        status = ctypes.c_int()
+        self.call('CTCStatus', self.device_idx, ctypes.byref(status))
+        return bool(status.value)
+
+    @Action()
+    def read_fifo_into(self, out):
+        """Read the records available in the FIFO into out (a C-contiguous uint32 array
+        of at most TTREADMAX records), return the number of records read.
+        """
+        if out.dtype != np.uint32 or not out.flags.c_contiguous:
+            raise ValueError('out must be a C-contiguous uint32 array')
+        if self.flags & FIFOFULL:
+            raise Exception('FIFO overrun, the records of the measurement are incomplete')
+        n_read = ctypes.c_int(0)
+        self.call('ReadFiFo', self.device_idx, out.ctypes.data_as(ctypes.POINTER(ctypes.c_uint)),
+                  len(out), ctypes.byref(n_read))
+        return n_read.value
+
     @Action()
     def read_fifo(self, nvalues=TTREADMAX):
         databuf = BytesIO()
@@ -104,7 +130,7 @@ class PH300(LibraryDriver):
             if retcode < 0:
                 break
             if n_read.value:
-                databuf.write(bytes(buf)[:n_read.value * 4])
+                databuf.write(memoryview(buf).cast('B')[:n_read.value * 4])
             else:
                 break
         databuf.seek(0)
@@ -144,28 +170,14 @@ class PH300(LibraryDriver):
 
     @Action()
     def read_timestamps(self, nvalues=TTREADMAX):
+        if self.mode != MODE_T2:
+            # the T3 records hold sync counts, see TTTRDecoder and event_times
+            raise ValueError('read_timestamps needs the T2 mode ({}), not {}'.format(MODE_T2, self.mode))
         databuf = self.read_fifo(nvalues=nvalues)
-        databuf.seek(0)
-
-        dt = np.dtype(np.uint32).newbyteorder('<')
-        raw = np.frombuffer(databuf.getbuffer(), dtype=dt)
-
-        time = (raw & 0x0FFFFFFF).astype(np.int64)
-        channel = (raw & 0xF0000000) >> 28
-
-        special = (channel == 15)
-        overflow = special & (time & 0x0000000F == 0)
-
-        overflow_edge = np.concatenate([special.nonzero()[0], [len(time)]])
-        prev_i = 0
-        # This is the most time consuming part ~400us.  May be possible to optimize further
-        for n, i in enumerate(overflow_edge):
-            time[prev_i:i] += n * t2_wraparound
-            prev_i = i
+        events = TTTRDecoder(MODE_T2).decode(databuf.getbuffer())
 
-        not_special = np.logical_not(special)
-        time = time[not_special] * self.resolution
-        channel = channel[not_special]
+        time = events['time'] * self.resolution
+        channel = events['channel']
 
         return time[channel == 0], time[channel == 1]
 
@@ -0,0 +1,46 @@
+"""
+    Tests of the decoding of the records streamed by TTTRAcquisition (acquisition),
+    with the ring buffer filled by hand instead of the reader thread.
+"""
+
+import unittest
+
+import numpy as np
+
+from lantz.drivers.picoquant.acquisition import TTTRAcquisition
+from lantz.drivers.picoquant.tttr import MODE_T2, decode
+
+
+class StandInPH300(object):
+    mode = MODE_T2
+
+
+class TestReadEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.acquisition = TTTRAcquisition(StandInPH300(), chunk=4, size=8)
+        # photons of channel 0 at 0, 1, 2, ... with an overflow record every third record
+        self.records = np.arange(20, dtype=np.uint32)
+        self.records[2::3] = 0xF0000000
+
+    def test_max_records(self):
+        buffer = self.acquisition.buffer
+        buffer.extend(self.records[:6])
+        events = [self.acquisition.read_events(max_records=3)]
+        # the overflow records count in max_records
+        self.assertEqual(buffer.unread, 3)
+        buffer.extend(self.records[6:11])
+        while buffer.unread:
+            # across the wrap of the storage
+            events.append(self.acquisition.read_events(max_records=5))
+        np.testing.assert_array_equal(np.concatenate(events), decode(self.records[:11]))
+
+    def test_overwritten(self):
+        buffer = self.acquisition.buffer
+        buffer.extend(self.records[:12])
+        with self.assertRaises(RuntimeError):
+            self.acquisition.read_events()
+
+
+if __name__ == '__main__':
+    unittest.main()
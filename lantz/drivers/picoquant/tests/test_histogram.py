@@ -0,0 +1,107 @@
+"""
+    Tests of the histograms (histogram) updated chunk by chunk, against brute force
+    computations on the whole measurement.
+"""
+
+import unittest
+
+import numpy as np
+
+from lantz.drivers.picoquant.histogram import CountRateHistogram, G2Histogram, LifetimeHistogram
+from lantz.drivers.picoquant.tttr import T2_EVENT_DTYPE, T3_EVENT_DTYPE
+
+#: numbers of chunks the events are split into, up to one event per chunk.
+N_CHUNKS = (1, 3, 50, 2000)
+
+
+def t2_events(n=2000, channels=(0, 1, 2), duration=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    events = np.empty(n, dtype=T2_EVENT_DTYPE)
+    events['time'] = np.sort(rng.choice(duration, n, replace=False))
+    events['channel'] = rng.choice(channels, n)
+    events['markers'] = 0
+    return events
+
+
+def update_in_chunks(histogram, events, n_chunks):
+    for chunk in np.array_split(events, n_chunks):
+        histogram.update(chunk)
+    return histogram.snapshot()
+
+
+class TestG2Histogram(unittest.TestCase):
+
+    def brute_force(self, times, channel, bin_width, n_bins):
+        a, b = times[channel == 0], times[channel == 1]
+        delays = np.subtract.outer(b, a).ravel()
+        half = n_bins * bin_width // 2
+        delays = delays[(delays >= -half) & (delays < half)]
+        return np.bincount((delays + half) // bin_width, minlength=n_bins)
+
+    def test_chunks(self):
+        events = t2_events()
+        expected = self.brute_force(events['time'], events['channel'], 7, 100)
+        for n_chunks in N_CHUNKS:
+            snapshot = update_in_chunks(G2Histogram(0, 1, bin_width=7, n_bins=100), events, n_chunks)
+            np.testing.assert_array_equal(snapshot['counts'], expected)
+            self.assertEqual(snapshot['n_a'], np.count_nonzero(events['channel'] == 0))
+            self.assertEqual(snapshot['n_b'], np.count_nonzero(events['channel'] == 1))
+
+
+class TestLifetimeHistogram(unittest.TestCase):
+
+    def test_t2_chunks(self):
+        # channel 2 is the sync, photons before the first sync are not counted
+        events = t2_events(seed=1)
+        expected = np.zeros((2, 50), dtype=np.int64)
+        last_sync = None
+        for time, channel, _ in events.tolist():
+            if channel == 2:
+                last_sync = time
+            elif last_sync is not None and (time - last_sync) // 3 < 50:
+                expected[channel, (time - last_sync) // 3] += 1
+        self.assertGreater(expected.sum(), 0)
+
+        for n_chunks in N_CHUNKS:
+            histogram = LifetimeHistogram((0, 1), bin_width=3, n_bins=50, sync_channel=2)
+            snapshot = update_in_chunks(histogram, events, n_chunks)
+            np.testing.assert_array_equal(snapshot['counts'], expected)
+
+    def test_t3_chunks(self):
+        rng = np.random.default_rng(2)
+        events = np.empty(2000, dtype=T3_EVENT_DTYPE)
+        events['sync'] = np.sort(rng.integers(0, 10000, len(events)))
+        events['dtime'] = rng.integers(0, 4096, len(events))
+        events['channel'] = rng.choice([0, 1, 2], len(events))
+        events['markers'] = 0
+        expected = np.zeros((2, 200), dtype=np.int64)
+        for _, dtime, channel, _ in events.tolist():
+            if channel < 2 and dtime // 16 < 200:
+                expected[channel, dtime // 16] += 1
+
+        for n_chunks in N_CHUNKS:
+            snapshot = update_in_chunks(LifetimeHistogram((0, 1), bin_width=16, n_bins=200), events, n_chunks)
+            np.testing.assert_array_equal(snapshot['counts'], expected)
+
+
+class TestCountRateHistogram(unittest.TestCase):
+
+    def test_chunks(self):
+        events = t2_events(seed=3)
+        # a gap of empty bins
+        events = events[(events['time'] < 40000) | (events['time'] >= 45000)]
+        bins = events['time'] // 1000
+        # the bin of the last event is not completed, only the last 50 completed bins are kept
+        kept = np.arange(bins[0], bins[-1])[-50:]
+        expected = np.array([[np.count_nonzero((bins == b) & (events['channel'] == channel)) for channel in (0, 1)]
+                             for b in kept])
+
+        for n_chunks in N_CHUNKS:
+            histogram = CountRateHistogram((0, 1), bin_width=1000, n_bins=50)
+            snapshot = update_in_chunks(histogram, events, n_chunks)
+            np.testing.assert_array_equal(snapshot['times'], kept * 1000)
+            np.testing.assert_array_equal(snapshot['counts'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+    Tests of the decoding of the PH300 time tagged records (tttr) on hand-built records,
+    and of the files of TTTRWriter and TTTRReader.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lantz.drivers.picoquant.tttr import (FILE_HEADER, MODE_T2, MODE_T3, T2_WRAPAROUND, T3_WRAPAROUND,
+                                          TTTRDecoder, TTTRReader, TTTRWriter, decode)
+
+
+def t2_record(channel, time):
+    return (channel << 28) | time
+
+
+def t3_record(channel, dtime, nsync):
+    return (channel << 28) | (dtime << 16) | nsync
+
+
+#: photon, overflow, photon, marker 2 (its time tag keeps the marker bits), overflow, photon.
+T2_RECORDS = np.array([t2_record(0, 100), t2_record(0xF, 0), t2_record(1, 5), t2_record(0xF, 0x52),
+                       t2_record(0xF, 0), t2_record(0, 0x0FFFFFFF)], dtype=np.uint32)
+T2_EVENTS = [(100, 0, 0), (T2_WRAPAROUND + 5, 1, 0), (T2_WRAPAROUND + 0x52, 0xF, 2),
+             (2 * T2_WRAPAROUND + 0x0FFFFFFF, 0, 0)]
+
+#: photon, overflow, marker 4, photon, overflow, overflow, photon.
+T3_RECORDS = np.array([t3_record(1, 0xABC, 7), t3_record(0xF, 0, 0), t3_record(0xF, 4, 9), t3_record(0, 12, 0xFFFF),
+                       t3_record(0xF, 0, 0), t3_record(0xF, 0, 0), t3_record(1, 0xFFF, 3)], dtype=np.uint32)
+T3_EVENTS = [(7, 0xABC, 1, 0), (T3_WRAPAROUND + 9, 4, 0xF, 4), (T3_WRAPAROUND + 0xFFFF, 12, 0, 0),
+             (3 * T3_WRAPAROUND + 3, 0xFFF, 1, 0)]
+
+
+def as_tuples(events):
+    return [tuple(int(value) for value in event) for event in events]
+
+
+class TestTTTRDecoder(unittest.TestCase):
+
+    def test_t2(self):
+        self.assertEqual(as_tuples(decode(T2_RECORDS, MODE_T2)), T2_EVENTS)
+
+    def test_t3(self):
+        self.assertEqual(as_tuples(decode(T3_RECORDS, MODE_T3)), T3_EVENTS)
+
+    def test_bytes(self):
+        self.assertEqual(as_tuples(decode(T2_RECORDS.astype('<u4').tobytes(), MODE_T2)), T2_EVENTS)
+
+    def test_chunks(self):
+        # the overflows are counted across chunks, wherever the records are split
+        for mode, records, expected in ((MODE_T2, T2_RECORDS, T2_EVENTS), (MODE_T3, T3_RECORDS, T3_EVENTS)):
+            for split in range(len(records) + 1):
+                decoder = TTTRDecoder(mode)
+                events = np.concatenate((decoder.decode(records[:split]), decoder.decode(records[split:])))
+                self.assertEqual(as_tuples(events), expected)
+                self.assertEqual(decoder.overflows, np.count_nonzero(records == 0xF0000000))
+
+    def test_reset(self):
+        decoder = TTTRDecoder(MODE_T2)
+        decoder.decode(T2_RECORDS)
+        decoder.reset()
+        self.assertEqual(as_tuples(decoder.decode(T2_RECORDS)), T2_EVENTS)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            TTTRDecoder(1)
+
+
+class TestTTTRFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'measurement.tttr')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, chunks, mode=MODE_T3):
+        with TTTRWriter(self.path, mode=mode, resolution=8., sync_divider=2) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        return writer
+
+    def test_round_trip(self):
+        records = np.tile(T3_RECORDS, 10)
+        writer = self.write(np.array_split(records, 4))
+        self.assertEqual(writer.records, len(records))
+        with TTTRReader(self.path) as reader:
+            self.assertEqual((reader.mode, reader.resolution, reader.sync_divider), (MODE_T3, 8., 2))
+            self.assertEqual(len(reader), len(records))
+            np.testing.assert_array_equal(reader.records, records)
+            expected = decode(records, MODE_T3)
+            np.testing.assert_array_equal(reader.events(), expected)
+            for chunk in (1, 3, len(records), 2 * len(records)):
+                np.testing.assert_array_equal(np.concatenate(list(reader.chunks(chunk))), expected)
+
+    def test_empty(self):
+        self.write([], mode=MODE_T2)
+        with TTTRReader(self.path) as reader:
+            self.assertEqual(reader.mode, MODE_T2)
+            self.assertEqual(len(reader), 0)
+            self.assertEqual(list(reader.chunks()), [])
+            self.assertEqual(len(reader.events()), 0)
+
+    def test_truncated(self):
+        # a write interrupted in the middle of the last record
+        self.write([T3_RECORDS])
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01\x02')
+        with TTTRReader(self.path) as reader:
+            self.assertEqual(len(reader), len(T3_RECORDS))
+            self.assertEqual(as_tuples(reader.events()), T3_EVENTS)
+
+    def test_not_a_tttr_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\x00' * FILE_HEADER.size)
+        with self.assertRaises(ValueError):
+            TTTRReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.picoquant.tttr
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Vectorized decoding of the T2 and T3 time tagged records of the PicoHarp 300,
+    and a compact file format to record them.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+
+    Source: PicoHarp 300 PHLib programming library manual and file demos
+"""
+
+import os
+import struct
+
+import numpy as np
+
+#: Measurement modes of PH_Initialize.
+MODE_T2 = 2
+MODE_T3 = 3
+
+#: Increment of the time tag (T2, in resolution units) or of the sync counter (T3)
+#: at each overflow record.
+T2_WRAPAROUND = 210698240
+T3_WRAPAROUND = 65536
+
+#: Channel of the overflow and marker records.
+SPECIAL_CHANNEL = 0xF
+
+#: Decoded T2 records: absolute time tag in resolution units, channel (SPECIAL_CHANNEL
+#: for marker records) and marker bits (0 for photons).
+T2_EVENT_DTYPE = np.dtype([('time', '<i8'), ('channel', 'u1'), ('markers', 'u1')])
+
+#: Decoded T3 records: absolute sync count, time since the sync in resolution units,
+#: channel (SPECIAL_CHANNEL for marker records) and marker bits (0 for photons).
+T3_EVENT_DTYPE = np.dtype([('sync', '<i8'), ('dtime', '<u2'), ('channel', 'u1'), ('markers', 'u1')])
+
+EVENT_DTYPES = {MODE_T2: T2_EVENT_DTYPE, MODE_T3: T3_EVENT_DTYPE}
+
+
+class TTTRDecoder(object):
+    """Decodes chunks of raw 32 bit records into structured arrays of events
+    (see T2_EVENT_DTYPE and T3_EVENT_DTYPE).
+
+    The overflow records are counted across chunks, so the chunks of a measurement
+    must be decoded in order, without gaps, by the same decoder. They are unwrapped
+    with a cumulative sum instead of a loop and do not appear in the events.
+
+    :param mode: MODE_T2 or MODE_T3.
+    """
+
+    def __init__(self, mode=MODE_T2):
+        if mode not in EVENT_DTYPES:
+            raise ValueError('mode must be {} (T2) or {} (T3), not {}'.format(MODE_T2, MODE_T3, mode))
+        self.mode = mode
+        self.dtype = EVENT_DTYPES[mode]
+        self.wraparound = T2_WRAPAROUND if mode == MODE_T2 else T3_WRAPAROUND
+        #: number of overflow records decoded so far.
+        self.overflows = 0
+
+    def reset(self):
+        self.overflows = 0
+
+    def decode(self, records):
+        """Events of an array of raw records (uint32, or bytes of little endian uint32)."""
+        if isinstance(records, (bytes, bytearray, memoryview)):
+            records = np.frombuffer(records, dtype='<u4')
+        else:
+            records = np.asarray(records, dtype='<u4')
+
+        channel = (records >> 28).astype(np.uint8)
+        if self.mode == MODE_T2:
+            time = records & 0x0FFFFFFF
+            markers = (records & 0xF).astype(np.uint8)
+        else:
+            time = records & 0xFFFF
+            dtime = (records >> 16) & 0xFFF
+            markers = (dtime & 0xF).astype(np.uint8)
+
+        special = channel == SPECIAL_CHANNEL
+        markers[~special] = 0
+        overflow = special & (markers == 0)
+
+        # number of overflows before each record (the overflow records themselves are dropped)
+        wraps = np.cumsum(overflow, dtype=np.int64)
+        wraps += self.overflows
+        if len(wraps):
+            self.overflows = int(wraps[-1])
+
+        keep = ~overflow
+        wraps = wraps[keep]
+        wraps *= self.wraparound
+        events = np.empty(len(wraps), dtype=self.dtype)
+        if self.mode == MODE_T2:
+            events['time'] = wraps + time[keep]
+        else:
+            events['sync'] = wraps + time[keep]
+            events['dtime'] = dtime[keep]
+        events['channel'] = channel[keep]
+        events['markers'] = markers[keep]
+        return events
+
+
+def decode(records, mode=MODE_T2):
+    """Events of a whole measurement (see TTTRDecoder.decode)."""
+    return TTTRDecoder(mode).decode(records)
+
+
+def event_times(events, sync_period=None):
+    """Absolute times of events, in resolution units: the time tags in T2 mode,
+    sync * sync_period + dtime in T3 mode (sync_period in resolution units).
+    """
+    if 'time' in events.dtype.names:
+        return events['time']
+    if sync_period is None:
+        raise ValueError('The sync period is needed for the times of T3 events')
+    return events['sync'] * sync_period + events['dtime']
+
+
+#: Header of the files of TTTRWriter: magic, version, mode, resolution (ps),
+#: sync divider, padding to 32 bytes. The raw records follow, until the end of the file.
+FILE_MAGIC = b'LZTTTR\x00\x00'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<8sIIdI4x')
+
+
+class TTTRWriter(object):
+    """Appends chunks of raw records to a file, after a small header
+    (see FILE_HEADER). The number of records is not stored, so a file
+    interrupted during a measurement can still be read.
+
+    :param path: file to create (overwritten if it exists).
+    :param mode: MODE_T2 or MODE_T3.
+    :param resolution: resolution of the time tags, in ps.
+    :param sync_divider: divider of the sync input.
+    :param buffering: size of the write buffer, in bytes.
+    """
+
+    def __init__(self, path, mode=MODE_T2, resolution=4., sync_divider=1, buffering=2 ** 22):
+        if mode not in EVENT_DTYPES:
+            raise ValueError('mode must be {} (T2) or {} (T3), not {}'.format(MODE_T2, MODE_T3, mode))
+        self.path = path
+        self.mode = mode
+        self.resolution = resolution
+        self.sync_divider = sync_divider
+        #: number of records written.
+        self.records = 0
+        self._file = open(path, 'wb', buffering=buffering)
+        self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, mode, resolution, sync_divider))
+
+    def write(self, records):
+        """Append an array of raw records (uint32)."""
+        records = np.ascontiguousarray(records, dtype='<u4')
+        self._file.write(memoryview(records).cast('B'))
+        self.records += len(records)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TTTRReader(object):
+    """Memory maps a file written by TTTRWriter: the records are only read from
+    the disk when decoded, chunk by chunk, so files larger than the memory can
+    be analysed. Example::
+
+        with TTTRReader('measurement.tttr') as reader:
+            for events in reader.chunks(2 ** 20):
+                histograms.update(events)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or header[:len(FILE_MAGIC)] != FILE_MAGIC:
+            raise ValueError('{} is not a TTTR file'.format(path))
+        magic, version, self.mode, self.resolution, self.sync_divider = FILE_HEADER.unpack(header)
+        if version > FILE_VERSION:
+            raise ValueError('Unsupported version of TTTR file: {}'.format(version))
+
+        # an incomplete last record (interrupted write) is ignored
+        n_records = (os.path.getsize(path) - FILE_HEADER.size) // 4
+        if n_records:
+            #: raw records (read-only memory map).
+            self.records = np.memmap(path, dtype='<u4', mode='r', offset=FILE_HEADER.size, shape=(n_records, ))
+        else:
+            self.records = np.empty(0, dtype='<u4')
+
+    def __len__(self):
+        return len(self.records)
+
+    def chunks(self, chunk=2 ** 20):
+        """Events of the file (see TTTRDecoder), decoded lazily chunk by chunk."""
+        decoder = TTTRDecoder(self.mode)
+        for start in range(0, len(self.records), chunk):
+            yield decoder.decode(self.records[start:start + chunk])
+
+    def __iter__(self):
+        return self.chunks()
+
+    def events(self):
+        """Events of the whole file, in memory."""
+        return decode(self.records, self.mode)
+
+    def close(self):
+        # release the memory map, the arrays already decoded stay valid
+        self.records = np.empty(0, dtype='<u4')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
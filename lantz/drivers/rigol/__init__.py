@@ -14,5 +14,6 @@
 """
 
 from .ds1052e import DS1052e
+from .ds1204b import DS1204B
 
-__all__ = ['DS1052e']
+__all__ = ['DS1052e', 'DS1204B']
@@ -11,11 +11,30 @@
     Source: DS1052e manual
 """
 
-from lantz.core import MessageBasedDriver
+import numpy as np
 
+from lantz.drivers.rigol.ds1204b import DS1204B
 
-class DS1052e(MessageBasedDriver):
-    pass
+
+class DS1052e(DS1204B):
+    """Rigol DS1052E 50 MHz 2 Channel Digital Oscilloscope
+
+    Waveform transfer and streaming as for the DS1204B. The DS1000E series has no
+    :WAV:PRE?, so the preamble is computed from the channel and timebase settings.
+    """
+
+    raw_dtype = np.uint8
+
+    def _query_preamble(self, channel):
+        source = 'CHAN{}'.format(channel or 1)
+        scale = float(self.query(':{}:SCAL?'.format(source)))
+        offset = float(self.query(':{}:OFFS?'.format(source)))
+        time_scale = float(self.query(':TIM:SCAL?'))
+        time_offset = float(self.query(':TIM:OFFS?'))
+        # 600 points over the 12 horizontal divisions, centered on the trigger;
+        # 25 levels per vertical division, top of the screen at 15
+        return {'x_inc': time_scale / 50, 'x_or': time_offset, 'x_ref': 300,
+                'y_inc': -scale / 25, 'y_or': -(offset + 4.6 * scale), 'y_ref': 240}
 
 
 if __name__ == '__main__':
@@ -10,10 +10,20 @@
 
     Source: programming guide: http://int.rigol.com/File/TechDoc/20150909/DS1000B%20Programming%20Guide.pdf
 """
-from collections import OrderedDict
+import threading
+from collections import OrderedDict, namedtuple
 
 import numpy as np
-from lantz.core import Action, Feat, MessageBasedDriver
+from lantz.core import Action, DictFeat, Feat, MessageBasedDriver
+
+from lantz.drivers.ieee4882 import read_definite_length_block
+from lantz.drivers.ring_buffer import RingBuffer
+
+PREAMBLE_FIELDS = ('format', 'type', 'points', 'count', 'x_inc', 'x_or', 'x_ref', 'y_inc', 'y_or', 'y_ref')
+
+#: Frame of stream_frames: index among the frames yielded, shared time axis, voltage,
+#: and number of frames dropped so far because the consumer was too slow.
+Frame = namedtuple('Frame', 'index time voltage dropped')
 
 
 class DS1204B(MessageBasedDriver):
@@ -56,43 +66,163 @@ class DS1204B(MessageBasedDriver):
         """
         return self.query('*IDN?')
 
-    @Action()
-    def get_waveform_data(self, channel=None):
+    #: type of the points of :WAV:DATA?
+    raw_dtype = np.int8
+
+    #: number of frames dropped by the last stream_frames
+    frames_dropped = 0
+
+    _preambles = None
+    _time_axes = None
+
+    def invalidate_preamble(self):
+        """Forget the cached preambles and time axes, e.g. after changing settings on the front panel."""
+        self._preambles = {}
+        self._time_axes = {}
+
+    def _query_preamble(self, channel):
+        msg = ':WAV:PRE?'
+        if channel:
+            msg += ' CHAN{}'.format(channel)
+        values = self.query(msg).split(',')
+        preamble = {name: float(value) for name, value in zip(PREAMBLE_FIELDS, values)}
+        preamble['x_ref'] = int(preamble['x_ref'])
+        preamble['y_ref'] = int(preamble['y_ref'])
+        return preamble
+
+    def cached_preamble(self, channel=None):
         """
-        Returns waveform data.
+        Preamble of the channel as a dict, queried once until invalidate_preamble
+        or a change of the scales through this driver.
         """
+        if self._preambles is None:
+            self.invalidate_preamble()
+        try:
+            return self._preambles[channel]
+        except KeyError:
+            preamble = self._preambles[channel] = self._query_preamble(channel)
+            return preamble
+
+    def time_axis(self, n_points, channel=None):
+        """
+        Read only time axis of the frames of the channel, computed once per timebase.
+        """
+        preamble = self.cached_preamble(channel)
+        t_i = self._time_axes.get(channel)
+        if t_i is None or len(t_i) != n_points:
+            t_i = (np.arange(n_points, dtype='float') - preamble['x_ref']) * preamble['x_inc'] + preamble['x_or']
+            t_i.flags.writeable = False
+            self._time_axes[channel] = t_i
+        return t_i
+
+    def _read_raw(self, channel=None):
         msg = ':WAV:DATA?'
 
         if channel:
             msg += ' CHAN{}'.format(channel)
 
-        data = self.resource.query_binary_values(msg, datatype='B')
-        return np.fromiter(data, dtype='uint8')
+        self.write(msg)
+        return np.frombuffer(read_definite_length_block(self.resource), dtype=self.raw_dtype)
+
+    def _scale_into(self, raw, out, channel=None):
+        preamble = self.cached_preamble(channel)
+        np.subtract(raw, preamble['y_ref'], out=out, dtype=out.dtype)
+        out *= preamble['y_inc']
+        out += preamble['y_or']
+        return out
 
     @Action()
-    def get_waveform_trace(self, channel=None):
+    def get_waveform_data(self, channel=None):
+        """
+        Returns waveform data.
+        """
+        return self._read_raw(channel).view(np.uint8).copy()
+
+    @Action()
+    def get_waveform_trace(self, channel=None, refresh=False):
         """
         Returns waveform x and y traces, with units.
+        The preamble is cached (see cached_preamble), unless refresh is True.
         """
-        result_string = self.query(':WAV:PRE?')
-        frmt, typ, points, count, x_inc, x_or, x_ref, y_inc, y_or, y_ref = result_string.split(',')
+        if refresh:
+            self.invalidate_preamble()
+        raw = self._read_raw(channel)
+        y_i = self._scale_into(raw, np.empty(raw.size, dtype='float'), channel)
+        return self.time_axis(raw.size, channel), y_i
 
-        x_inc = float(x_inc)
-        x_or = float(x_or)
-        y_inc = float(y_inc)
-        y_or = float(y_or)
-        x_ref = int(x_ref)
-        y_ref = int(y_ref)
+    def stream_frames(self, channel=None, n_frames=None, buffer_frames=16):
+        """
+        Generator of Frames acquired continuously, for long monitoring runs.
 
-        raw = self.get_waveform_data(channel=channel)
-        raw = raw.astype(np.int8, copy=False)
+        A background thread reads the frames and converts them to volts (float32)
+        in place, in a preallocated ring of buffer_frames frames. When the consumer
+        falls behind, the oldest frames are overwritten and counted in Frame.dropped
+        (and in frames_dropped at the end). Do not use the driver from another
+        thread while streaming.
+        """
+        raw = self._read_raw(channel)
+        ring = RingBuffer(buffer_frames, np.float32, shape=(raw.size,))
+        self._scale_into(raw, ring.next_slot(), channel)
+        ring.commit()
 
-        t_i = (np.arange(raw.size, dtype='float') - x_ref) * x_inc + x_or
-        y_i = np.empty(raw.size, dtype='float')
+        stop = threading.Event()
+        new_frame = threading.Event()
+        errors = []
 
-        y_i = (raw - y_ref) * y_inc + y_or
+        def acquire():
+            try:
+                while not stop.is_set():
+                    raw = self._read_raw(channel)
+                    if raw.size != ring.data.shape[1]:
+                        raise ValueError('The number of points changed while streaming')
+                    self._scale_into(raw, ring.next_slot(), channel)
+                    ring.commit()
+                    new_frame.set()
+            except Exception as e:
+                errors.append(e)
+                new_frame.set()
+
+        thread = threading.Thread(target=acquire, daemon=True)
+        thread.start()
+        index = 0
+        try:
+            while n_frames is None or index < n_frames:
+                while not ring.unread and not errors:
+                    new_frame.wait(1)
+                    new_frame.clear()
+                if not ring.unread:
+                    raise errors[0]
+                voltage = ring.read(1)[0]
+                yield Frame(index, self.time_axis(voltage.size, channel), voltage, ring.overwritten)
+                index += 1
+        finally:
+            stop.set()
+            thread.join()
+            self.frames_dropped = ring.overwritten
+
+    @Feat(units='s')
+    def timebase_scale(self):
+        """
+        Horizontal scale, per division.
+        """
+        return float(self.query(':TIM:SCAL?'))
+
+    @timebase_scale.setter
+    def timebase_scale(self, value):
+        self.write(':TIM:SCAL {}'.format(value))
+        self.invalidate_preamble()
+
+    @DictFeat(keys=[1, 2, 3, 4], units='V')
+    def channel_scale(self, channel):
+        """
+        Vertical scale of the channel, per division.
+        """
+        return float(self.query(':CHAN{}:SCAL?'.format(channel)))
 
-        return t_i, y_i
+    @channel_scale.setter
+    def channel_scale(self, channel, value):
+        self.write(':CHAN{}:SCAL {}'.format(channel, value))
+        self.invalidate_preamble()
 
     @Feat(values=WAVEFORM_FORMATS)
     def waveform_format(self):
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.ring_buffer
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Preallocated ring buffer for streamed acquisitions.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """Fixed size buffer of records (any NumPy dtype, including structured ones)
+    keeping the most recent ones.
+
+    Writing never allocates: when full, the oldest records are overwritten and
+    counted in `overwritten`. It is safe to write from one thread while reading
+    from another: the slots are reserved (see reserve) before being filled, so
+    a concurrent read never copies a record being written.
+
+    :param size: maximum number of records kept.
+    :param dtype: dtype of a record.
+    :param shape: shape of a record (e.g. the number of points of a frame).
+    """
+
+    def __init__(self, size, dtype=float, shape=()):
+        self.data = np.zeros((size,) + tuple(shape), dtype=dtype)
+        self.size = size
+        #: number of records written since the creation (or the last clear).
+        self.total = 0
+        #: number of records overwritten before being read.
+        self.overwritten = 0
+        self._read = 0
+        # absolute indices (start, stop) of the records of the view returned by read_view
+        self._view = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.size)
+
+    @property
+    def unread(self):
+        """Number of records written and not read yet."""
+        return self.total - self._read
+
+    def clear(self):
+        with self._lock:
+            self.total = self.overwritten = self._read = 0
+            self._view = None
+
+    def reserve(self, n=1):
+        """View on the slots of the next n records (at most up to the end of the storage),
+        to be filled in place before calling commit.
+
+        The unread records in these slots are marked as read and counted in
+        `overwritten` before the view is returned, even if fewer than n records
+        are then committed.
+        """
+        with self._lock:
+            start = self.total % self.size
+            n = min(n, self.size - start)
+            lost = self.total + n - self._read - self.size
+            if lost > 0:
+                self.overwritten += lost
+                self._read += lost
+            if self._view is not None:
+                # slots of the records still in use through read_view
+                view_start, view_stop = self._view
+                reused = min(self.total + n, view_stop + self.size) - max(self.total, view_start + self.size)
+                if reused > 0:
+                    self.overwritten += reused
+            return self.data[start:start + n]
+
+    def next_slot(self):
+        """View on the slot of the next record, to be filled in place before calling commit (see reserve)."""
+        return self.reserve()[0]
+
+    def commit(self, n=1):
+        """Mark the next n records as written."""
+        with self._lock:
+            self.total += n
+            lost = self.total - self._read - self.size
+            if lost > 0:
+                self.overwritten += lost
+                self._read += lost
+
+    def append(self, record):
+        self.reserve()[0] = record
+        self.commit()
+
+    def extend(self, records):
+        """Append an array of records."""
+        records = np.asarray(records)
+        # all of them go through reserve, even those overwritten by the last ones
+        while len(records):
+            slots = self.reserve(len(records))
+            slots[...] = records[:len(slots)]
+            self.commit(len(slots))
+            records = records[len(slots):]
+
+    def _ordered(self, start, stop):
+        indices = np.arange(start, stop) % self.size
+        return self.data[indices]
+
+    def get(self):
+        """Copy of the records kept, oldest first."""
+        with self._lock:
+            return self._ordered(self.total - len(self), self.total)
+
+    def read(self, max_records=None):
+        """Copy of the records not read yet, oldest first, and mark them as read."""
+        with self._lock:
+            stop = self.total
+            if max_records is not None:
+                stop = min(stop, self._read + max_records)
+            out = self._ordered(self._read, stop)
+            self._read = stop
+            return out
+
+    def read_view(self, max_records=None):
+        """Like read, but without copy: view of the records not read yet up to
+        the end of the storage (call it again for the ones after the wrap).
+
+        The view stays valid until the writer comes back to these slots, i.e.
+        while fewer than size - len(view) new records are written. Until
+        release_view (or the next read_view), the slots reserved by the writer
+        in the view are counted in `overwritten`. To detect a view overwritten
+        while in use::
+
+            overwritten = buffer.overwritten
+            data = buffer.read_view()
+            ...                             # use data
+            buffer.release_view()
+            if buffer.overwritten != overwritten:
+                ...                         # data may be corrupted
+        """
+        with self._lock:
+            start = self._read % self.size
+            stop = min(self.total - self._read, self.size - start)
+            if max_records is not None:
+                stop = min(stop, max_records)
+            self._view = (self._read, self._read + stop)
+            self._read += stop
+            return self.data[start:start + stop]
+
+    def release_view(self):
+        """End the use of the view returned by read_view (see read_view)."""
+        with self._lock:
+            self._view = None
+
+
+def record_dtype(names, time=True):
+    """Structured dtype of float64 fields, preceded by a 'time' field if time is True."""
+    return np.dtype(([('time', 'f8')] if time else []) + [(str(name), 'f8') for name in names])
+
+
+def poll(buffer, read, n_records=None, interval=0., stop_event=None):
+    """Store the records returned by read() in buffer until n_records were read
+    or stop_event is set. Run it in a thread for background acquisitions.
+
+    :param buffer: RingBuffer with a structured dtype.
+    :param read: function returning a structured record with (some of) the fields of buffer.
+                 The 'time' field, if any, is filled with time.time() when read returns.
+    :param interval: minimum time between two calls of read, in s (0 to poll as fast as possible).
+    :return: number of records read.
+    """
+    has_time = 'time' in buffer.data.dtype.names
+    n = 0
+    next_call = time.perf_counter()
+    while (n_records is None or n < n_records) and not (stop_event is not None and stop_event.is_set()):
+        if interval:
+            delay = next_call - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_call += interval
+        record = read()
+        slot = buffer.next_slot()
+        for name in record.dtype.names:
+            slot[name] = record[name]
+        if has_time:
+            slot['time'] = time.time()
+        buffer.commit()
+        n += 1
+    return n
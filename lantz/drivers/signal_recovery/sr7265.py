@@ -1,8 +1,12 @@
+import math
 from collections import OrderedDict
 from time import sleep
 
+import numpy as np
 from lantz.core import Action, Feat, MessageBasedDriver
 
+from lantz.drivers.ring_buffer import RingBuffer, poll, record_dtype
+
 
 class SR7265(MessageBasedDriver):
     """Signal Recovery 7265
@@ -113,6 +117,9 @@ class SR7265(MessageBasedDriver):
         ('1 V', 27),
     ])
 
+    # quantities of snapshot
+    SNAPSHOT_QUANTITIES = ('x', 'y', 'r', 't')
+
     def remove_null(self, value):
         value = value.replace('\x00', '')
         return value
@@ -145,6 +152,32 @@ class SR7265(MessageBasedDriver):
         """
         return [float(value) for value in self.remove_null(self.query('XY.')).split(',')]
 
+    @Action()
+    def snapshot(self, quantities=('x', 'y', 'r', 't')):
+        """
+        Read x, y, magnitude (r) and phase (t, in degrees) from a single
+        simultaneous XY. reading; r and t are computed from x and y.
+        Returns a structured record with one float field per quantity.
+        """
+        unknown = set(quantities) - set(self.SNAPSHOT_QUANTITIES)
+        if unknown:
+            raise ValueError('Cannot read {} in a snapshot'.format(', '.join(sorted(unknown))))
+        x, y = (float(value) for value in self.remove_null(self.query('XY.')).split(','))
+        values = {'x': x, 'y': y, 'r': math.hypot(x, y), 't': math.degrees(math.atan2(y, x))}
+        return np.array(tuple(values[q] for q in quantities), dtype=record_dtype(quantities, time=False))[()]
+
+    def poll_snapshots(self, quantities=('x', 'y'), n_points=None, interval=0., buffer=None, size=16384,
+                       stop_event=None):
+        """
+        Acquire a time trace of snapshots into a preallocated RingBuffer, with
+        a 'time' field. Blocks until n_points snapshots were taken or
+        stop_event is set: run it in a thread to acquire in the background.
+        """
+        if buffer is None:
+            buffer = RingBuffer(size, record_dtype(quantities))
+        poll(buffer, lambda: self.snapshot(quantities), n_points, interval, stop_event)
+        return buffer
+
     @Feat(units='V')
     def magnitude(self):
         """
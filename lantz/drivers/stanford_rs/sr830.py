@@ -7,11 +7,14 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import time
 from collections import OrderedDict
 
 import numpy as np
 from lantz.core import Action, DictFeat, Feat, MessageBasedDriver, ureg
 
+from lantz.drivers.ring_buffer import RingBuffer, poll, record_dtype
+
 SENS = OrderedDict([
     ('2 nV/fA', 0),
     ('5 nV/fA', 1),
@@ -85,6 +88,31 @@ SAMPLE_RATES = OrderedDict([
 ])
 
 
+# Parameters of SNAP?
+SNAP_CODES = {'x': 1, 'y': 2, 'r': 3, 't': 4,
+              '1': 5, '2': 6, '3': 7, '4': 8,
+              'f': 9, 'd1': 10, 'd2': 11}
+
+# Number of points of each channel buffer
+BUFFER_SIZE = 16383
+
+TRANSFER_FORMATS = {'a': 'TRCA', 'b': 'TRCB', 'c': 'TRCL'}
+
+# TRCL point: 16 bit signed mantissa, exponent offset by 124, zero byte
+TRCL_DTYPE = np.dtype([('mantissa', '<i2'), ('exponent', 'u1'), ('zero', 'u1')])
+
+
+def decode_trcb(data):
+    """Values of a TRCB? transfer (little-endian IEEE floats)"""
+    return np.frombuffer(data, dtype='<f4').astype(float)
+
+
+def decode_trcl(data):
+    """Values of a TRCL? transfer: mantissa * 2 ** (exponent - 124)"""
+    points = np.frombuffer(data, dtype=TRCL_DTYPE)
+    return np.ldexp(points['mantissa'].astype(float), points['exponent'].astype(np.int32) - 124)
+
+
 class SR830(MessageBasedDriver):
     DEFAULTS = {'COMMON': {'write_termination': '\n',
                            'read_termination': '\n',
@@ -461,17 +489,45 @@ class SR830(MessageBasedDriver):
 
     @Action()
     def measure(self, channels):
-        d = {'x': '1', 'y': '2', 'r': '3', 't': '4',
-             '1': '5', '2': '6', '3': '7', '4': '8',
-             'f': '9'}  # , '': 10, '': 11} TODO: how to deal with these?
-        channels = ','.join(d[ch] for ch in channels)
-        self.query('SNAP? {}'.format(channels))
+        """Values of 2 to 6 quantities measured at the same instant, as a list (see snapshot)."""
+        return list(self.snapshot(channels).tolist())
+
+    @Action()
+    def snapshot(self, quantities=('x', 'y', 'r', 't')):
+        """Values of 2 to 6 quantities measured at the same instant, in one SNAP? query.
+
+        :param quantities: names in SNAP_CODES: x, y, r, t (theta), 1 to 4 (aux inputs),
+                           f (reference frequency), d1 and d2 (displays).
+        :return: structured record with one float field per quantity.
+        """
+        if not 2 <= len(quantities) <= 6:
+            raise ValueError('SNAP? reads 2 to 6 quantities, not {}'.format(len(quantities)))
+        codes = ','.join(str(SNAP_CODES[str(q)]) for q in quantities)
+        values = self.query('SNAP? {}'.format(codes)).split(',')
+        return np.array(tuple(float(v) for v in values), dtype=record_dtype(quantities, time=False))[()]
+
+    def poll_snapshots(self, quantities=('x', 'y'), n_points=None, interval=0., buffer=None, size=16384,
+                       stop_event=None):
+        """Acquires a time trace of snapshots into a preallocated RingBuffer.
+
+        Blocks until n_points snapshots were taken or stop_event is set: run it in a
+        thread to acquire in the background while reading the buffer.
+
+        :param interval: time between snapshots in s (0 to poll as fast as possible).
+        :param buffer: RingBuffer to fill, with dtype record_dtype(quantities).
+                       Defaults to a new one of size records.
+        :return: the buffer, with a 'time' field (time.time()) and one field per quantity.
+        """
+        if buffer is None:
+            buffer = RingBuffer(size, record_dtype(quantities))
+        poll(buffer, lambda: self.snapshot(quantities), n_points, interval, stop_event)
+        return buffer
 
     # OAUX See above
 
     @Feat()
     def buffer_length(self):
-        return self.query('SPTS?')
+        return int(self.query('SPTS?'))
 
     @Action()
     def read_buffer(self, channel, start=0, length=None, format='A'):
@@ -483,19 +539,58 @@ class SR830(MessageBasedDriver):
                        Defaults to the number of points in the buffer.
         :param format: Transfer format
                       'a': ASCII (slow)
-                      'b': IEEE Binary (fast) - NOT IMPLEMENTED
-                      'c': Non-IEEE Binary (fastest) - NOT IMPLEMENTED
+                      'b': IEEE Binary (fast)
+                      'c': Non-IEEE Binary (fastest)
         """
-
-        cmd = 'TRCA'
+        try:
+            cmd = TRANSFER_FORMATS[format.lower()]
+        except KeyError:
+            raise ValueError('{} transfer format is not implemented'.format(format))
         if not length:
-            length = self.buffer_length
+            length = self.buffer_length - start
         self.send('{}? {},{},{}'.format(cmd, channel, start, length))
         if cmd == 'TRCA':
             data = self.recv()
-            return np.fromstring(data, sep=',') * ureg.volt
-        else:
-            raise ValueError('{} transfer format is not implemented'.format(format))
+            return np.array(data.strip().strip(',').split(','), dtype=float) * ureg.volt
+        # binary transfers have no termination: read exactly 4 bytes per point
+        data = self.resource.read_bytes(4 * length)
+        if cmd == 'TRCB':
+            return decode_trcb(data) * ureg.volt
+        return decode_trcl(data) * ureg.volt
+
+    def stream_buffer(self, channel, n_points=None, chunk=1024, format='C', poll_interval=0.05, stall_timeout=10.):
+        """Yields the points of the Channel buffer as they are stored, in chunks of at most chunk points,
+        while data storage keeps running (SPTS? polling).
+
+        Stops after n_points points, when the buffer is full (use single_shot mode, in loop mode
+        the buffer would wrap around), or when no point was stored for stall_timeout (data storage
+        paused, reset or never started).
+
+        :param channel: Number of the channel (1, 2).
+        :param n_points: Number of points after which to stop (default: BUFFER_SIZE).
+        :param chunk: Maximum number of points per transfer.
+        :param format: Transfer format (see read_buffer).
+        :param poll_interval: Time to wait between SPTS? queries when no new point is available, in s.
+        :param stall_timeout: Time without new points after which to stop, in s (longer than the
+                              sample period or the trigger period). None to wait indefinitely.
+        """
+        n_points = min(n_points or BUFFER_SIZE, BUFFER_SIZE)
+        read = 0
+        last_change = time.monotonic()
+        while read < n_points:
+            available = min(self.buffer_length, n_points)
+            if available < read:
+                # the buffer was reset
+                return
+            if available == read:
+                if stall_timeout is not None and time.monotonic() - last_change > stall_timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            last_change = time.monotonic()
+            length = min(available - read, chunk)
+            yield self.read_buffer(channel, read, length, format)
+            read += length
 
     # Fast
     # STRD
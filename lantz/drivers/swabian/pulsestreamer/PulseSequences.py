@@ -2,12 +2,17 @@ import numpy as np
 from lantz.core import Driver, Feat, Q_
 
 from lantz.drivers.swabian.pulsestreamer.lib.pulse_streamer_grpc import PulseStreamer
+from lantz.drivers.swabian.pulsestreamer.lib.sequence_cache import cached_sequence
 
 
 class Pulses(Driver):
     default_digi_dict = {"laser": "ch0", "offr_laser": "ch1", "CTR": "ch5", "switch": "ch6", "gate": "ch7", "": None}
     default_anal_dict = {"ai0": "I", "ai1": "Q"}
 
+    # instance attributes the sequences depend on (cache key of the builders, see cached_sequence)
+    _sequence_attributes = ('channel_dict', 'laser_time', 'readout_time', 'buffer_after_init', 'buffer_after_readout',
+                            'polarize_time', 'settle', 'reset', 'bin_time', 'I', 'Q')
+
     def __init__(self, channel_dict=default_digi_dict, laser_time=150 * Q_(1, "us"), readout_time=150 * Q_(1, "us"),
                  buffer_after_init=450 * Q_(1, "us"), buffer_after_readout=2 * Q_(1, "us"),
                  polarize_time=900 * Q_(1, "us"), settle=150 * Q_(1, "us"), reset=100 * Q_(1, "ns"), IQ=[0.5, 0],
@@ -51,6 +56,7 @@ class Pulses(Driver):
         self.I = norm_iq[0]
         self.Q = norm_iq[1]
 
+    @cached_sequence
     def Transient_Measure(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"]], 0, 0)]
@@ -62,6 +68,7 @@ class Pulses(Driver):
             [(self.buffer_after_readout, [], 0, 0)]
         return excitation + bg_decay + readout + buffer
 
+    @cached_sequence
     def CODMR(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"]], 0, 0)]
@@ -73,6 +80,7 @@ class Pulses(Driver):
             [(self.buffer_after_readout, [self.channel_dict["switch"]], 0, 0)]
         return excitation + bg_decay + readout + buffer
 
+    @cached_sequence
     def L_CODMR(self, measure=0):
         s_excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"]], 0, 0)]
@@ -103,6 +111,7 @@ class Pulses(Driver):
         b = b_excitation + b_bg_decay + b_readout + b_buffer
         return s + m * measure + b
 
+    @cached_sequence
     def Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -123,6 +132,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -153,6 +163,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -189,6 +200,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -219,6 +231,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -256,6 +269,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -367,6 +381,7 @@ class Pulses(Driver):
     #     seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
     #     return seqs
 
+    @cached_sequence
     def Pulsed_ODMR(self, pi):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"]], 0, 0)]
@@ -380,6 +395,7 @@ class Pulses(Driver):
             [(self.buffer_after_readout, [], 0, 0)]
         return excitation + bg_decay + readout + rabi + wait
 
+    @cached_sequence
     def Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -410,6 +426,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -446,6 +463,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -492,6 +510,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def T1(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(pi.to("ns").magnitude)
@@ -515,6 +534,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -536,6 +556,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs[:-1]
 
+    @cached_sequence
     def off_res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -557,6 +578,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs[:-1]
 
+    @cached_sequence
     def red_Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -576,6 +598,7 @@ class Pulses(Driver):
         seqs = [single_RLP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
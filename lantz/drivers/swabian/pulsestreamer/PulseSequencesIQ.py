@@ -3,6 +3,7 @@ import pandas as pd
 from lantz.core import Driver, Feat, Q_
 
 from lantz.drivers.swabian.pulsestreamer.lib.pulse_streamer_grpc import PulseStreamer
+from lantz.drivers.swabian.pulsestreamer.lib.sequence_cache import cached_sequence
 
 from spyre.widgets.rangespace import RangeDict
 
@@ -13,6 +14,10 @@ class Pulses(Driver):
     default_digi_dict = {"laser": 0, "offr_laser": 1, "EOM": 4, "CTR": 5, "switch": 6, "gate": 7, "": None}
     rev_dict = {0: "laser", 1: "offr_laser", 4: "EOM", 5: "CTR", 6: "switch", 7: "gate", 8: "I", 9: "Q"}
 
+    # instance attributes the sequences depend on (cache key of the builders, see cached_sequence)
+    _sequence_attributes = ('channel_dict', 'laser_time', 'readout_time', 'buf_after_init', 'buf_after_readout',
+                            'polarize_time', 'settle', 'reset', 'IQ')
+
     def __init__(self, channel_dict=default_digi_dict, laser_time=150 * Q_(1, "us"), readout_time=150 * Q_(1, "us"),
                  buf_after_init=450 * Q_(1, "us"), buf_after_readout=2 * Q_(1, "us"),
                  polarize_time=900 * Q_(1, "us"), settle=150 * Q_(1, "us"), reset=100 * Q_(1, "ns"), IQ=[0.5, 0],
@@ -52,6 +57,21 @@ class Pulses(Driver):
         self.latest_streamed = self.convert_sequence(seq)
         self.Pulser.stream(seq)
 
+    def stream_sweep(self, seqs, n_runs=1, marker=None, **kwargs):
+        """
+        Upload all the sweep points at once (see PulseStreamer.stream_sweep). Returns the SweepSegments.
+
+        :param marker: free digital channel (its name in channel_dict or its number) raised at the
+                       start of each point, None for no marker. It must not be driven by the sequences
+                       (e.g. not "CTR", which selects the counter).
+        """
+        if marker is None:
+            marker_channel = None
+        else:
+            marker_channel = self.channel_dict[marker] if isinstance(marker, str) else marker
+        self.latest_streamed = pd.DataFrame({})
+        return self.Pulser.stream_sweep(seqs, n_runs=n_runs, marker_channel=marker_channel, **kwargs)
+
     def _normalize_IQ(self, IQ):
         self.IQ = IQ / (2 * np.linalg.norm(IQ))
 
@@ -77,6 +97,7 @@ class Pulses(Driver):
         fin = sub_df.rename(columns=self._reverse_dict)
         return fin
 
+    @cached_sequence
     def Transient_Measure(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"]], *self.IQ)]
@@ -88,6 +109,7 @@ class Pulses(Driver):
             [(self.buf_after_readout, [], *self.IQ)]
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def CODMR(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"]], *self.IQ)]
@@ -99,6 +121,7 @@ class Pulses(Driver):
             [(self.buf_after_readout, [self.channel_dict["switch"]], *self.IQ)]
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def EOM(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"], self.channel_dict["EOM"]],
@@ -111,6 +134,7 @@ class Pulses(Driver):
             [(self.buf_after_readout, [self.channel_dict["switch"]], *self.IQ)]
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def MW_L_EOM(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"], self.channel_dict["EOM"]],
@@ -132,6 +156,7 @@ class Pulses(Driver):
             [(self.buf_after_readout, [self.channel_dict["switch"]], *self.IQ)]
         return excitation + bg_decay + readout + buf + L_excitation + L_bg_decay + L_readout + L_buf
 
+    @cached_sequence
     def L_CODMR(self, measure=0):
         s_excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["switch"]], *self.IQ)]
@@ -162,6 +187,7 @@ class Pulses(Driver):
         b = b_excitation + b_bg_decay + b_readout + b_buf
         return s + m * measure + b
 
+    @cached_sequence
     def Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -182,6 +208,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -212,6 +239,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -248,6 +276,7 @@ class Pulses(Driver):
         seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -278,6 +307,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -315,6 +345,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T2(self, params, pi, style=[[-1, 0], [1, 0], [1, 0]]):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -386,6 +417,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_CPMG(self, params, pi, N):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -432,6 +464,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T1(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -469,6 +502,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T1_Adaptive(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -506,6 +540,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Pulsed_ODMR(self, pi):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"]], *self.IQ)]
@@ -519,6 +554,7 @@ class Pulses(Driver):
             [(self.buf_after_readout, [], *self.IQ)]
         return excitation + bg_decay + readout + rabi + wait
 
+    @cached_sequence
     def Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -549,6 +585,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -585,6 +622,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -631,6 +669,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def T1(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(pi.to("ns").magnitude)
@@ -654,6 +693,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -675,6 +715,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def res_Topt_MW(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -696,6 +737,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def off_res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -717,6 +759,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def red_Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -736,6 +779,7 @@ class Pulses(Driver):
         seqs = [single_RLP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -755,6 +799,7 @@ class Pulses(Driver):
         seqs = [single_LP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Laser_Power_MW(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -774,6 +819,7 @@ class Pulses(Driver):
         seqs = [single_LP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def L_Inv_Optical_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -802,6 +848,7 @@ class Pulses(Driver):
         seqs = [single_OR(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_EOM(self):
         IQ = [0, 0]
         reset = \
@@ -3,6 +3,7 @@ import pandas as pd
 from lantz.core import Driver, Feat, Q_
 
 from lantz.drivers.swabian.pulsestreamer.lib.pulse_streamer_grpc import PulseStreamer
+from lantz.drivers.swabian.pulsestreamer.lib.sequence_cache import cached_sequence
 
 from spyre.widgets.rangespace import RangeDict
 
@@ -15,6 +16,12 @@ class Pulses(Driver):
     rev_dict = {0: "laser", 1: "offr_laser", 2: 'current_gate', 3: 'laser2', 4: "EOM", 5: "CTR", 6: "switch", 7: "gate",
                 8: "I", 9: "V"}
 
+    # instance attributes the sequences depend on (cache key of the builders, see cached_sequence)
+    _sequence_attributes = ('channel_dict', 'laser_time', 'readout_time', 'buf_after_init', 'buf_after_readout',
+                            'polarize_time', 'settle', 'reset', 'IQ')
+    # set by the builders, restored when a sequence comes from the cache
+    _sequence_outputs = ('total_time',)
+
     def __init__(self, channel_dict=default_digi_dict, laser_time=150 * Q_(1, "us"), readout_time=150 * Q_(1, "us"),
                  buf_after_init=450 * Q_(1, "us"), buf_after_readout=2 * Q_(1, "us"),
                  polarize_time=900 * Q_(1, "us"), settle=150 * Q_(1, "us"), reset=100 * Q_(1, "ns"), IQ=[0.5, 0],
@@ -55,6 +62,21 @@ class Pulses(Driver):
         self.latest_streamed = self.convert_sequence(seq)
         self.Pulser.stream(seq)
 
+    def stream_sweep(self, seqs, n_runs=1, marker=None, **kwargs):
+        """
+        Upload all the sweep points at once (see PulseStreamer.stream_sweep). Returns the SweepSegments.
+
+        :param marker: free digital channel (its name in channel_dict or its number) raised at the
+                       start of each point, None for no marker. It must not be driven by the sequences
+                       (e.g. not "CTR", which selects the counter).
+        """
+        if marker is None:
+            marker_channel = None
+        else:
+            marker_channel = self.channel_dict[marker] if isinstance(marker, str) else marker
+        self.latest_streamed = pd.DataFrame({})
+        return self.Pulser.stream_sweep(seqs, n_runs=n_runs, marker_channel=marker_channel, **kwargs)
+
     def _normalize_IQ(self, IQ):
         self.IQ = IQ / (2 * np.linalg.norm(IQ))
 
@@ -81,6 +103,7 @@ class Pulses(Driver):
         return fin
 
     # Constant Pulse Sequences
+    @cached_sequence
     def Transient_Measure(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["laser2"]], *self.IQ)]
@@ -93,6 +116,7 @@ class Pulses(Driver):
         self.total_time = self.laser_time + self.buf_after_init + self.readout_time + self.buf_after_readout
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def Continuous_Measure(self):
         excitation = \
             [(int(1e9), [self.channel_dict["laser"], self.channel_dict["laser2"], self.channel_dict["gate"],
@@ -100,6 +124,7 @@ class Pulses(Driver):
         self.total_time = int(1e9)
         return excitation
 
+    @cached_sequence
     def CODMR(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["laser2"], self.channel_dict["switch"]],
@@ -113,6 +138,7 @@ class Pulses(Driver):
         self.total_time = self.laser_time + self.buf_after_init + self.readout_time + self.buf_after_readout
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def EOM(self):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["laser2"], self.channel_dict["switch"],
@@ -127,6 +153,7 @@ class Pulses(Driver):
         self.total_time = self.laser_time + self.buf_after_init + self.readout_time + self.buf_after_readout
         return excitation + bg_decay + readout + buf
 
+    @cached_sequence
     def Finder(self):
         total_time = self.laser_time + self.buf_after_readout + self.readout_time + self.buf_after_readout
         rep = int(3e7 / (2 * total_time))
@@ -152,6 +179,7 @@ class Pulses(Driver):
         return rep * sig + rep * bg
 
     # Single Color Pulsed ODMR
+    @cached_sequence
     def S_Pulsed_ODMR(self, pi):
         excitation = \
             [(self.laser_time, [self.channel_dict["laser"], self.channel_dict["laser2"]], *self.IQ)]
@@ -167,6 +195,7 @@ class Pulses(Driver):
         return excitation + bg_decay + readout + rabi + wait
 
     # EOM Pulsed ODMR
+    @cached_sequence
     def D_Pulsed_ODMR(self, pi):
         polarize = \
             [(self.polarize_time, [self.channel_dict["laser"], self.channel_dict["laser2"], self.channel_dict["EOM"]],
@@ -187,6 +216,7 @@ class Pulses(Driver):
         return polarize + settle + pi_pulse + probe + bg_decay + readout + wait
 
     # Lockin Style EOM Pulsed ODMR
+    @cached_sequence
     def L_D_Pulsed_ODMR(self, pi):
         polarize = \
             [(self.polarize_time, [self.channel_dict["laser"], self.channel_dict["laser2"], self.channel_dict["EOM"]],
@@ -214,6 +244,7 @@ class Pulses(Driver):
     # Time Varying Pulse Sequences
 
     # EOM Hole burnt Lockin Style Rabi
+    @cached_sequence
     def Resetting_L_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -283,6 +314,7 @@ class Pulses(Driver):
     #     seqs = [single_rabi(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
     #     return seqs
 
+    @cached_sequence
     def Resetting_L_Ramsey(self, params, pi):
         '''
         :param params: the iteration array
@@ -331,6 +363,7 @@ class Pulses(Driver):
         seqs = [single_ramsey(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T2(self, params, pi, style=[[-1, 0], [1, 0], [1, 0]]):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -403,6 +436,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_Y_T2(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -457,6 +491,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_CPMG(self, params, pi, N):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -505,6 +540,7 @@ class Pulses(Driver):
         seqs = [single_T2(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T1(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -545,6 +581,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Resetting_L_T1_Adaptive(self, params, pi):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         pi_ns = int(round(pi.to("ns").magnitude))
@@ -588,6 +625,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Polarization_Time(self, params, pi):
         '''
         :param params: the iteration array
@@ -628,6 +666,7 @@ class Pulses(Driver):
         seqs = [single_polarization(int(round(laser_time.to("ns").magnitude))) for laser_time in params.array]
         return seqs
 
+    @cached_sequence
     def res_background_Topt(self, params):
         start_time = int(round(params["start"].to("ns").magnitude))
         end_time = int(round(params["stop"].to("ns").magnitude))
@@ -687,6 +726,7 @@ class Pulses(Driver):
         seqs = [single_Topt(i) for i in np.arange(num_bins)]
         return seqs
 
+    @cached_sequence
     def res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -709,6 +749,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def res_Topt_MW(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -732,6 +773,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def off_res_Topt(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
         bin_time = int(round(params["step"].to("ns").magnitude))
@@ -754,6 +796,7 @@ class Pulses(Driver):
         seqs = [single_T1(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def red_Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -774,6 +817,7 @@ class Pulses(Driver):
         seqs = [single_RLP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Laser_Power(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -794,6 +838,7 @@ class Pulses(Driver):
         seqs = [single_LP(int(round(mw_time.to("ns").magnitude))) for mw_time in params.array]
         return seqs
 
+    @cached_sequence
     def Laser_Power_MW(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -816,6 +861,7 @@ class Pulses(Driver):
         return seqs
 
     # Don't worry about this...
+    @cached_sequence
     def L_Inv_Optical_Rabi(self, params):
         longest_time = int(round(params["stop"].to("ns").magnitude))
 
@@ -9,7 +9,7 @@ class Sequence():
         self.__channel_analog = {0: [], 1: []}
         self.__union_seq = [(0, 0, 0, 0)]
         self.__setby = self.Setby.UNDEFINED
-        self.__union_seq_up_to_date = True
+        self.__sequence_up_to_date = True
 
     def __union(self):
         # idea of the algorithm
@@ -17,99 +17,71 @@ class Sequence():
         # 2) join all these absolute timestamps together to a sorted unique list. This results in the timestamps (unique_t_cumsum) of the final pulse list 
         # 3) expand every single channel to final pulse list (unique_t_cumsum)
         # 4) join the channels together
+        # The result is returned column wise: (durations, digital, analog0, analog1)
 
-        all_channel_arrays = []
-        all_t_cumsums = []
-        all_t_cumsums_concatinated = np.array([], dtype=np.int64)
         count_digital_channels = len(self.__channel_digital)
-        count_analog_channels = len(self.__channel_analog)
-        count_all_channels = count_digital_channels + count_analog_channels
+        channels = [self.__channel_digital[i] for i in range(count_digital_channels)]
+        channels += [self.__channel_analog[i] for i in range(len(self.__channel_analog))]
 
         # 1) for each channel, calculate  the absolute timestamps (not the relative) -> t_cumsums
-        # optimization: this loop could be fully parallized with minor changes
-        for i in range(count_all_channels):
-            if i < count_digital_channels:
-                channel_sequence = self.__channel_digital[i]
-            else:
-                channel_sequence = self.__channel_analog[i - count_digital_channels]
-
+        all_values = []
+        all_t_cumsums = []
+        for channel_sequence in channels:
             if len(channel_sequence) > 0:
-                # store last entry
-                last_touple = channel_sequence[-1]
-                # remove all entries which have dt = 0
-                channel_sequence = list(filter(lambda x: x[0] != 0, channel_sequence))
-                # if the last dt is 0, add it again to the list
-                if (last_touple[0]) == 0:
-                    channel_sequence.append[last_touple]
-                # make a numeric array
                 sequence_array = np.array(channel_sequence)
-                # and add it to the full list
-                all_channel_arrays.append(sequence_array)
-                # finally, update the unique list of t for which a new pulse is generated
-                cumsum = np.cumsum(sequence_array[:, 0])
+                # remove all entries which have dt = 0, but keep the last one
+                keep = sequence_array[:, 0] != 0
+                keep[-1] = True
+                sequence_array = sequence_array[keep]
+                all_values.append(sequence_array[:, 1])
+                all_t_cumsums.append(np.cumsum(sequence_array[:, 0]))
             else:
-                all_channel_arrays.append([(0, 0)])
-                cumsum = np.array([0], dtype=np.int64)
-
-            all_t_cumsums.append(cumsum)
-            all_t_cumsums_concatinated = np.append(all_t_cumsums_concatinated, cumsum)
+                all_values.append(np.zeros(1, dtype=np.int64))
+                all_t_cumsums.append(np.array([0], dtype=np.int64))
 
         # 2) join all these absolute timestamps together to a sorted unique list which. This results in the timestamps (unique_t_cumsum) of the final pulse list 
-        unique_t_cumsum = np.unique(all_t_cumsums_concatinated)
+        unique_t_cumsum = np.sort(np.concatenate([np.array([], dtype=np.int64)] + all_t_cumsums))
+        unique_t_cumsum = unique_t_cumsum[np.insert(np.diff(unique_t_cumsum) != 0, 0, True)]
 
         # 3) expand every single channel to final pulse list (unique_t_cumsum)
-        # create 2d array for every channel and timestamp
-        data = np.zeros([count_all_channels, len(unique_t_cumsum)], dtype=np.int64)
-        last = 0
-        # optimization: this loop could be fully parallized with minor changes
-        for i in range(count_all_channels):
-            sequence_array = all_channel_arrays[i]
-            cumsum = all_t_cumsums[i]
-            if len(cumsum) > 0:
-                i_cumsum = 0
-                last = sequence_array[0][1]
-                for x in range(len(unique_t_cumsum)):
-                    data[i, x] = last
-                    if (unique_t_cumsum[x] == cumsum[i_cumsum]):
-                        if i_cumsum + 1 < len(cumsum):
-                            i_cumsum = i_cumsum + 1
-                        last = sequence_array[i_cumsum][1]
+        # each final pulse takes the value of the channel pulse ending at or after it,
+        # after its last pulse a channel keeps its last value
+        data = np.zeros([len(channels), len(unique_t_cumsum)], dtype=np.int64)
+        for i, (values, cumsum) in enumerate(zip(all_values, all_t_cumsums)):
+            index = np.searchsorted(cumsum, unique_t_cumsum, side='left')
+            np.minimum(index, len(cumsum) - 1, out=index)
+            data[i, :] = values[index]
 
         # 4) join the channels together
-        digi = data[0, :]
-        for i in range(1, count_digital_channels):
-            digi = digi + data[i, :]
-            # revert the cumsum to get the relative pulse durations
+        digi = data[:count_digital_channels, :].sum(axis=0)
+        # revert the cumsum to get the relative pulse durations
         ts = np.insert(np.diff(unique_t_cumsum), 0, unique_t_cumsum[0])
-        digi = digi
         a0 = data[count_digital_channels + 0]
         a1 = data[count_digital_channels + 1]
 
-        # create the final pulse list
-        result = list(zip(ts, digi, a0, a1))
-
         # there might be a pulse duration of 0 in the very beginning - remove it
-        if len(result) > 0:
-            if result[0][0] == 0:
-                return result[1::]
+        if len(ts) > 0 and ts[0] == 0:
+            return ts[1:], digi[1:], a0[1:], a1[1:]
 
-        return result
+        return ts, digi, a0, a1
 
     # def simplify(self, sequence):
     #     return self.__simplify(sequence)
 
-    def __simplify(self, sequence):
-        """Merge adjacent pulses that have equal channels"""
-        i = 0
-        while i + 1 < len(sequence):
-            p0 = sequence[i]
-            p1 = sequence[i + 1]
-            if ((p0[1:] == p1[1:])):
-                sequence.pop(i + 1)
-                sequence[i] = ((p0[0] + p1[0]), p0[1], p0[2], p0[3])
-            else:  # move one to the right
-                i += 1
-        return sequence
+    def __simplify(self, ts, digi, a0, a1):
+        """Merge adjacent pulses that have equal channels.
+
+        Takes the pulse list column wise and returns a list of (duration, digital, analog0, analog1) tuples.
+        """
+        ts, digi, a0, a1 = (np.asarray(column) for column in (ts, digi, a0, a1))
+        if len(ts) == 0:
+            return []
+        # a new pulse starts wherever any channel changes
+        starts = np.ones(len(ts), dtype=bool)
+        starts[1:] = (digi[1:] != digi[:-1]) | (a0[1:] != a0[:-1]) | (a1[1:] != a1[:-1])
+        starts = np.flatnonzero(starts)
+        ts = np.add.reduceat(ts, starts)
+        return list(zip(ts.tolist(), digi[starts].tolist(), a0[starts].tolist(), a1[starts].tolist()))
 
     class Setby(Enum):
         UNDEFINED = 0
@@ -161,14 +133,13 @@ class Sequence():
                 chan_byte |= 1 << c
             self.__union_seq.append((p[0], chan_byte, int(round(0x7fff * p[2])), int(round(0x7fff * p[3]))))
 
-        self.__union_seq = self.__simplify(self.__union_seq)
+        self.__union_seq = self.__simplify(*zip(*self.__union_seq)) if self.__union_seq else []
         self.__sequence_up_to_date = True
 
     def getSequence(self):
         # check if sequence has to be rebuild
         if not self.__sequence_up_to_date:
-            self.__union_seq = self.__union()
-            self.__union_seq = self.__simplify(self.__union_seq)
+            self.__union_seq = self.__simplify(*self.__union())
             self.__sequence_up_to_date = True
 
         return self.__union_seq
@@ -176,9 +147,9 @@ class Sequence():
 
 # -------------cut off here
 
-def random_digi():
+def random_digi(n_pulses=1):
     # creating random sequence
-    t = np.random.uniform(20, 256, 1).astype(int)
+    t = np.random.uniform(20, 256, n_pulses).astype(int)
     seq = []
     for i, ti in enumerate(t):
         state = i % 2
@@ -186,17 +157,41 @@ def random_digi():
     return seq
 
 
-def random_ana():
+def random_ana(n_pulses=1):
     # creating random sequence
-    t = np.random.uniform(20, 256, 1).astype(int)
+    t = np.random.uniform(20, 256, n_pulses).astype(int)
     seq = []
     for i, ti in enumerate(t):
-        a = np.random.random_integers(-1, 1)
+        a = np.random.randint(-1, 2)
         seq += [(ti, a)]
     return seq
 
 
+def benchmark(n_pulses=10000, repeat=5):
+    """Time getSequence on random sequences with n_pulses per channel."""
+    import time
+
+    timings = []
+    for _ in range(repeat):
+        s = Sequence()
+        for channel in range(8):
+            s.setDigitalChannel(channel, random_digi(n_pulses))
+        s.setAnalogChannel(0, random_ana(n_pulses))
+        s.setAnalogChannel(1, random_ana(n_pulses))
+        start = time.perf_counter()
+        merged = s.getSequence()
+        timings.append(time.perf_counter() - start)
+    print('{} pulses per channel -> {} pulses: best of {} {:.4f} s'.format(n_pulses, len(merged), repeat, min(timings)))
+    return min(timings)
+
+
 if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['benchmark']:
+        for n in (1000, 10000, 100000):
+            benchmark(n)
+        sys.exit()
+
     seq_ana = random_ana()
 
     s = Sequence()
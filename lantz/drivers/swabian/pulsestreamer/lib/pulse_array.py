@@ -0,0 +1,293 @@
+"""
+    Array representation of PulseStreamer sequences.
+
+    A sequence is stored as a structured NumPy array with one record per pulse
+    (ticks uint32, digi uint8, ao0 int16, ao1 int16).  The record layout is the
+    big-endian packed layout of the JSON-RPC interface, so that payload is just
+    tobytes() and base64; the gRPC payload is produced with vectorized varint
+    encoding of the protobuf wire format.  Both PulseStreamer classes accept
+    these arrays in stream().
+"""
+
+import base64
+import itertools
+
+import numpy as np
+
+PULSE_DTYPE = np.dtype([('ticks', '>u4'), ('digi', 'u1'), ('ao0', '>i2'), ('ao1', '>i2')])
+
+ANALOG_FULL_SCALE = 0x7fff
+
+
+def channels_to_mask(channels):
+    """Convert channels to digital channel masks.
+
+    :param channels: a list with the list of high channels of each pulse, or a
+                     boolean array of shape (n_pulses, 8).
+    """
+    if isinstance(channels, np.ndarray) and channels.ndim == 2:
+        if channels.shape[1] > 8:
+            raise ValueError('The PulseStreamer has 8 digital channels')
+        return np.packbits(channels.astype(bool), axis=1, bitorder='little')[:, 0]
+
+    lengths = np.fromiter((len(chans) for chans in channels), dtype=np.intp, count=len(channels))
+    flat = np.fromiter(itertools.chain.from_iterable(channels), dtype=np.int64, count=int(lengths.sum()))
+    if np.any((flat < 0) | (flat > 7)):
+        raise ValueError('Digital channels must be in the range 0 to 7')
+    mask = np.zeros(len(channels), dtype=np.uint8)
+    np.bitwise_or.at(mask, np.repeat(np.arange(len(channels)), lengths), np.left_shift(1, flat).astype(np.uint8))
+    return mask
+
+
+def analog_to_dac(values):
+    """Convert analog values (-1 to 1 full scale) to DAC units, rounding as convert_pulse does."""
+    return np.rint(ANALOG_FULL_SCALE * np.asarray(values, dtype=float)).astype(np.int64)
+
+
+def pulse_array(ticks, digi=0, ao0=0, ao1=0):
+    """Build a pulse array from columns, checking the ranges of all values.
+
+    :param ticks: pulse durations in ns.
+    :param digi: digital channel masks, see channels_to_mask.
+    :param ao0: analog output 0 in DAC units, see analog_to_dac.
+    :param ao1: analog output 1 in DAC units.
+    """
+    ticks = np.asarray(ticks)
+    columns = np.broadcast_arrays(ticks, digi, ao0, ao1)
+    ticks, digi, ao0, ao1 = (np.asarray(column, dtype=np.int64) for column in columns)
+    if np.any((ticks < 0) | (ticks >= 2 ** 32)):
+        raise ValueError('The range of pulse durations is 0 to 2**32 - 1 ns (uint32)')
+    if np.any((digi < 0) | (digi >= 2 ** 8)):
+        raise ValueError('The range of digital channel mask is 255 (byte)')
+    if np.any((np.abs(ao0) >= 2 ** 15) | (np.abs(ao1) >= 2 ** 15)):
+        raise ValueError('The range of analog channel values is -32767 to 32767 (int16)')
+
+    pulses = np.empty(len(ticks), dtype=PULSE_DTYPE)
+    pulses['ticks'] = ticks
+    pulses['digi'] = digi
+    pulses['ao0'] = ao0
+    pulses['ao1'] = ao1
+    return pulses
+
+
+def as_pulse_array(seq):
+    """Convert a sequence to a pulse array.
+
+    Accepts a pulse array, a list of human readable pulses
+    (ticks, [channels], analog0, analog1) or a list of raw pulses
+    (ticks, mask, ao0, ao1).
+    """
+    if isinstance(seq, np.ndarray) and seq.dtype.names == PULSE_DTYPE.names:
+        pulses = seq.astype(PULSE_DTYPE, copy=False)
+        if np.any((pulses['ao0'] == -2 ** 15) | (pulses['ao1'] == -2 ** 15)):
+            raise ValueError('The range of analog channel values is -32767 to 32767 (int16)')
+        return pulses
+
+    if len(seq) == 0:
+        return np.empty(0, dtype=PULSE_DTYPE)
+    ticks, digi, ao0, ao1 = zip(*seq)
+    if isinstance(digi[0], list):
+        return pulse_array(ticks, channels_to_mask(digi), analog_to_dac(ao0), analog_to_dac(ao1))
+    return pulse_array(ticks, digi, ao0, ao1)
+
+
+def _varints(values, n_bytes=10):
+    """Protobuf varint encoding of values (int64 are encoded as their two's complement).
+
+    :param n_bytes: maximum encoded length, values must be smaller than 2 ** (7 * n_bytes).
+    :return: (bytes, lengths) with bytes of shape (n, n_bytes).
+    """
+    values = np.asarray(values).astype(np.int64).view(np.uint64)
+    out = np.empty((len(values), n_bytes), dtype=np.uint8)
+    lengths = np.ones(len(values), dtype=np.intp)
+    for i in range(n_bytes):
+        low = (values & np.uint64(0x7f)).astype(np.uint8)
+        values = values >> np.uint64(7)
+        more = values != 0
+        out[:, i] = low | (more.astype(np.uint8) << 7)
+        lengths += more
+    return out, np.minimum(lengths, n_bytes)
+
+
+def _field(number, values, width):
+    """Tag and varint of a protobuf varint field, in a (n, width) array, with their lengths.
+
+    Zero values get a length of 0 as proto3 does not serialize them.
+    """
+    data, lengths = _varints(values, width - 1)
+    out = np.empty((len(data), width), dtype=np.uint8)
+    out[:, 0] = number << 3
+    out[:, 1:] = data
+    return out, np.where(np.asarray(values) != 0, lengths + 1, 0)
+
+
+_FIELD_TABLES = {}
+
+
+def _field_table(number, low, high, width):
+    """_field for all the values from low to high, computed once."""
+    key = (number, low, high, width)
+    if key not in _FIELD_TABLES:
+        _FIELD_TABLES[key] = _field(number, np.arange(low, high), width)
+    return _FIELD_TABLES[key]
+
+
+def encode_protobuf(pulses):
+    """Serialize pulses as the repeated 'pulse' field (1) of a SequenceMessage.
+
+    The result is byte for byte what protobuf produces for the same
+    PulseMessages, and can be concatenated with the other fields.
+    """
+    pulses = as_pulse_array(pulses)
+    n = len(pulses)
+
+    # PulseMessage fields: ticks=1 (uint32), digi=2 (uint32), ao0=3 (int32), ao1=4 (int32).
+    # Negative int32 are sign extended to 64 bits (10 bytes). The 8 and 16 bit fields are looked up in tables.
+    blocks = [_field(1, pulses['ticks'], 6)]
+    table, lengths = _field_table(2, 0, 2 ** 8, 3)
+    index = pulses['digi'].astype(np.intp)
+    blocks.append((table[index], lengths[index]))
+    for number, name in ((3, 'ao0'), (4, 'ao1')):
+        table, lengths = _field_table(number, -2 ** 15, 2 ** 15, 11)
+        index = pulses[name].astype(np.intp) + 2 ** 15
+        blocks.append((table[index], lengths[index]))
+
+    # each pulse is field 1 with wire type 2 (length delimited); a PulseMessage is at most 31 bytes so its
+    # length is a single byte
+    header = np.empty((n, 2), dtype=np.uint8)
+    header[:, 0] = (1 << 3) | 2
+    header[:, 1] = sum(lengths for _, lengths in blocks)
+
+    # Lay out the fixed width blocks side by side and gather the used part of each one: each (pulse, block)
+    # segment is copied from its start in record to its offset in the output
+    record = np.concatenate([header] + [data for data, _ in blocks], axis=1)
+    widths = [2] + [data.shape[1] for data, _ in blocks]
+    block_starts = np.cumsum([0] + widths[:-1])
+    segment_lengths = np.stack([np.full(n, 2)] + [lengths for _, lengths in blocks], axis=1).ravel()
+    segment_starts = (np.arange(n)[:, None] * record.shape[1] + block_starts[None, :]).ravel()
+    segment_offsets = np.cumsum(segment_lengths) - segment_lengths
+    total = int(segment_lengths.sum())
+    source = np.repeat(segment_starts - segment_offsets, segment_lengths) + np.arange(total)
+    return record.ravel()[source].tobytes()
+
+
+def encode_base64(pulses):
+    """JSON-RPC payload: the packed big-endian records encoded in base64."""
+    return base64.b64encode(as_pulse_array(pulses).tobytes())
+
+
+class SweepSegments():
+    """Position of the sweep points in a sequence built by concatenate_sweep.
+
+    :ivar durations: duration of each segment in ns.
+    :ivar starts: start time of each segment in ns, relative to the start of a run.
+    :ivar period: duration of a run (all the segments) in ns.
+    :ivar pulse_offsets: index of the first pulse of each segment.
+    :ivar marker_channel: digital channel marking the start of each segment, or None.
+    """
+
+    def __init__(self, durations, pulse_offsets, marker_channel=None):
+        self.durations = np.asarray(durations, dtype=np.int64)
+        self.starts = np.cumsum(self.durations) - self.durations
+        self.period = int(self.durations.sum())
+        self.pulse_offsets = np.asarray(pulse_offsets, dtype=np.intp)
+        self.marker_channel = marker_channel
+
+    def __len__(self):
+        return len(self.durations)
+
+    def segment_of(self, times):
+        """Index of the segment each time (ns since the start of the first run) falls in."""
+        return np.searchsorted(self.starts, np.asarray(times) % self.period, side='right') - 1
+
+    def split_times(self, times):
+        """Split times (ns since the start of the first run) by segment.
+
+        :return: a list with, for each segment, the times relative to the start of the segment.
+        """
+        times = np.asarray(times)
+        segments = self.segment_of(times)
+        relative = times % self.period - self.starts[segments]
+        return [relative[segments == i] for i in range(len(self))]
+
+    def split_samples(self, samples, samples_per_segment=1):
+        """Reshape gated samples acquired in order to (n_runs, n_segments, samples_per_segment)."""
+        samples = np.asarray(samples)
+        return samples.reshape(-1, len(self), samples_per_segment)
+
+
+def concatenate_sweep(seqs, marker_channel=None, marker_ticks=8):
+    """Concatenate the sequences of the points of a sweep into a single sequence.
+
+    :param seqs: sequences (see as_pulse_array), one per sweep point.
+    :param marker_channel: if given, this digital channel is raised during the first
+                           marker_ticks ns of every segment. The first pulse of the
+                           segment is split for that, so the timing is unchanged.
+    :return: (pulses, SweepSegments)
+    """
+    arrays = []
+    durations = []
+    offsets = []
+    n_pulses = 0
+    for seq in seqs:
+        pulses = as_pulse_array(seq)
+        durations.append(int(pulses['ticks'].sum(dtype=np.int64)))
+        if marker_channel is not None and len(pulses):
+            first = pulses[:1].copy()
+            first['digi'] |= 1 << marker_channel
+            if first['ticks'][0] > marker_ticks:
+                rest = pulses[:1].copy()
+                rest['ticks'] -= marker_ticks
+                first['ticks'] = marker_ticks
+                pulses = np.concatenate([first, rest, pulses[1:]])
+            else:
+                pulses = np.concatenate([first, pulses[1:]])
+        offsets.append(n_pulses)
+        n_pulses += len(pulses)
+        arrays.append(pulses)
+
+    pulses = np.concatenate(arrays) if arrays else np.empty(0, dtype=PULSE_DTYPE)
+    return pulses, SweepSegments(durations, offsets, marker_channel)
+
+
+def random_pulses(n_pulses=1000, min_len=0, max_len=1024):
+    """Random pulse array in the spirit of pulse_streamer_grpc.get_random_seq."""
+    state = np.arange(n_pulses) % 2
+    return pulse_array(np.random.uniform(min_len, max_len, n_pulses).astype(int),
+                       state * 0xfe, state * ANALOG_FULL_SCALE, -state * ANALOG_FULL_SCALE)
+
+
+def benchmark(n_pulses=10 ** 6):
+    """Time the conversion and encoding of n_pulses pulses for both transports."""
+    import struct
+    import time
+
+    pulses = random_pulses(n_pulses)
+    seq = [(int(t), [c for c in range(8) if d & (1 << c)], a0 / ANALOG_FULL_SCALE, a1 / ANALOG_FULL_SCALE)
+           for t, d, a0, a1 in pulses.tolist()]
+
+    timings = {}
+    start = time.perf_counter()
+    as_pulse_array(seq)
+    timings['list to array'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_protobuf(pulses)
+    timings['protobuf (gRPC)'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_base64(pulses)
+    timings['base64 (JSON-RPC)'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values = list(itertools.chain.from_iterable(pulses.tolist()))
+    base64.b64encode(struct.pack('>' + n_pulses * 'IBhh', *values))
+    timings['struct.pack (previous JSON-RPC)'] = time.perf_counter() - start
+
+    for name, value in timings.items():
+        print('{} pulses, {}: {:.1f} ms'.format(n_pulses, name, 1e3 * value))
+    return timings
+
+
+if __name__ == '__main__':
+    benchmark()
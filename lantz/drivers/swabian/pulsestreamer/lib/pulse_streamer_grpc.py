@@ -9,7 +9,7 @@ try:
     # import the python wrapper generated by the protocol buffer compiler (source: pulse_streamer.proto)
     from lantz.drivers.swabian.pulsestreamer.lib.pulse_streamer_pb2 import VoidMessage, PulseMessage, SequenceMessage, \
         ClockMessage, DrpClkSetMessage, GetSerialMessage, TriggerMessage, SetNetworkMessage, EnableStaticIPMessage, \
-        PulseStreamerStub
+        PulseStreamerReply, PulseStreamerStub
 except Exception as e:
     print('Exception: ' + str(e))
     print(
@@ -23,6 +23,9 @@ except Exception as e:
 import numpy as np
 from enum import Enum
 
+from lantz.drivers.swabian.pulsestreamer.lib.pulse_array import concatenate_sweep, encode_protobuf
+from lantz.drivers.swabian.pulsestreamer.lib.sequence_cache import SequenceCache
+
 
 class Serial(Enum):
     ID = 0
@@ -59,16 +62,22 @@ class PulseStreamer():
 
     TIMEOUT = 200
 
-    def __init__(self, ip_hostname='pulsestreamer'):
+    def __init__(self, ip_hostname='pulsestreamer', cache_size=256, cache_bytes=256 * 2 ** 20):
         print("Connect to Pulse Streamer via google-RPC.")
         print("IP / Hostname:", ip_hostname)
 
         self.INFINITE = -1
         self.CONSTANT_ZERO = (0, 0, 0, 0)
+        # serialized pulses of the sequences carrying a cache_key (see sequence_cache)
+        self.sequence_cache = SequenceCache(maxsize=cache_size, maxbytes=cache_bytes)
 
         try:
             channel = insecure_channel(ip_hostname + ':50051')
             self.stub = PulseStreamerStub(channel)
+            # same call as stub.stream, but taking the already serialized SequenceMessage
+            self._stream_serialized = channel.unary_unary('/pulse_streamer.PulseStreamer/stream',
+                                                          request_serializer=None,
+                                                          response_deserializer=PulseStreamerReply.FromString)
             try:
                 g = GetSerialMessage()
                 g.serial = getattr(GetSerialMessage, Serial.MAC.name)
@@ -106,26 +115,25 @@ class PulseStreamer():
         void = VoidMessage()
         self.stub.forceFinal(void, timeout=PulseStreamer.TIMEOUT)
 
-    def stream(self, seq, n_runs='INFINITE', final='CONSTANT_ZERO'):
-        check = list(filter(lambda x: abs(x[2]) >= 2 ** 15 or abs(x[3]) >= 2 ** 15, seq))
-        if check != []:
-            print(""" Failed because of wrong range of pulse_data 
-            The range of analog channel values is -32768 to 32768 (int_16t)
-            """)
-            sys.exit()
+    def encode_sequence(self, seq):
+        """Serialize the pulses of seq as the pulse field of a SequenceMessage (n_runs and final are added by stream).
 
-        s = SequenceMessage()
-        if type(seq[0][1]) == list:
-            for i in range(len(seq)):
-                s.pulse.extend([self.convert_pulse(seq[i])])
-        else:
-            for i in range(len(seq)):
-                t, chans, a0, a1 = seq[i]
-                s.pulse.extend([PulseMessage(ticks=t, digi=chans, ao0=a0, ao1=a1)])
+        :param seq: list of pulses or pulse array (see pulse_array).
+        """
+        return encode_protobuf(seq)
+
+    def stream(self, seq, n_runs='INFINITE', final='CONSTANT_ZERO'):
+        key = getattr(seq, 'cache_key', None)
+        pulses = None if key is None else self.sequence_cache.get(key)
+        if pulses is None:
+            pulses = self.encode_sequence(seq)
+            if key is not None:
+                self.sequence_cache.put(key, pulses, len(pulses))
 
         if (n_runs == 'INFINITE' or n_runs == 'infinite'):
             n_runs = self.INFINITE
 
+        s = SequenceMessage()
         s.n_runs = n_runs
 
         if (final == 'CONSTANT_ZERO' or final == 'constant_zero'):
@@ -143,7 +151,25 @@ class PulseStreamer():
         s.final.ao0 = conv_final.ao0
         s.final.ao1 = conv_final.ao1
 
-        self.stub.stream(s, timeout=PulseStreamer.TIMEOUT)
+        # serialized messages can be concatenated: the pulses followed by n_runs and final
+        self._stream_serialized(pulses + s.SerializeToString(), timeout=PulseStreamer.TIMEOUT)
+
+    def stream_sweep(self, seqs, n_runs=1, final='CONSTANT_ZERO', marker_channel=None, start=Start.SOFTWARE,
+                     mode=Mode.NORMAL):
+        """Upload all the points of a sweep at once, as consecutive segments of a single sequence.
+
+        The sequence is armed with setTrigger(start, mode) and runs n_runs times once
+        started (startNow() for a software start). With Mode.SINGLE, call rearm() to
+        run the same upload again, e.g. for the next averaging loop.
+
+        :param seqs: one sequence per sweep point.
+        :param marker_channel: digital channel raised at the start of every segment.
+        :return: SweepSegments, to demultiplex the acquired data by sweep point.
+        """
+        pulses, segments = concatenate_sweep(seqs, marker_channel=marker_channel)
+        self.setTrigger(start, mode)
+        self.stream(pulses, n_runs, final)
+        return segments
 
     def isStreaming(self):
         void = VoidMessage()
@@ -29,12 +29,12 @@ else:
             """)
         sys.exit(1)
 
-    # binary and base64 conversion
-import struct
-import base64
 import six
 from enum import Enum
 
+from lantz.drivers.swabian.pulsestreamer.lib.pulse_array import concatenate_sweep, encode_base64
+from lantz.drivers.swabian.pulsestreamer.lib.sequence_cache import SequenceCache
+
 
 class Serial(Enum):
     ID = 0
@@ -69,10 +69,12 @@ class PulseStreamer():
     the last two numbers specify the analog outputs in volt.
     """
 
-    def __init__(self, ip_hostname='pulsestreamer'):
+    def __init__(self, ip_hostname='pulsestreamer', cache_size=256, cache_bytes=256 * 2 ** 20):
         print("Connect to Pulse Streamer via JSON-RPC.")
         print("IP / Hostname:", ip_hostname)
         url = 'http://' + ip_hostname + ':8050/json-rpc'
+        # encoded payloads of the sequences carrying a cache_key (see sequence_cache)
+        self.sequence_cache = SequenceCache(maxsize=cache_size, maxbytes=cache_bytes)
         try:
             self.INFINITE = -1
             self.CONSTANT_ZERO = (0, 0, 0, 0)
@@ -124,13 +126,35 @@ class PulseStreamer():
             else:
                 final = final
 
-        if six.PY2:
-            s = self.enc(seq)
-        else:
-            s = self.enc(seq).decode("utf-8")
+        key = getattr(seq, 'cache_key', None)
+        s = None if key is None else self.sequence_cache.get(key)
+        if s is None:
+            if six.PY2:
+                s = self.enc(seq)
+            else:
+                s = self.enc(seq).decode("utf-8")
+            if key is not None:
+                self.sequence_cache.put(key, s, len(s))
 
         self.proxy.stream(s, n_runs, final)
 
+    def stream_sweep(self, seqs, n_runs=1, final='CONSTANT_ZERO', marker_channel=None, start=Start.SOFTWARE,
+                     mode=Mode.NORMAL):
+        """Upload all the points of a sweep at once, as consecutive segments of a single sequence.
+
+        The sequence is armed with setTrigger(start, mode) and runs n_runs times once
+        started (startNow() for a software start). With Mode.SINGLE, call rearm() to
+        run the same upload again, e.g. for the next averaging loop.
+
+        :param seqs: one sequence per sweep point.
+        :param marker_channel: digital channel raised at the start of every segment.
+        :return: SweepSegments, to demultiplex the acquired data by sweep point.
+        """
+        pulses, segments = concatenate_sweep(seqs, marker_channel=marker_channel)
+        self.setTrigger(start, mode)
+        self.stream(pulses, n_runs, final)
+        return segments
+
     def isStreaming(self):
         return self.proxy.isStreaming()
 
@@ -191,20 +215,10 @@ class PulseStreamer():
 
     def enc(self, seq):
         """
-        Convert a human readable python sequence to a base64 encoded string
+        Convert a human readable python sequence, a raw sequence or a pulse array (see pulse_array)
+        to a base64 encoded string
         """
-        s = b''
-        convert_list = []
-        if type(seq[0][1]) == list:
-            for pulse in seq:
-                convert_list.extend(self.convert_pulse(pulse))
-        else:
-            for pulse in seq:
-                convert_list.extend(pulse)
-
-        fmt = '>' + len(convert_list) // 4 * 'IBhh'
-        s = struct.pack(fmt, *convert_list)
-        return base64.b64encode(s)
+        return encode_base64(seq)
 
     def convert_pulse(self, pulse):
         t, chans, a0, a1 = pulse
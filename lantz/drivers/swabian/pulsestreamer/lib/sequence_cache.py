@@ -0,0 +1,148 @@
+"""
+    Cache of compiled pulse sequences.
+
+    Sequence builders decorated with cached_sequence only run once for a given set of parameters
+    and driver settings.  The sequences they return are tagged with a cache_key, which the
+    PulseStreamer transports use to keep the serialized pulses (gRPC) or payload (JSON-RPC), so
+    repeated sweep points are neither rebuilt nor re-encoded.
+
+    Cached sequences are shared: do not modify them in place.
+"""
+
+import functools
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SequenceCache():
+    """Least recently used cache bounded by number of entries and total size.
+
+    :param maxsize: maximum number of entries.
+    :param maxbytes: maximum sum of the sizes given to put, None for no limit.
+    """
+
+    def __init__(self, maxsize=256, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        try:
+            value, size = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, size=0):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedSequence(list):
+    """A pulse sequence (list of pulses) tagged with the key of the cache entry it comes from."""
+
+    def __init__(self, pulses, cache_key):
+        super().__init__(pulses)
+        self.cache_key = cache_key
+
+
+def freeze(obj):
+    """Build a hashable key describing the value of obj."""
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        return obj
+    if isinstance(obj, np.ndarray):
+        return ('ndarray', obj.dtype.str, obj.shape, obj.tobytes())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, 'magnitude') and hasattr(obj, 'units'):
+        return ('Quantity', freeze(obj.magnitude), str(obj.units))
+    if isinstance(obj, dict):
+        items = tuple(sorted((freeze(k), freeze(v)) for k, v in obj.items()))
+        return (type(obj).__name__, items, freeze(vars(obj)) if hasattr(obj, '__dict__') else None)
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__,) + tuple(freeze(item) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return (type(obj).__name__, freeze(vars(obj)))
+    return (type(obj).__name__, repr(obj))
+
+
+def sequence_nbytes(sequence):
+    """Approximate memory used by a sequence (list of (ticks, channels, ao0, ao1) pulses)."""
+    return sys.getsizeof(sequence) + sum(sys.getsizeof(pulse) + sys.getsizeof(pulse[1]) for pulse in sequence)
+
+
+def cached_sequence(builder):
+    """Cache the result of a sequence builder method.
+
+    The key is made of the method, its arguments and the instance attributes
+    listed in its class _sequence_attributes. The attributes listed in
+    _sequence_outputs (e.g. total_time) are set by the builder and restored
+    when the result comes from the cache.
+
+    Builders return a sequence or a list of sequences (one per sweep point);
+    each sequence is returned as a CachedSequence.
+
+    Each instance keeps at most builder_cache_size results, using at most
+    builder_cache_bytes (estimated by sequence_nbytes), if it defines these
+    attributes (default: 128 results, 64 MiB).
+    """
+
+    @functools.wraps(builder)
+    def wrapper(self, *args, **kwargs):
+        cache = self.__dict__.get('_builder_cache')
+        if cache is None:
+            cache = self._builder_cache = SequenceCache(maxsize=getattr(self, 'builder_cache_size', 128),
+                                                        maxbytes=getattr(self, 'builder_cache_bytes', 64 * 2 ** 20))
+
+        state = tuple(freeze(getattr(self, name, None)) for name in getattr(self, '_sequence_attributes', ()))
+        key = (type(self).__qualname__, builder.__name__, state, freeze(args), freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            return builder(self, *args, **kwargs)
+
+        entry = cache.get(key)
+        if entry is None:
+            result = builder(self, *args, **kwargs)
+            if result and isinstance(result[0], list):
+                result = [CachedSequence(seq, key + (i,)) for i, seq in enumerate(result)]
+                size = sum(sequence_nbytes(seq) for seq in result)
+            else:
+                result = CachedSequence(result, key)
+                size = sequence_nbytes(result)
+            outputs = {name: getattr(self, name) for name in getattr(self, '_sequence_outputs', ())
+                       if hasattr(self, name)}
+            entry = (result, outputs)
+            cache.put(key, entry, size)
+
+        result, outputs = entry
+        for name, value in outputs.items():
+            setattr(self, name, value)
+        # a new outer list, so callers can rearrange the sweep points
+        return list(result) if not isinstance(result, CachedSequence) else result
+
+    return wrapper
@@ -8,14 +8,13 @@
     Date: September 14, 2016
 """
 
-import ftplib as _ftp
-import os as _os
 import re
-import time as _t
 from enum import Enum
 
 from lantz.core import Action, DictFeat, Feat, MessageBasedDriver
 
+from lantz.drivers.tektronix.awg_ftp import AWG_FTP_Uploader
+
 
 class AWGState(Enum):
     stopped = 0
@@ -35,14 +34,17 @@ class AWG5000(MessageBasedDriver):
         },
     }
 
-    def __init__(self, resource_name, ftp_ip=None, *args, **kwargs):
+    def __init__(self, resource_name, ftp_ip=None, *args, ftp_manifest=None, **kwargs):
         """If ftp_ip is None, it will attempt to figure out the ftp ip from the resources name
+        ftp_manifest is the path of the local manifest of the files uploaded by FTP (see awg_ftp)
         """
         super().__init__(resource_name, *args, **kwargs)
         if ftp_ip is None:
-            self.ip = re.findall('[0-9]+.[0-9]+.[0-9]+.[0-9]+', resource_name)
+            self.ip = re.findall('[0-9]+.[0-9]+.[0-9]+.[0-9]+', resource_name)[0]
         else:
             self.ip = ftp_ip
+        self.ftp_manifest = ftp_manifest
+        self._uploader = None
         return
 
     def initialize(self):
@@ -52,6 +54,11 @@ class AWG5000(MessageBasedDriver):
         self.cd('\\')
         self.cd('ftp')
 
+    def finalize(self):
+        if self._uploader is not None:
+            self._uploader.close()
+        super().finalize()
+
     @Feat(read_once=True)
     def idn(self):
         return self.query('*IDN?')
@@ -236,41 +243,26 @@ class AWG5000(MessageBasedDriver):
         if not dest_drive in self.VALID_DRIVE: raise Exception("Invalid destination drive!")
         self.write(':MMEM:COPY "{}","{}","{}","{}"'.format(source_file_path, source_drive, dest_file_path, dest_drive))
 
-    def upload_file(self, local_filename, remote_filename, print_progress=True):
-        self.ftp = _ftp.FTP(self.ip)
-        self.ftp.login()
-        if print_progress:
-            FTP_Upload(self.ftp, local_filename, remote_filename)
-        else:
-            self.ftp.storbinary('STOR ' + remote_filename, open(local_filename, 'rb'), blocksize=1024)
-        self.ftp.quit()
+    @property
+    def uploader(self):
+        """FTP session to the instrument, kept open between uploads"""
+        if self._uploader is None:
+            self._uploader = AWG_FTP_Uploader(self.ip, manifest=self.ftp_manifest)
+        return self._uploader
+
+    def upload_file(self, local_filename, remote_filename, print_progress=True, force=False):
+        """Upload a local file (or bytes), unless the manifest shows the instrument already has it.
+        Returns True if the file was sent."""
+        return self.uploader.upload(local_filename, remote_filename, print_progress=print_progress, force=force)
+
+    def upload_files(self, files, print_progress=False, force=False, n_sessions=1):
+        """Upload an iterable of (local_filename, remote_filename). Returns the remote files that were sent."""
+        return self.uploader.upload_many(files, print_progress=print_progress, force=force, n_sessions=n_sessions)
 
     @Action()
     def load_awg_file(self, filename):
         self.write('AWGCONTROL:SRESTORE "{}"'.format(filename))
 
 
-class FTP_Upload():
-    def __init__(self, ftp, local_filename, remote_filename):
-        block_size = 1024
-        total_size = _os.path.getsize(local_filename)
-        self.written_size = 0
-        self.last_time = _t.time()
-        self.last_percent = 0
-
-        def callback(block):
-            self.written_size += block_size
-            time = _t.time()
-            percent = (self.written_size / total_size) * 100
-            # print(time - self.last_time > 1,percent - self.last_percent  > 0.1)
-            if time - self.last_time > 1 and percent - self.last_percent > 0.1:
-                self.last_time = time
-                self.last_percent = percent
-                print('{:.2f}%'.format(percent))
-
-        print('Uploading "{}" to remote destination "{}"'.format(local_filename, remote_filename))
-        ftp.storbinary('STOR ' + remote_filename, open(local_filename, 'rb'), blocksize=block_size, callback=callback)
-
-
 if __name__ == '__main__':
     test()
@@ -7,16 +7,14 @@
     Authors: Alexandre Bourassa
     Date: 20/04/2016
 """
-import ftplib as _ftp
-import os as _os
 import re as _re
-import time as _t
 
 import numpy as _np
 from lantz.core import Action, Feat, MessageBasedDriver
 
 import lantz.drivers.tektronix.awg5014c_constants as _cst
 from lantz.drivers.tektronix.awg5014c_tools import AWG_File_Writer, array_to_ieee_block, iee_block_to_array
+from lantz.drivers.tektronix.awg_ftp import AWG_FTP_Uploader
 
 
 class AWG5014C(MessageBasedDriver):
@@ -26,14 +24,16 @@ class AWG5014C(MessageBasedDriver):
     DEFAULTS = {'COMMON': {'write_termination': '\r\n',
                            'read_termination': '\r\n'}}
 
-    def __init__(self, resource_name, *args, **kwargs):
+    def __init__(self, resource_name, *args, ftp_manifest=None, **kwargs):
+        """ftp_manifest: path of the local manifest of the files uploaded by FTP (see awg_ftp)"""
         super(AWG5014C, self).__init__(resource_name, *args, **kwargs)
         self.ip = _re.findall("[0-9]+.[0-9]+.[0-9]+.[0-9]+", resource_name)[0]
-        # self.ftp = _ftp.FTP(ip)
-        # self.ftp.login()
+        self.ftp_manifest = ftp_manifest
+        self._uploader = None
 
     def finalize(self):
-        pass
+        if self._uploader is not None:
+            self._uploader.close()
 
     @Feat(read_once=True)
     def idn(self):
@@ -142,14 +142,21 @@ class AWG5014C(MessageBasedDriver):
         if not dest_drive in self.VALID_DRIVE: raise Exception("Invalid destination drive!")
         self.write(':MMEM:COPY "{}","{}","{}","{}"'.format(source_file_path, source_drive, dest_file_path, dest_drive))
 
-    def upload_file(self, local_filename, remote_filename, print_progress=True):
-        self.ftp = _ftp.FTP(self.ip)
-        self.ftp.login()
-        if print_progress:
-            FTP_Upload(self.ftp, local_filename, remote_filename)
-        else:
-            self.ftp.storbinary('STOR ' + remote_filename, open(local_filename, 'rb'), blocksize=1024)
-        self.ftp.quit()
+    @property
+    def uploader(self):
+        """FTP session to the instrument, kept open between uploads"""
+        if self._uploader is None:
+            self._uploader = AWG_FTP_Uploader(self.ip, manifest=self.ftp_manifest)
+        return self._uploader
+
+    def upload_file(self, local_filename, remote_filename, print_progress=True, force=False):
+        """Upload a local file (or bytes), unless the manifest shows the instrument already has it.
+        Returns True if the file was sent."""
+        return self.uploader.upload(local_filename, remote_filename, print_progress=print_progress, force=force)
+
+    def upload_files(self, files, print_progress=False, force=False, n_sessions=1):
+        """Upload an iterable of (local_filename, remote_filename). Returns the remote files that were sent."""
+        return self.uploader.upload_many(files, print_progress=print_progress, force=force, n_sessions=n_sessions)
 
     @Action()
     def force_jump(self, line_number):
@@ -173,28 +180,6 @@ class AWG5014C(MessageBasedDriver):
         self.write('AWGCONTROL:SRESTORE "{}"'.format(filename))
 
 
-class FTP_Upload():
-    def __init__(self, ftp, local_filename, remote_filename):
-        block_size = 1024
-        total_size = _os.path.getsize(local_filename)
-        self.written_size = 0
-        self.last_time = _t.time()
-        self.last_percent = 0
-
-        def callback(block):
-            self.written_size += block_size
-            time = _t.time()
-            percent = (self.written_size / total_size) * 100
-            # print(time - self.last_time > 1,percent - self.last_percent  > 0.1)
-            if time - self.last_time > 1 and percent - self.last_percent > 0.1:
-                self.last_time = time
-                self.last_percent = percent
-                print('{:.2f}%'.format(percent))
-
-        print('Uploading "{}" to remote destination "{}"'.format(local_filename, remote_filename))
-        ftp.storbinary('STOR ' + remote_filename, open(local_filename, 'rb'), blocksize=block_size, callback=callback)
-
-
 # -----------------------------------
 # DEBUGING AND TESTING
 # -----------------------------------
@@ -9,12 +9,17 @@
 """
 
 import struct
-import sys
+import time
 from datetime import datetime as _dt
 
 import numpy as _np
 
 
+# one point of a WFM/AWG waveform: little-endian float32 analog value and one marker byte
+# (marker 1 in bit 6, marker 2 in bit 7)
+WFM_POINT_DTYPE = _np.dtype([('analog', '<f4'), ('marker', 'u1')])
+
+
 def array_to_ieee_block(analog, marker1, marker2, prepend_length=True):
     """
         Produces a little-endian 4-byte floating point + 1-byte marker representation of analog
@@ -23,50 +28,55 @@ def array_to_ieee_block(analog, marker1, marker2, prepend_length=True):
         :param marker2: Array of numpy int8
         :return: Byte Stream in the WFM format
     """
-    num_bytes = 5 * len(analog)
-    num_digit = len(str(num_bytes))
-    if not marker1.dtype == _np.int8: marker1 = _np.asarray(marker1, dtype=_np.int8)
-    if not marker2.dtype == _np.int8: marker2 = _np.asarray(marker2, dtype=_np.int8)
-    if not analog.dtype == _np.float32: analog = _np.asarray(analog, dtype=_np.float32)
-
-    points = _np.zeros(len(analog), dtype='<f4, i1')
-    points['f1'] = (marker1 + ((marker2) << 1)) << 6
-    points['f0'] = analog
-
-    # Makes sure that the byteordering is 'little'
-    if not sys.byteorder == 'little': points = points.newbyteorder('<')
+    marker1 = _np.asarray(marker1, dtype=_np.uint8)
+    marker2 = _np.asarray(marker2, dtype=_np.uint8)
+
+    points = _np.empty(len(analog), dtype=WFM_POINT_DTYPE)
+    points['analog'] = analog
+    _np.left_shift(marker2, 1, out=points['marker'])
+    points['marker'] |= marker1
+    points['marker'] <<= 6
     bin_all = points.tobytes()
 
     if prepend_length:
-        return bytes('#{:d}{:d}'.format(num_digit, num_bytes), encoding='ascii') + bin_all
+        num_bytes = len(bin_all)
+        return bytes('#{:d}{:d}'.format(len(str(num_bytes)), num_bytes), encoding='ascii') + bin_all
     else:
         return bin_all
 
 
-def iee_block_to_array(block):
+def iee_block_to_array(block, prepend_length=True):
     """
-    Decodes an iee block into three arrays
-    :param block: iee formatted block
-    :return: analog, marker1, marker2
+    Decodes an iee block into three arrays, the inverse of array_to_ieee_block
+    :param block: iee formatted block (bytes, bytearray or memoryview)
+    :param prepend_length: False if the block has no '#<n><length>' header
+    :return: analog (float32), marker1, marker2 (int8)
     """
-    block = block.rstrip()
-
-    # Check for a '#'
-    if block[0:1] != b'#': raise ValueError("Argument is not a iee formatted block")
-
-    # Check for that there is the correct number of bytes
-    num_digit = int(block[1:2])
-    num_bytes = int(block[2:2 + num_digit])
-    block = block[2 + num_digit:]
-    if len(block) != num_bytes: raise ValueError("Argument is not a iee formatted block")
-
-    n_points = int(num_bytes / 5)
-    array = struct.unpack('<' + 'fB' * n_points, block)
-    analog = _np.array(array[::2])
-    marker = _np.array(array[1::2])
-    print(marker)
-    marker1 = _np.right_shift(_np.bitwise_and(marker, 64), 6)
-    marker2 = _np.right_shift(marker, 7)
+    block = memoryview(block).cast('B')
+
+    # Trailing whitespace (e.g. the '\n' terminating an instrument reply), without copying the block
+    end = len(block)
+    while end and block[end - 1] in b' \t\r\n':
+        end -= 1
+
+    if prepend_length:
+        # Check for a '#'
+        if block[0:1] != b'#': raise ValueError("Argument is not a iee formatted block")
+
+        # Check for that there is the correct number of bytes
+        num_digit = int(bytes(block[1:2]))
+        num_bytes = int(bytes(block[2:2 + num_digit]))
+        block = block[2 + num_digit:end]
+        if len(block) != num_bytes: raise ValueError("Argument is not a iee formatted block")
+    else:
+        block = block[:end]
+    if len(block) % WFM_POINT_DTYPE.itemsize: raise ValueError("Argument is not a iee formatted block")
+
+    points = _np.frombuffer(block, dtype=WFM_POINT_DTYPE)
+    analog = points['analog'].copy()
+    marker = points['marker']
+    marker1 = ((marker >> 6) & 1).view(_np.int8)
+    marker2 = (marker >> 7).view(_np.int8)
     return analog, marker1, marker2
 
 
@@ -125,6 +135,16 @@ class AWG_Record(object):
             data = self.data
         return struct.pack(fmt, name_l, data_l, bytes(self.name, encoding='ascii'), data)
 
+    def write(self, fp):
+        """Write the record to the binary file-like object fp, without copying byte payloads"""
+        if self.data_type != 'bytes':
+            fp.write(self.get_bytes())
+            return
+        name = bytes(self.name, encoding='ascii') + b'\x00'
+        fp.write(struct.pack('<ii', len(name), len(self.data)))
+        fp.write(name)
+        fp.write(self.data)
+
 
 class AWG_File_Writer(object):
     def __init__(self):
@@ -188,24 +208,87 @@ class AWG_File_Writer(object):
         self.records[6].append(ss)
         return ss
 
+    def _group_records(self, i):
+        group_list = self.records[i]
+        if not i == 6:
+            for entry in group_list:
+                yield entry
+        else:
+            # Special treatement for subseq group
+            subseq_number, cummul_line = 1, 0
+            for ss in group_list:
+                if len(ss.lines) != 0:
+                    yield from ss.get_records(subseq_number, cummul_line)
+                    subseq_number += 1
+                    cummul_line += len(ss.lines)
+
+    def write(self, fp):
+        """Write the file to the binary file-like object fp"""
+        for i in range(len(self.records)):
+            for entry in self._group_records(i):
+                entry.write(fp)
+
     def get_bytes(self):
         ans = list()
         for i in range(len(self.records)):
-            group_list = self.records[i]
-            if not i == 6:
-                ans.extend([entry.get_bytes() for entry in group_list])
-            else:
-                # Special treatement for subseq group
-                subseq_number, cummul_line = 1, 0
-                for ss in group_list:
-                    if len(ss.lines) != 0:
-                        ans += ss.get_bytes(subseq_number, cummul_line)
-                        subseq_number += 1
-                        cummul_line += len(ss.lines)
-
+            ans.extend([entry.get_bytes() for entry in self._group_records(i)])
         return b''.join(ans)
 
 
+class AWG_File_Stream_Writer(AWG_File_Writer):
+    """
+    AWG_File_Writer that writes the waveforms to fp as they are added, so that only one
+    waveform is held in memory. The records of groups 1 to 4 (setup) must be added
+    before the first waveform; the sequence and subsequence records are written by close.
+    :param fp: path, binary file-like object or socket
+    """
+
+    def __init__(self, fp):
+        self._own_fp = False
+        if isinstance(fp, str):
+            fp = open(fp, 'wb')
+            self._own_fp = True
+        elif not hasattr(fp, 'write') and hasattr(fp, 'makefile'):
+            fp = fp.makefile('wb')
+            self._own_fp = True
+        self.fp = fp
+        self._written_groups = 0
+        super().__init__()
+
+    def add_record(self, name, data, group, data_type=None):
+        if group <= self._written_groups: raise Exception("Records of group {} were already written".format(group))
+        if group == 5 and self._written_groups < 4:
+            self._write_groups(4)
+            self._written_groups = 4
+        super().add_record(name, data, group, data_type=data_type)
+        if group == 5:
+            self.records[4].pop().write(self.fp)
+
+    def add_subseq(self, name):
+        if self._written_groups >= 7: raise Exception("The file was already closed")
+        return super().add_subseq(name)
+
+    def _write_groups(self, n_groups):
+        for i in range(n_groups):
+            for entry in self._group_records(i):
+                entry.write(self.fp)
+            del self.records[i][:]
+
+    def close(self):
+        if self._written_groups < 7:
+            self._write_groups(7)
+            self._written_groups = 7
+            self.fp.flush()
+            if self._own_fp:
+                self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 class Sub_Sequence(object):
     def __init__(self, name):
         self.name = name
@@ -221,8 +304,7 @@ class Sub_Sequence(object):
         # n = len(self.lines + 1)
         # line.append(AWG_Record("SUBSEQ_LOOP_{}_{}_{}".format(n,self.o,n), , data_type=data_type))
 
-    def get_bytes(self, subseq_number, cummul_line):
-        ans = b''
+    def get_records(self, subseq_number, cummul_line):
         u = cummul_line + 1
         o = subseq_number
         t = _dt.now()
@@ -241,9 +323,10 @@ class Sub_Sequence(object):
                     rec.append(AWG_Record("SUBSEQ_WAVEFORM_NAME_CH_{}_{}_{}_{}".format(i + 1, n, o, u), wfm[i]))
             n += 1
             u += 1
-        for entry in rec:
-            ans += entry.get_bytes()
-        return ans
+        return rec
+
+    def get_bytes(self, subseq_number, cummul_line):
+        return b''.join([entry.get_bytes() for entry in self.get_records(subseq_number, cummul_line)])
 
 
 # -----------------------------------
@@ -323,3 +406,57 @@ class Sequence(object):
 
     def get_bytes(self):
         return bytes(self.get_str(), encoding='ascii')
+
+
+def benchmark(n_points=10 ** 7):
+    """Round trip n_points random points through array_to_ieee_block and iee_block_to_array."""
+    analog = _np.random.uniform(-1, 1, n_points).astype(_np.float32)
+    marker1 = _np.random.randint(0, 2, n_points).astype(_np.int8)
+    marker2 = _np.random.randint(0, 2, n_points).astype(_np.int8)
+
+    start = time.perf_counter()
+    block = array_to_ieee_block(analog, marker1, marker2)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = iee_block_to_array(block + b'\n')
+    decode = time.perf_counter() - start
+
+    for expected, value in zip((analog, marker1, marker2), decoded):
+        if not _np.array_equal(expected, value): raise AssertionError("Round trip failed")
+    print('{} points, encode: {:.1f} ms, decode: {:.1f} ms'.format(n_points, 1e3 * encode, 1e3 * decode))
+    return encode, decode
+
+
+def benchmark_file_writer(n_waveforms=32000, n_points=250, path=None):
+    """Write an .AWG file with n_waveforms waveforms of n_points points, each played by a sequence line."""
+    import os
+    import tempfile
+    import tracemalloc
+
+    analog = _np.sin(_np.linspace(0, 2 * _np.pi, n_points, dtype=_np.float32))
+    marker = _np.zeros(n_points, dtype=_np.int8)
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.awg')
+        os.close(fd)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with AWG_File_Stream_Writer(path) as writer:
+        for i in range(n_waveforms):
+            writer.add_waveform('wfm{}'.format(i), analog, marker, marker)
+        for i in range(min(n_waveforms, 8000)):
+            writer.add_sequence_line(wfm=('wfm{}'.format(i), '', '', ''), repeat_count=1)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    size = os.path.getsize(path)
+    print('{} waveforms of {} points: {:.2f} s, {:.1f} MB file, {:.1f} MB peak memory'.format(
+        n_waveforms, n_points, elapsed, size / 2 ** 20, peak / 2 ** 20))
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+    benchmark()
+    benchmark_file_writer()
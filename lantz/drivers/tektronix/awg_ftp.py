@@ -0,0 +1,200 @@
+"""
+    lantz.drivers.tektronix.awg_ftp
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    FTP uploads to the Tektronix AWG5014C and AWG5000 series
+
+    A single logged-in session is kept open between files, which are sent in large blocks.
+    A local manifest records the content hash of each uploaded file, so unchanged waveforms
+    are skipped and interrupted uploads are resumed (REST) rather than restarted.
+"""
+
+import ftplib as _ftp
+import hashlib as _hashlib
+import io as _io
+import json as _json
+import os as _os
+import threading as _threading
+import time as _t
+from concurrent.futures import ThreadPoolExecutor
+
+
+def content_hash(source, block_size=2 ** 20):
+    """sha256 of a local file or of a bytes-like object, and its size"""
+    h = _hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+        return h.hexdigest(), len(source)
+    size = 0
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+            size += len(block)
+    return h.hexdigest(), size
+
+
+class FTP_Manifest():
+    """
+    Content hash and size of the files uploaded to an instrument, saved as JSON in path
+    (kept in memory only if path is None). Entries are marked incomplete while uploading.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = dict()
+        self._lock = _threading.Lock()
+        if path is not None and _os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = _json.load(f)
+
+    def get(self, remote_filename):
+        with self._lock:
+            return self.entries.get(remote_filename)
+
+    def set(self, remote_filename, digest, size, complete):
+        with self._lock:
+            self.entries[remote_filename] = {'sha256': digest, 'size': size, 'complete': complete}
+            self._save()
+
+    def discard(self, remote_filename):
+        with self._lock:
+            if self.entries.pop(remote_filename, None) is not None:
+                self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            _json.dump(self.entries, f, indent=1, sort_keys=True)
+        _os.replace(tmp, self.path)
+
+
+class AWG_FTP_Uploader():
+    """
+    Uploads files to the instrument FTP server over a persistent session.
+    :param host: ip or hostname of the instrument
+    :param manifest: path of the manifest, or an FTP_Manifest shared between uploaders
+    :param block_size: size of the blocks sent to the data connection, in bytes
+    """
+
+    def __init__(self, host, user='', passwd='', manifest=None, block_size=2 ** 20, timeout=30, port=21):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.block_size = block_size
+        self.timeout = timeout
+        self.manifest = manifest if isinstance(manifest, FTP_Manifest) else FTP_Manifest(manifest)
+        self.ftp = None
+
+    def connect(self):
+        if self.ftp is None:
+            ftp = _ftp.FTP(timeout=self.timeout)
+            ftp.connect(self.host, self.port)
+            ftp.login(self.user, self.passwd)
+            ftp.voidcmd('TYPE I')
+            self.ftp = ftp
+        return self.ftp
+
+    def close(self):
+        if self.ftp is not None:
+            try:
+                self.ftp.quit()
+            except _ftp.all_errors:
+                self.ftp.close()
+            self.ftp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def remote_size(self, remote_filename):
+        """Size of the remote file, None if it does not exist"""
+        try:
+            return self.connect().size(remote_filename)
+        except _ftp.error_perm:
+            return None
+
+    def upload(self, source, remote_filename, print_progress=False, force=False, resume=True):
+        """
+        Upload source (a local filename or bytes) to remote_filename.
+        Returns False if the instrument already has that content, True otherwise.
+        """
+        digest, size = content_hash(source)
+        entry = self.manifest.get(remote_filename)
+        same_content = entry is not None and entry['sha256'] == digest
+
+        try:
+            remote_size = self.remote_size(remote_filename)
+        except _ftp.all_errors:
+            # stale session (e.g. timed out by the instrument), retry once on a new one
+            self.ftp = None
+            remote_size = self.remote_size(remote_filename)
+
+        if same_content and entry['complete'] and remote_size == size and not force:
+            return False
+
+        offset = 0
+        if resume and same_content and not entry['complete'] and remote_size is not None and remote_size < size:
+            offset = remote_size
+
+        self.manifest.set(remote_filename, digest, size, complete=False)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            f = _io.BytesIO(source)
+        else:
+            f = open(source, 'rb')
+        with f:
+            f.seek(offset)
+            callback = FTP_Progress(remote_filename, size, offset) if print_progress else None
+            self.connect().storbinary('STOR ' + remote_filename, f, blocksize=self.block_size, callback=callback,
+                                      rest=offset or None)
+        self.manifest.set(remote_filename, digest, size, complete=True)
+        return True
+
+    def upload_many(self, files, print_progress=False, force=False, n_sessions=1):
+        """
+        Upload an iterable of (source, remote_filename).
+        With n_sessions > 1 the files are distributed over that many parallel sessions.
+        Returns the list of remote files that were actually sent.
+        """
+        files = list(files)
+        if n_sessions <= 1:
+            return [remote for source, remote in files if self.upload(source, remote, print_progress, force)]
+
+        local = _threading.local()
+        sessions = list()
+
+        def upload(item):
+            if not hasattr(local, 'uploader'):
+                local.uploader = AWG_FTP_Uploader(self.host, self.user, self.passwd, manifest=self.manifest,
+                                                  block_size=self.block_size, timeout=self.timeout, port=self.port)
+                sessions.append(local.uploader)
+            return local.uploader.upload(item[0], item[1], print_progress, force)
+
+        try:
+            with ThreadPoolExecutor(max_workers=n_sessions) as executor:
+                sent = list(executor.map(upload, files))
+        finally:
+            for uploader in sessions:
+                uploader.close()
+        return [remote for (source, remote), was_sent in zip(files, sent) if was_sent]
+
+
+class FTP_Progress():
+    """storbinary callback printing the upload progress at most once per second"""
+
+    def __init__(self, remote_filename, total_size, written_size=0):
+        self.total_size = max(total_size, 1)
+        self.written_size = written_size
+        self.last_time = _t.time()
+        print('Uploading to remote destination "{}"'.format(remote_filename))
+
+    def __call__(self, block):
+        self.written_size += len(block)
+        time = _t.time()
+        if time - self.last_time > 1:
+            self.last_time = time
+            print('{:.2f}%'.format(100 * self.written_size / self.total_size))
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
-    lantz.drivers.tektronix.tds1012
-    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    lantz.drivers.tektronix.tds1002b
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     Implements the drivers to control an oscilloscope.
 
@@ -9,10 +9,16 @@
     :license: BSD, see LICENSE for more details.
 """
 
-from lantz.core import Feat, MessageBasedDriver
+from lantz.core import Feat
 
+from lantz.drivers.tektronix.tds1012 import TDS1012
+
+
+class TDS1002b(TDS1012):
+    """Tektronix TDS1002B 60MHz 2 Channel Digital Storage Oscilloscope,
+    programmed like the TDS1012 (binary curve transfer included)
+    """
 
-class TDS1002b(MessageBasedDriver):
     MANUFACTURER_ID = '0x699'
     MODEL_CODE = '0x363'
 
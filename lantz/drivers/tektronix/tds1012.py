@@ -11,12 +11,13 @@
     Source: Tektronix Manual
 """
 
-import numpy as np
-from lantz.core import Action, Feat, MessageBasedDriver
+from lantz.core import Action, DictFeat, Feat, MessageBasedDriver
 from lantz.core.errors import InvalidCommand
 
+from lantz.drivers.tektronix.tds_curve import BinaryCurveMixin
 
-class TDS1012(MessageBasedDriver):
+
+class TDS1012(BinaryCurveMixin, MessageBasedDriver):
     """Tektronix TDS1012 100MHz 2 Channel Digital Storage Oscilloscope
     """
 
@@ -40,6 +41,7 @@ class TDS1012(MessageBasedDriver):
             stable waveform.
         """
         self.send('AUTOS EXEC')
+        self.invalidate_preamble()
 
     @Action()
     def autocal(self):
@@ -60,6 +62,7 @@ class TDS1012(MessageBasedDriver):
         """ Sets the data source for the acquisition of data.
         """
         self.send('DAT:SOU CH{}'.format(value))
+        self.invalidate_preamble()
 
     @Action()
     def acquire_parameters(self):
@@ -75,27 +78,17 @@ class TDS1012(MessageBasedDriver):
 
     @Action()
     def data_setup(self):
-        """ Sets the way data is going to be encoded for sending. 
+        """ Sets the way data is going to be encoded for sending.
         """
-        self.send('DAT:ENC ASCI;WID 2')  # ASCII is the least efficient way, but
-        # couldn't make the binary mode to work
+        self._curve_setup(*(self._curve_range or (1, 2500)))
 
     @Action()
     def acquire_curve(self, start=1, stop=2500):
-        """ Gets data from the oscilloscope. It accepts setting the start and 
+        """ Gets data from the oscilloscope. It accepts setting the start and
             stop points of the acquisition (by default the entire range).
+            Returns time and voltage as float32 arrays (see read_curve).
         """
-        parameters = self.acquire_parameters()
-        self.data_setup()
-        self.send('DAT:STAR {}'.format(start))
-        self.send('DAT:STOP {}'.format(stop))
-        data = self.query('CURV?')
-        data = data.split(',')
-        data = np.array(list(map(float, data)))
-        ydata = (data - parameters['YOF']) * parameters['YMU'] \
-                + parameters['YZE']
-        xdata = np.arange(len(data)) * parameters['XIN'] + parameters['XZE']
-        return list(xdata), list(ydata)
+        return self.read_curve(start, stop)
 
     @Action()
     def forcetrigger(self):
@@ -135,8 +128,22 @@ class TDS1012(MessageBasedDriver):
         """ Sets the horizontal time base division. 
         """
         self.send('HOR:MAI:SCA {}'.format(value))
+        self.invalidate_preamble()
         return
 
+    @DictFeat(keys={1, 2})
+    def vertical_scale(self, channel):
+        """ Vertical scale of the channel, in V/division.
+        """
+        return float(self.query('CH{}:SCA?'.format(channel)))
+
+    @vertical_scale.setter
+    def vertical_scale(self, channel, value):
+        """ Sets the vertical scale of the channel.
+        """
+        self.send('CH{}:SCA {}'.format(channel, value))
+        self.invalidate_preamble()
+
     @Feat(values={0, 4, 16, 64, 128})
     def number_averages(self):
         """ Number of averages
@@ -217,13 +224,10 @@ if __name__ == '__main__':
 
     if args.view:
         import matplotlib.pyplot as plt
-        import numpy as np
 
     if args.view:
         osc.datasource = args.channel
         x, y = osc.acquire_curve()
-        x = np.array(x)
         x = x - x.min()
-        y = np.array(y)
         plt.plot(x, y)
         plt.show()
@@ -9,13 +9,12 @@
     :license: BSD, see LICENSE for more details.
 """
 
-import struct
-
-import numpy as np
 from lantz.core import Action, Feat, MessageBasedDriver
 
+from lantz.drivers.tektronix.tds_curve import BinaryCurveMixin
+
 
-class TDS2024(MessageBasedDriver):
+class TDS2024(BinaryCurveMixin, MessageBasedDriver):
     """Tektronix TDS2024 200 MHz 4 Channel Digital Real-Time Oscilloscope
     """
 
@@ -26,6 +25,7 @@ class TDS2024(MessageBasedDriver):
         """Autoconfig oscilloscope.
         """
         self.send(':AUTOS EXEC')
+        self.invalidate_preamble()
 
     def initialize(self):
         """initiate.
@@ -69,6 +69,7 @@ class TDS2024(MessageBasedDriver):
         """Selects channel.
         """
         self.send(':DATA:SOURCE CH{}'.format(chn))
+        self.invalidate_preamble()
 
     @Action()
     def acqparams(self):
@@ -84,34 +85,17 @@ class TDS2024(MessageBasedDriver):
     def dataencoding(self):
         """Set data encoding.
         """
-        self.send(':DAT:ENC RPB;WID 2;')
+        self._curve_setup(*(self._curve_range or (1, 2500)))
         return "Set data encoding"
 
     @Action()
-    def curv(self):
+    def curv(self, start=1, stop=2500):
         """Get data.
 
             Returns:
-            xdata, data as list
+            xdata, ydata as float32 arrays (see read_curve)
         """
-        self.dataencoding()
-        self.send('CURV?')
-        answer = self.recv()
-        numdigs = int(answer[1])
-        bytecount = int(answer[2:2 + numdigs])
-        data = answer[2 + numdigs:]
-        length = bytecount / 2
-        data = struct.unpack("{}H".format(length), data[0:2 * length])
-        params = self.acqparams()
-        data = np.array(list(map(float, data)))
-        yoff = params['YOFF?']
-        ymu = params['YMU?']
-        yze = params['YZE?']
-        xin = params['XIN?']
-        xze = params['XZE?']
-        ydata = (data - yoff) * ymu + yze
-        xdata = np.arange(len(data)) * xin + xze
-        return list(xdata), list(data)
+        return self.read_curve(start, stop)
 
     def _measure(self, type, source):
         self.send('MEASUrement:IMMed:TYPe {}'.format(type))
@@ -172,7 +156,6 @@ if __name__ == '__main__':
 
     if args.view:
         import matplotlib.pyplot as plt
-        import numpy as np
 
     with args.output as fp:
         writer = csv.writer(fp)
@@ -186,9 +169,7 @@ if __name__ == '__main__':
 
             if args.view:
                 x, y = osc.curv()
-                x = np.array(x)
                 x = x - x.min()
-                y = np.array(y)
                 plt.plot(x, y)
 
     if args.view:
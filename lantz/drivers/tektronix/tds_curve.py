@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.drivers.tektronix.tds_curve
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Binary waveform transfer for the TDS1000/TDS2000 series oscilloscopes.
+
+    :copyright: 2015 by Lantz Authors, see AUTHORS for more details.
+    :license: BSD, see LICENSE for more details.
+
+    Source: Tektronix TDS200, TDS1000/TDS2000 Series Programmer Manual
+"""
+
+import numpy as np
+
+from lantz.drivers.ieee4882 import block_payload, read_definite_length_block
+
+# DAT:ENC and DAT:WID to NumPy dtype of a point. RI: signed, RP: unsigned,
+# SR: same with the least significant byte first.
+CURVE_DTYPES = {('RIB', 1): 'i1', ('RIB', 2): '>i2',
+                ('RPB', 1): 'u1', ('RPB', 2): '>u2',
+                ('SRI', 1): 'i1', ('SRI', 2): '<i2',
+                ('SRP', 1): 'u1', ('SRP', 2): '<u2'}
+
+PREAMBLE_FIELDS = ('XZE', 'XIN', 'PT_OF', 'YZE', 'YMU', 'YOF')
+
+
+def decode_curve(block, encoding='RIB', width=1):
+    """Raw points of a binary CURV? answer (the whole block)."""
+    return np.frombuffer(block_payload(block), dtype=CURVE_DTYPES[(encoding, width)])
+
+
+class BinaryCurveMixin(object):
+    """Binary CURV? transfers with a cached waveform preamble.
+
+    The preamble (WFMP scaling) and the time axis are only queried again after
+    invalidate_preamble, which the setters changing the source, the vertical scale
+    or the horizontal settings must call. Call it too after changing the settings
+    on the front panel.
+    """
+
+    #: DAT:ENC and DAT:WID used by read_curve. The digitizers have 8 bits, so a
+    #: width of 1 loses nothing and halves the transfer.
+    curve_encoding = 'RIB'
+    curve_width = 1
+
+    _preamble = None
+    _curve_format = None
+    _curve_range = None
+    _time_axis = None
+
+    def invalidate_preamble(self):
+        self._preamble = None
+        self._time_axis = None
+
+    def _curve_setup(self, start, stop):
+        curve_format = (self.curve_encoding, self.curve_width)
+        if self._curve_format != curve_format:
+            self.send('DAT:ENC {};WID {}'.format(*curve_format))
+            self._curve_format = curve_format
+            self.invalidate_preamble()
+        if self._curve_range != (start, stop):
+            self.send('DAT:STAR {};STOP {}'.format(start, stop))
+            self._curve_range = (start, stop)
+            self._time_axis = None
+
+    def waveform_preamble(self):
+        """Scaling of the curves of the current source (cached, see invalidate_preamble)."""
+        if self._preamble is None:
+            answer = self.query('WFMP:{}?'.format('?;'.join(PREAMBLE_FIELDS)))
+            self._preamble = {field: float(value) for field, value in zip(PREAMBLE_FIELDS, answer.split(';'))}
+        return self._preamble
+
+    def read_curve(self, start=1, stop=2500):
+        """Curve of the current source between the start and stop points.
+
+        :return: time and voltage as float32 arrays. The time array is shared between calls.
+        """
+        self._curve_setup(start, stop)
+        preamble = self.waveform_preamble()
+        self.send('CURV?')
+        raw = np.frombuffer(read_definite_length_block(self.resource), dtype=CURVE_DTYPES[self._curve_format])
+
+        ydata = raw.astype(np.float32)
+        ydata -= preamble['YOF']
+        ydata *= preamble['YMU']
+        ydata += preamble['YZE']
+
+        if self._time_axis is None or len(self._time_axis) != len(ydata):
+            self._time_axis = (np.arange(len(ydata)) * preamble['XIN'] + preamble['XZE']).astype(np.float32)
+            self._time_axis.flags.writeable = False
+        return self._time_axis, ydata
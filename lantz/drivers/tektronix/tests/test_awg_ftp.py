@@ -0,0 +1,153 @@
+"""
+    Tests of the FTP uploads to the AWGs (awg_ftp) against a minimal local FTP server
+    standing in for the instrument.
+"""
+
+import ftplib
+import os
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import unittest
+
+from lantz.drivers.tektronix.awg_ftp import AWG_FTP_Uploader
+
+
+class StandInFTPHandler(socketserver.StreamRequestHandler):
+    """The commands used by AWG_FTP_Uploader, on files of server.root (passive mode only)."""
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        self.reply('220 Stand-in FTP server')
+        rest = 0
+        listener = None
+        for line in self.rfile:
+            command, _, argument = line.decode('ascii').strip().partition(' ')
+            command = command.upper()
+            path = os.path.join(self.server.root, argument)
+            if command == 'USER':
+                self.reply('331 Password required')
+            elif command in ('PASS', 'TYPE'):
+                self.reply('230 OK' if command == 'PASS' else '200 OK')
+            elif command == 'SIZE':
+                self.reply('213 {}'.format(os.path.getsize(path)) if os.path.exists(path) else '550 No such file')
+            elif command == 'PASV':
+                listener = socket.socket()
+                listener.bind(('127.0.0.1', 0))
+                listener.listen(1)
+                port = listener.getsockname()[1]
+                self.reply('227 Entering Passive Mode (127,0,0,1,{},{})'.format(port >> 8, port & 0xFF))
+            elif command == 'REST':
+                rest = int(argument)
+                self.reply('350 Restarting at {}'.format(rest))
+            elif command == 'STOR':
+                self.reply('150 Ready')
+                connection, _ = listener.accept()
+                listener.close()
+                self.server.stors.append((argument, rest))
+                with open(path, 'r+b' if rest else 'wb') as f:
+                    f.seek(rest)
+                    f.truncate()
+                    written = 0
+                    while True:
+                        block = connection.recv(65536)
+                        if not block:
+                            break
+                        if self.server.abort_after is not None and written + len(block) >= self.server.abort_after:
+                            # transfer interrupted: keep what arrived and drop both connections
+                            f.write(block[:self.server.abort_after - written])
+                            self.server.abort_after = None
+                            connection.close()
+                            return
+                        f.write(block)
+                        written += len(block)
+                connection.close()
+                rest = 0
+                self.reply('226 Transfer complete')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class StandInFTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root):
+        self.root = root
+        #: (remote file, REST offset) of each STOR received.
+        self.stors = []
+        #: number of bytes after which the next STOR is interrupted, None to complete it.
+        self.abort_after = None
+        super().__init__(('127.0.0.1', 0), StandInFTPHandler)
+
+
+class TestAWGFTPUploader(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.server = StandInFTPServer(self.root)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.manifest = os.path.join(tempfile.mkdtemp(), 'manifest.json')
+        self.uploader = AWG_FTP_Uploader('127.0.0.1', port=self.server.server_address[1],
+                                         manifest=self.manifest, block_size=2 ** 16)
+
+    def tearDown(self):
+        self.uploader.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+        shutil.rmtree(os.path.dirname(self.manifest))
+
+    def remote(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def test_first_upload(self):
+        data = os.urandom(300000)
+        self.assertTrue(self.uploader.upload(data, 'a.wfm'))
+        self.assertEqual(self.remote('a.wfm'), data)
+        self.assertEqual(self.server.stors, [('a.wfm', 0)])
+        self.assertTrue(self.uploader.manifest.get('a.wfm')['complete'])
+
+    def test_skip_when_manifest_matches(self):
+        data = os.urandom(300000)
+        self.uploader.upload(data, 'a.wfm')
+        self.assertFalse(self.uploader.upload(data, 'a.wfm'))
+        # a new session reading the manifest from the disk skips it too
+        other = AWG_FTP_Uploader('127.0.0.1', port=self.server.server_address[1], manifest=self.manifest)
+        try:
+            self.assertFalse(other.upload(data, 'a.wfm'))
+        finally:
+            other.close()
+        self.assertEqual(len(self.server.stors), 1)
+
+    def test_upload_again_when_content_changes(self):
+        self.uploader.upload(os.urandom(300000), 'a.wfm')
+        data = os.urandom(200000)
+        self.assertTrue(self.uploader.upload(data, 'a.wfm'))
+        self.assertEqual(self.remote('a.wfm'), data)
+        self.assertEqual(self.server.stors, [('a.wfm', 0), ('a.wfm', 0)])
+
+    def test_resume_truncated_transfer(self):
+        data = os.urandom(10 ** 6)
+        self.server.abort_after = 300000
+        with self.assertRaises(ftplib.all_errors):
+            self.uploader.upload(data, 'a.wfm')
+        self.assertEqual(len(self.remote('a.wfm')), 300000)
+        self.assertFalse(self.uploader.manifest.get('a.wfm')['complete'])
+
+        self.assertTrue(self.uploader.upload(data, 'a.wfm'))
+        self.assertEqual(self.server.stors[-1], ('a.wfm', 300000))
+        self.assertEqual(self.remote('a.wfm'), data)
+        self.assertTrue(self.uploader.manifest.get('a.wfm')['complete'])
+
+
+if __name__ == '__main__':
+    unittest.main()